@@ -1,10 +1,13 @@
 import os
 import time
-import dill
 
 from flask import (
     Flask,
-    render_template
+    Response,
+    abort,
+    request,
+    render_template,
+    send_file
 )
 
 from flask_socketio import (
@@ -13,23 +16,31 @@ from flask_socketio import (
 )
 
 import numpy as np
-from scipy.io import wavfile
-from google.cloud import speech
 
-from streaming.speech import (
-    Speech,
-    GoogleSpeech
-)
+from streaming import metrics
+from streaming.speech import GoogleSpeech, WordTimings
+from streaming.speechfile import save_speech
 from streaming.streaming import AudioStream
+from streaming.buffers import NON_BLOCKING_OVERFLOW_POLICIES
+from streaming.recognizers import make_recognizer
+from streaming.resample import output_sample_rate
+from streaming.sessions import SessionRegistry
+from streaming.history import SpeechStore
+from streaming.recording import WavRecorder, word_byte_ranges
+from streaming.artifacts import ArtifactStore
+from streaming.topics import topic_models
+from streaming.analysis import iter_analysis_payloads
+from streaming.bundle import load_bundle
+from streaming.ted import TedIndex
 from streaming.stats import (
-    count_words,
-    words_per_min_array,
-    get_running_words_per_min
+    WordRateIndex,
+    running_words_per_min_settings
 )
-from streaming.utils import (
-    generate_unique_filename,
-    format_transcript_data
+from streaming.workers import (
+    AnalysisExecutor,
+    AnalysisQueueFull
 )
+from streaming.utils import decode_audio_chunk
 
 
 app = Flask(__name__)
@@ -37,58 +48,178 @@ app.config.from_object('config.Dev')
 
 socketio = SocketIO(app)
 
-app.example_speech_pkd_response_filename = (
-    "data/Aala El-Khani -- What it's like to be a parent in a war zone.pkd"
+app.example_speech_filename = (
+    "data/Aala El-Khani -- What it's like to be a parent in a war zone.speech"
     )
 app.example_speech = None
 app.example_speech_num_topics = 5
+app.example_bundle = None
+app.example_word_rate = None
+app.ted_index = None
+
+# recordings (and anything else made for a session) are kept in a directory
+# per session.
+app.artifacts = ArtifactStore(
+    app.config['ARTIFACTS_DIR'],
+    max_bytes=app.config['ARTIFACTS_MAX_MB'] * 1024**2,
+    max_age_sec=app.config['ARTIFACTS_MAX_AGE_SEC']
+)
+
+# all of the recording state lives in a session, one per socket connection.
+speech_store = SpeechStore(app.config['SPEECH_STORE_FILENAME'] or ':memory:')
+# sessions do not outlive the server, so neither do their speeches.
+speech_store.clear()
+app.sessions = SessionRegistry(
+    idle_timeout_sec=app.config['SESSION_IDLE_TIMEOUT_SEC'],
+    memory_budget_bytes=app.config['SESSION_MEMORY_BUDGET_MB'] * 1024**2,
+    speech_store=speech_store,
+    max_speeches_in_memory=app.config['SPEECHES_IN_MEMORY_PER_SESSION']
+)
 
-app.num_user_recordings = 0
-app.audio = []
-app.sample_rate = None
-app.audio_record_start_time = None
-app.audio_record_secs_elapsed = None
 
-app.language_code = 'en-US'
-app.audio_stream = None
-app.audio_stream_started = False
-app.waiting_for_responses_callback_sig = True
+topic_models.max_size = app.config['TOPIC_MODEL_CACHE_SIZE']
 
-app.transcript = ''           # current transcript across all responses
-app.prev_num_responses = 0    # number of previous is_final responses
-app.responses = []            # this contains all of the is_final responses
-app.speeches = []             # all of the responses that have been converted to
-                              # GoogleSpeech objects.
+# audio is added to the buffers from the Socket.IO handlers, which must not
+# wait on a thread for room (that would hold up every client).
+if app.config['AUDIO_OVERFLOW_POLICY'] not in NON_BLOCKING_OVERFLOW_POLICIES:
+    raise ValueError('AUDIO_OVERFLOW_POLICY must be one of {}'.format(
+        NON_BLOCKING_OVERFLOW_POLICIES))
+
+# the analysis of finished recordings runs in these worker processes.
+app.analysis = AnalysisExecutor(
+    max_workers=app.config['ANALYSIS_WORKERS'],
+    max_queue=app.config['ANALYSIS_MAX_QUEUE'],
+    start_method=app.config['ANALYSIS_START_METHOD']
+)
+
+# the gauges are read whenever /metrics is scraped.
+metrics.audio_queue_depth.set_function(
+    lambda: app.sessions.buffer_metrics()['queue_depth'])
+metrics.audio_queue_bytes.set_function(
+    lambda: app.sessions.buffer_metrics()['queued_bytes'])
+metrics.audio_in_flight_bytes.set_function(
+    lambda: app.sessions.buffer_metrics()['bytes_in_flight'])
+metrics.audio_dropped_bytes.set_function(
+    lambda: app.sessions.buffer_metrics()['dropped_bytes'])
+metrics.analysis_queue_depth.set_function(lambda: app.analysis.queue_depth)
+metrics.sessions_active.set_function(lambda: len(app.sessions))
+
+
+def current_session():
+    """Gets the RecordingSession that belongs to the client of the current
+    socket event."""
+    return app.sessions.get(request.sid)
+
+
+def evict_sessions():
+    """Evicts idle sessions (see SessionRegistry.evict) along with their
+    files, then removes old files of the other sessions that are not
+    recording.
+
+    Returns
+    -------
+    evicted : list of string
+        The `sid`s that were evicted.
+    """
+    evicted = app.sessions.evict()
+    for sid in evicted:
+        app.artifacts.remove_session(sid)
+    app.artifacts.sweep(keep=app.sessions.recording_sids())
+    return evicted
+
+
+def recording_url(sid, filename):
+    """URL that a session's recording is served at (see `recording`)."""
+    return '/recordings/{}/{}'.format(sid, os.path.basename(filename))
+
+
+@socketio.on('disconnect')
+def client_disconnected():
+    """Lets the session registry know that this client has gone away."""
+    app.sessions.disconnect(request.sid)
 
 
 @socketio.on('connect stream.html')
 def stream_connection_established():
     """Callback function once the socket has been established on stream.html"""
     print('connected to stream.html')
+    evicted = evict_sessions()
+    if app.config['DEBUG'] and evicted:
+        print('evicted sessions: ', evicted)
+
+    session = current_session()
     emit('update timer', '00:00')
 
     if app.config['LOAD_FAKE_USER_DATA']:
-        with open(app.example_speech_pkd_response_filename, 'rb') as f:
-            responses = dill.load(f)
-        app.example_speech = GoogleSpeech(responses, num_topics=5)
-        app.speeches.append(app.example_speech)
-        analyze_user_google_speech(app.example_speech)
+        gs = GoogleSpeech.from_file(app.example_speech_filename, num_topics=5)
+        session.speeches.append(gs)
+        analyze_user_google_speech(gs)
+
+
+def get_example_bundle():
+    """Loads the precomputed example analysis the first time it is needed.
+
+    Returns
+    -------
+    bundle : dict or None
+        None if the bundle has not been built (see streaming/bundle.py).
+    """
+    if app.example_bundle is None:
+        filename = app.config['EXAMPLE_BUNDLE_FILENAME']
+        if os.path.exists(filename):
+            app.example_bundle = load_bundle(filename)
+    return app.example_bundle
+
+
+def get_ted_index():
+    """Loads the TED reference index the first time it is needed.
+
+    Returns
+    -------
+    ted_index : TedIndex or None
+        None if the index has not been built (see streaming/ted.py).
+    """
+    if app.ted_index is None:
+        filename = app.config['TED_INDEX_FILENAME']
+        if os.path.exists(filename):
+            app.ted_index = TedIndex.load(filename)
+    return app.ted_index
+
+
+def get_example_speech(num_topics):
+    """Loads the example speech from its speech file (see
+    streaming/speechfile.py) the first time it is needed.
+
+    Returns
+    -------
+    google_speech : GoogleSpeech
+    """
+    if app.example_speech is None:
+        app.example_speech = GoogleSpeech.from_file(
+            app.example_speech_filename, num_topics=num_topics
+        )
+    return app.example_speech
 
 
 def emit_example_speech(num_topics):
     """Sends an example speech to example.html to show the user some example
     output from a long (~15 minute) talk."""
-    # open and load an example speech from a pickled (dill) file if the app
-    # has not yet loaded the speech. Otherwise, just update the number of topics
-    # in the LDA.
-    if app.example_speech is None:
-        with open(app.example_speech_pkd_response_filename, 'rb') as f:
-            responses = dill.load(f)
-        app.example_speech = GoogleSpeech(responses, num_topics=num_topics)
-    else:
-        app.example_speech.fit_lda(n_topics=num_topics)
+    # the example never changes, so serve the precomputed results if they exist.
+    bundle = get_example_bundle()
+    if bundle is not None:
+        for event, data in bundle['payloads']:
+            emit_payload(event, data)
+        emit('topic modeling', bundle['topics'][str(num_topics)])
+        return
 
-    analyze_user_google_speech(app.example_speech, mode='example')
+    # if the app has already loaded the speech, just update the number of
+    # topics in the LDA.
+    loaded = app.example_speech is not None
+    google_speech = get_example_speech(num_topics)
+    if loaded:
+        google_speech.fit_lda(n_topics=num_topics)
+
+    analyze_user_google_speech(google_speech, mode='example')
 
 
 @socketio.on('connect example.html')
@@ -99,11 +230,10 @@ def example_connection_established():
 
 
 #---------AUDIO STREAMING---------------------------#
-def wpm_from_transcript(transcript):
-    """Calculates the current number of words per minute from the given
-    transcript."""
-    num_words = len(transcript.split())
-    elapsed_time_sec = time.time() - app.audio_record_start_time
+def wpm_from_word_count(session, num_words):
+    """Calculates the current number of words per minute from the number of
+    words spoken since the recording started."""
+    elapsed_time_sec = time.time() - session.record_start_time
     wpm = num_words / elapsed_time_sec * 60
     # print(num_words, elapsed_time_sec)
     if elapsed_time_sec < 1:
@@ -111,12 +241,12 @@ def wpm_from_transcript(transcript):
     return wpm
 
 
-def emit_time():
+def emit_time(session):
     """Emits a signal if a second has elapsed, to update the users presentation
     clock."""
-    secs_elapsed = np.floor(time.time() - app.audio_record_start_time)
-    if app.audio_record_secs_elapsed != secs_elapsed:
-        app.audio_record_secs_elapsed = secs_elapsed
+    secs_elapsed = np.floor(time.time() - session.record_start_time)
+    if session.record_secs_elapsed != secs_elapsed:
+        session.record_secs_elapsed = secs_elapsed
         mins_elapsed = int(secs_elapsed / 60)
         secs_elapsed -= (60 * mins_elapsed)
         emit(
@@ -125,58 +255,107 @@ def emit_time():
         )
 
 
-def emit_transcript_text():
+def emit_transcript_text(session):
     """Updates the transcript text in the streaming transcript div"""
-    app.transcript = app.audio_stream.transcript
-    emit('transcript update', {'transcript': app.audio_stream.transcript})
+    session.transcript = session.audio_stream.transcript
+    emit('transcript update', {'transcript': session.audio_stream.transcript})
+    arrival_time = session.audio_stream.transcript_arrival_time
+    if arrival_time is not None:
+        metrics.chunk_to_transcript_seconds.observe(
+            time.perf_counter() - arrival_time
+        )
 
 
-def emit_wpm_from_streaming_transcript():
-    """Calculates the current number of words per minute based on the
-    number of words currently in the streaming transcript."""
-    wpm = wpm_from_transcript(app.audio_stream.transcript)
+def emit_wpm_from_live_transcript(session):
+    """Calculates the current number of words per minute based on the number
+    of words in the final results so far plus the current interim result."""
+    wpm = wpm_from_word_count(session, session.live_transcript.num_words)
     emit('wpm', {'words-per-minute': str(int(wpm))})
     emit('wpm plot update', int(wpm))
 
 
-def emit_wpm_from_full_transcript(transcript):
-    """Uses the full transcript to calculate the wpm."""
-    wpm = wpm_from_transcript(transcript)
-    emit('wpm', {'words-per-minute': str(int(wpm))})
-    emit('wpm plot update', int(wpm))
+def emit_live_stats(session):
+    """Sends the pause statistics and word counts kept by the AudioStream, so
+    the user can see them while they are still talking."""
+    stats = session.audio_stream.stats
+    emit('live pause stats', stats.pause_summary())
+    emit('live word counts', stats.top_words(5, include_stop_words=False))
 
 
 @socketio.on('language changed')
 def language_changed(new_language):
     """Called when the user changes the language."""
-    app.language_code = new_language
+    current_session().language_code = new_language
     print('new language selected: ', new_language)
 
 
 @socketio.on('audio stream load page')
 def audio_load_page(sample_rate):
     """Called when /stream finishes loading"""
-    app.sample_rate = sample_rate
+    current_session().sample_rate = sample_rate
+
+
+def recognizer_options():
+    """Extra options for the configured recognizer backend."""
+    if app.config['RECOGNIZER'] == 'replay':
+        return {
+            'filename': app.config['REPLAY_RESPONSES_FILENAME'],
+            'latency_sec': app.config['REPLAY_LATENCY_SEC']
+        }
+    return {}
+
+
+def vad_options():
+    """Options for the voice activity gate, or None if it is disabled."""
+    if not app.config['VAD_ENABLED']:
+        return None
+    return {
+        'threshold_db': app.config['VAD_THRESHOLD_DB'],
+        'hangover_ms': app.config['VAD_HANGOVER_MS'],
+        'pre_roll_ms': app.config['VAD_PRE_ROLL_MS']
+    }
 
 
 @socketio.on('audio stream on')
 def audio_on(sample_rate):
     """Called when the user hits the start recording button"""
-    app.audio = []
-    app.responses = []
-    app.num_user_recordings += 1
-    app.prev_num_responses = 0
-    app.waiting_for_responses_callback_sig = True
+    evict_sessions()
+    session = current_session()
+    if session.audio_stream is not None:
+        # make sure a previous recording's thread is allowed to finish.
+        session.audio_stream.closed = True
+
+    # spool the recording to the session's directory, numbered so the browser
+    # will not load a cached audio file.
+    recorder = WavRecorder(
+        app.artifacts.path(
+            request.sid, 'recording-{}.wav'.format(session.num_recordings + 1)
+        ),
+        sample_rate
+    )
 
     # create a new thread which will stream the audio
-    app.audio_stream = AudioStream(sample_rate, language_code=app.language_code)
-    app.audio_stream.closed = False
-    app.audio_record_start_time = time.time()
-    app.audio_record_secs_elapsed = 0
+    # the recognizer is sent resampled audio.
+    recognizer = make_recognizer(
+        app.config['RECOGNIZER'],
+        output_sample_rate(sample_rate, app.config['RESAMPLE_TARGET_HZ']),
+        language_code=session.language_code,
+        **recognizer_options()
+    )
+    audio_stream = AudioStream(
+        sample_rate, language_code=session.language_code, recognizer=recognizer,
+        max_buffer_bytes=app.config['AUDIO_BUFFER_MAX_BYTES'],
+        max_request_bytes=app.config['AUDIO_MAX_REQUEST_BYTES'],
+        overflow=app.config['AUDIO_OVERFLOW_POLICY'],
+        resample_hz=app.config['RESAMPLE_TARGET_HZ'],
+        vad_options=vad_options()
+    )
+    audio_stream.closed = False
+    session.start_recording(audio_stream, recorder)
     emit('update timer', '{:02}:{:02}'.format(0, 0))
 
-    app.audio_stream.start()
-    app.audio_stream_started = True
+    session.audio_stream.start()
+    session.audio_stream_started = True
     emit('remove plots')
 
 
@@ -187,128 +366,211 @@ def audio_stream(stream):
     Parameters
     ----------
     stream : dict
-        keys are 'sample_rate' and 'audio'. 'sample_rate' is audio sample rate
-        in Hz. 'audio' is an array of size 4096 containing raw audio signal as
-        type uint16.
+        'audio' is a chunk of raw audio signal, either as a binary buffer of
+        little-endian samples or as a list of floats between -1 and 1.
+        'dtype' (optional, default 'int16') is the sample format of a binary
+        buffer, 'int16' or 'float32'.
 
     Emits
     -----
     'update timer' (via emit_time())
     'transcript update' (via emit_transcript_text())
-    'wpm' (via emit_wpm_from_full_transcript() or
-               emit_wpm_from_streaming_transcript())
-    'wpm plot update' (via emit_wpm_from_full_transcript() or
-                           emit_wpm_from_streaming_transcript())
+    'wpm' (via emit_wpm_from_live_transcript())
+    'wpm plot update' (via emit_wpm_from_live_transcript())
+    'live pause stats' (via emit_live_stats(), when there are new results)
+    'live word counts' (via emit_live_stats(), when there are new results)
     """
-    audio = stream['audio']
-    app.audio.extend(audio)
-    app.audio_stream.add_chunk(audio)
-
-    emit_time()
+    session = current_session()
+    if session.recorder is None or session.recorder.closed:
+        return
+    start = time.perf_counter()
+
+    try:
+        audio = decode_audio_chunk(stream['audio'], stream.get('dtype', 'int16'))
+    except (KeyError, ValueError, TypeError) as e:
+        # a malformed frame is dropped rather than ending the handler.
+        print('Dropped an audio chunk (audio stream): {}'.format(e))
+        return
+    session.recorder.append(audio)
+    session.audio_stream.add_chunk(audio)
+
+    emit_time(session)
 
     # update the transcript if there are new words
-    if app.transcript != app.audio_stream.transcript:
-        emit_transcript_text()
-
-    # now we're going to lose track of our responses when a new
-    # stream is opened!!
-
-    # need to check to see when the transcript is disappearing....
-
-    # if an is_final response has occurred, add the response object
-    if len(app.audio_stream.responses) != app.prev_num_responses:
-        app.prev_num_responses = len(app.audio_stream.responses)
+    if session.transcript != session.audio_stream.transcript:
+        emit_transcript_text(session)
+
+    # add each new is_final response to the running transcript exactly once,
+    # then replace the interim tail.
+    num_responses = len(session.audio_stream.responses)
+    if num_responses != session.prev_num_responses:
+        new_responses = session.audio_stream.responses[
+            session.prev_num_responses:num_responses
+        ]
+        session.prev_num_responses = num_responses
         if app.config['DEBUG']:
-            print('audio stream responses: ', len(app.audio_stream.responses))
-        app.responses.append(app.audio_stream.responses[-1])
-
-    if len(app.responses) != 0:
-        # TODO: combine word count from previous responses and num words in
-        # streaming transcript
-        quick_speech = Speech(app.responses)
-        qs_transcript_list = quick_speech.transcript_as_list()
-        qs_transcript_string = quick_speech.transcript_as_string()
-
-        # if len(qs_transcript_list) > len(app.transcript.split()) \
-        #     and app.transcript not in qs_transcript_string:
-        # NOTE: this could be inefficient in cases where the qs_transcript
-        # string is long
-        if app.transcript not in qs_transcript_string:
-            full_transcript = (
-                qs_transcript_string + ' ' +
-                app.transcript
+            print('audio stream responses: ', num_responses)
+        for response in new_responses:
+            session.responses.append(response)
+            session.live_transcript.add_final(
+                response.alternatives[0].transcript
             )
-        else:
-            full_transcript = qs_transcript_string
+        emit_live_stats(session)
+    session.live_transcript.set_interim(session.audio_stream.interim_transcript)
 
-        if app.config['DEBUG']:
-            print('-----')
-            print('num_responses: ', len(app.responses))
-            print('qs len: ', len(qs_transcript_list))
-            print('app.transcript len: ', len(app.transcript.split()))
-            print('current wpm: ', wpm_from_transcript(full_transcript))
-            print()
-
-        emit_wpm_from_full_transcript(full_transcript)
-    else:
-        emit_wpm_from_streaming_transcript()
+    emit_wpm_from_live_transcript(session)
+    metrics.chunk_handler_seconds.observe(time.perf_counter() - start)
 
 
 @socketio.on('audio stream off')
 def audio_off():
     """Executed when the user hits the 'stop' button."""
-    # clear out any previous recordings from the temp file.
-    if not os.path.exists('static/temp'):
-        os.mkdir('static/temp')
-
-    for fname in os.listdir('static/temp'):
-        os.remove(os.path.join('static/temp', fname))
-
-    app.audio_stream.closed = True
-    count = 0
-    waiting_emitted = False
-    while True:
-        if app.audio_stream.is_finished() and \
-           not app.audio_stream.waiting_for_responses:
-            gs = GoogleSpeech(app.audio_stream.responses, num_topics=5)
-            app.speeches.append(gs)
-            emit('transcript update', {'transcript': gs.transcript_as_string()})
-            analyze_user_google_speech(gs)
-            print(
-                'Conversion to GoogleSpeech object was a success (audio_off).'
-            )
-            emit('waiting for responses complete')
+    session = current_session()
+    if session.audio_stream is None:
+        return
+
+    # the client can start another recording before this one is finished, so
+    # only these are used from here on.
+    audio_stream = session.audio_stream
+    recorder = session.recorder
+    audio_stream.closed = True
+    # the recording has been written out as it came in, all that is left to do
+    # is finalize the file.
+    recorder.close()
+
+    emit('waiting for responses')
+    socketio.start_background_task(
+        finish_recording, request.sid, session, audio_stream, recorder
+    )
+
+
+def finish_recording(sid, session, audio_stream, recorder):
+    """Waits (without blocking other clients) for the last responses of a
+    recording, then hands them off to the analysis workers and streams each
+    stage's results back to the client.
+
+    Parameters
+    ----------
+    sid : string
+        Socket.IO session id of the client that made the recording.
+
+    session : RecordingSession
+
+    audio_stream : AudioStream
+        The stream of the recording that was stopped.
+
+    recorder : WavRecorder
+        Where that recording was written to.
+    """
+    timeout_sec = app.config['RESPONSE_WAIT_TIMEOUT_SEC']
+    wait_start = time.time()
+    while audio_stream.waiting_for_responses or not audio_stream.is_finished():
+        if time.time() - wait_start > timeout_sec:
+            print('Recognizer did not finish within {} sec (audio_off).'.format(
+                timeout_sec))
             break
+        socketio.sleep(0.1)
+
+    responses = list(audio_stream.responses)
+    session.speech_timeline = audio_stream.speech_timeline()
+    save_speech(
+        # the committed responses are already on the recording's timeline.
+        WordTimings.from_responses(responses, rebased=True),
+        os.path.splitext(recorder.filename)[0] + '.speech'
+    )
+
+    if audio_stream.is_finished() and not audio_stream.waiting_for_responses:
+        def emit_to_client(event, data):
+            emit_payload(event, data, room=sid)
+
+        try:
+            job = app.analysis.submit(
+                responses, emit_to_client, num_topics=5,
+                live_stats=audio_stream.stats
+            )
+        except AnalysisQueueFull:
+            socketio.emit('analysis queue full', room=sid)
         else:
-            if not waiting_emitted:
-                # TODO: place this on another thread so that we can wait for
-                # the callback from 'waiting for responses' signal. (this will
-                # just lead to an infinite loop).
-                emit('waiting for responses')
-                waiting_emitted = True
+            socketio.emit(
+                'analysis queued', {'queue-depth': app.analysis.queue_depth},
+                room=sid
+            )
+            while not job.done():
+                app.analysis.dispatch()
+                socketio.sleep(0.1)
+            app.analysis.dispatch()
+
+            if job.future.exception() is None:
+                gs = job.result()
+                # the LDA was fit in the worker; make it available here.
+                topic_models.put(gs.key, gs.num_topics, (gs.lda_model, gs.lda_Z))
+                session.speeches.append(gs)
+                prefetch_neighbouring_topics(gs)
+                emit_seek_index(sid, recorder, gs)
+                emit_similar_ted_talks(sid, gs)
+                print('Conversion to GoogleSpeech object was a success (audio_off).')
+            else:
+                print('Analysis failed (audio_off): ', repr(job.future.exception()))
+            socketio.emit('waiting for responses complete', room=sid)
+
+    socketio.emit(
+        'create audio url', recording_url(sid, recorder.filename),
+        room=sid
+    )
 
-            if count >= 5:
-                break
-            count += 1
-            print('Conversion to GoogleSpeech object did not work (audio_off). ' +
-                'Trying again in 1 sec.')
-            time.sleep(1)
 
-    # create a unique filename for this audio file
-    # this is so the browser will load a cached audio file
-    filename = 'static/temp/' + generate_unique_filename(20, '.wav')
-    audio = (np.asarray(app.audio).astype(np.float32) * 0x7FFF).astype(np.int16)
-    wavfile.write(filename, app.sample_rate, audio)
+def emit_seek_index(sid, recorder, google_speech):
+    """Sends the byte range of each word in the recording, so the client can
+    play single words without downloading the whole recording. The ranges are
+    in the order of the words of the interactive transcript (which is split
+    from the transcript, not from the recognizer's timed words); a word
+    without a timestamp gets no range (None).
 
-    with open('static/temp/example-responses.pkd', 'wb') as f:
-        dill.dump(app.audio_stream.responses, f)
+    Emits
+    -----
+    'audio seek index'
+    """
+    timings = google_speech.timings
+    ranges = word_byte_ranges(
+        timings.start_secs, timings.end_secs, recorder.sample_rate,
+        recorder.num_samples
+    ).tolist()
+    ranges = [
+        ranges[ix] if ix >= 0 else None
+        for ix in timings.transcript_word_ixs().tolist()
+    ]
+    socketio.emit(
+        'audio seek index',
+        {
+            'url': recording_url(sid, recorder.filename),
+            'sample-rate': recorder.sample_rate,
+            'ranges': ranges
+        },
+        room=sid
+    )
+
+
+def emit_similar_ted_talks(sid, google_speech):
+    """Sends the TED talks that are most like the user's speech, if the TED
+    reference index has been built.
 
-    emit('create audio url', filename)
+    Emits
+    -----
+    'similar ted talks'
+    """
+    ted_index = get_ted_index()
+    if ted_index is None or len(ted_index) == 0:
+        return
+    with metrics.timed_stage('ted.most_similar'):
+        similar = ted_index.most_similar(
+            google_speech, k=app.config['SIMILAR_TED_TALKS']
+        )
+    socketio.emit('similar ted talks', similar, room=sid)
 
 
 @socketio.on('waiting for responses callback')
 def waiting_for_responses_callback():
-    app.waiting_for_responses_callback_sig = False
+    current_session().waiting_for_responses_callback_sig = False
 
 
 @socketio.on('update lda topics')
@@ -324,9 +586,10 @@ def update_lda_topics(num_topics):
     -----
     'topic modeling'
     """
-    gs = app.speeches[-1]
-    gs.fit_lda(int(num_topics))
-    emit('topic modeling', gs.get_all_topics(10))
+    session = current_session()
+    if len(session.speeches) == 0:
+        return
+    emit_topics_when_fitted(session.speeches[-1], int(num_topics))
 
 
 @socketio.on('example update lda topics')
@@ -342,9 +605,118 @@ def update_example_lda_topics(num_topics):
     -----
     'topic modeling'
     """
-    gs = app.example_speech
-    gs.fit_lda(int(num_topics))
-    emit('topic modeling', gs.get_all_topics(10))
+    bundle = get_example_bundle()
+    if bundle is not None and str(int(num_topics)) in bundle['topics']:
+        emit('topic modeling', bundle['topics'][str(int(num_topics))])
+        return
+
+    # numbers of topics that are not in the bundle are fit on demand.
+    emit_topics_when_fitted(get_example_speech(int(num_topics)), int(num_topics))
+
+
+def emit_topics_when_fitted(google_speech, num_topics):
+    """Sends the topics of a speech for `num_topics`. If the LDA is not
+    cached, it is fit in the background and the topics are sent once it is
+    done, so the event loop is never blocked by the fit.
+
+    Emits
+    -----
+    'topic modeling'
+    """
+    session = current_session()
+    session.requested_num_topics = num_topics
+    future = google_speech.fit_lda_async(num_topics)
+    if future.done():
+        send_fitted_topics(request.sid, session, google_speech, num_topics)
+    else:
+        socketio.start_background_task(
+            wait_for_topics, request.sid, session, google_speech, num_topics,
+            future
+        )
+
+
+def wait_for_topics(sid, session, google_speech, num_topics, future):
+    """Waits (without blocking other clients) for an LDA being fit in the
+    background, then sends its topics."""
+    while not future.done():
+        socketio.sleep(0.05)
+    if future.exception() is not None:
+        print('Fitting the LDA failed: ', repr(future.exception()))
+        return
+    send_fitted_topics(sid, session, google_speech, num_topics)
+
+
+def send_fitted_topics(sid, session, google_speech, num_topics):
+    # the slider may have moved on while the model was being fit.
+    if session.requested_num_topics != num_topics:
+        return
+    google_speech.fit_lda(num_topics)
+    socketio.emit('topic modeling', google_speech.get_all_topics(10), room=sid)
+    prefetch_neighbouring_topics(google_speech)
+
+
+@socketio.on('speech dt window')
+def speech_dt_window(window_sec):
+    """Sends the running words per minute of the user's latest speech, for the
+    window size picked on the speech dt slider.
+
+    Parameters
+    ----------
+    window_sec : float
+        Size of the sliding window (in seconds).
+
+    Emits
+    -----
+    'speech dt window data'
+    """
+    session = current_session()
+    if len(session.speeches) == 0:
+        return
+    emit_speech_dt_window(session.speeches[-1].word_rate, window_sec)
+
+
+@socketio.on('example speech dt window')
+def example_speech_dt_window(window_sec):
+    """Same as `speech_dt_window`, but for the example speech on /example."""
+    bundle = get_example_bundle()
+    if bundle is not None:
+        if app.example_word_rate is None:
+            app.example_word_rate = WordRateIndex(
+                bundle['word_times'], words=bundle['words']
+            )
+        word_rate = app.example_word_rate
+    elif app.example_speech is not None:
+        word_rate = app.example_speech.word_rate
+    else:
+        return
+    emit_speech_dt_window(word_rate, window_sec)
+
+
+def emit_speech_dt_window(word_rate, window_sec):
+    """Emits the running words per minute over a window of `window_sec`, with
+    as many points as the plot was first drawn with."""
+    window_sec = float(window_sec)
+    _, num_points = running_words_per_min_settings(int(word_rate.last_word_sec))
+    if num_points == -1 or window_sec <= 0:
+        return
+    if window_sec.is_integer():
+        window_sec = int(window_sec)
+    emit(
+        'speech dt window data',
+        {'window': window_sec, 'data': word_rate.timeline(window_sec, num_points)}
+    )
+
+
+def prefetch_neighbouring_topics(google_speech):
+    """Fits LDAs in the background for the topic counts around the speech's
+    current number of topics, so nearby slider values come back quickly."""
+    radius = app.config['TOPIC_PREFETCH_RADIUS']
+    topic_counts = [
+        n for n in range(google_speech.num_topics - radius,
+                         google_speech.num_topics + radius + 1)
+        if app.config['MIN_NUM_TOPICS'] <= n <= app.config['MAX_NUM_TOPICS']
+    ]
+    google_speech.prefetch_topics(topic_counts)
 
 
 def analyze_user_google_speech(google_speech, mode='user'):
@@ -366,36 +738,20 @@ def analyze_user_google_speech(google_speech, mode='user'):
     'made speech dt plot'
     'topic modeling'
     """
-    if mode not in ['user', 'example']:
-        raise AttributeError('`mode` must be either \'user\' or \'example\'')
-
-    transcript_data = format_transcript_data(google_speech)
-    word_data_excluding_stop = count_words(
-        google_speech, include_stop_words=False, return_top_n=10
-    )
-    word_data_including_stop = count_words(
-        google_speech, include_stop_words=True, return_top_n=10
-    )
-
-    if mode == 'user':
-        emit('speech processing done')
-
-    emit(
-        'word counts including stop',
-        {'counts': word_data_including_stop, 'transcript': transcript_data}
-    )
-    emit('word counts excluding stop', word_data_excluding_stop)
-
-    # and plot the running average of wpm values.
-    bin_sizes, data = get_running_words_per_min(google_speech)
-    if bin_sizes != -1:
-        emit('update speech dt slider', bin_sizes)
-        emit('make speech dt plot', data)
+    for event, data in iter_analysis_payloads(google_speech, mode=mode):
+        emit_payload(event, data)
+    prefetch_neighbouring_topics(google_speech)
+
+
+def emit_payload(event, data, room=None):
+    """Emits an event from the analysis; `data` is None for events that do not
+    carry any data. If `room` is given, the event is sent to that client from
+    outside of a socket event handler."""
+    args = () if data is None else (data,)
+    if room is None:
+        emit(event, *args)
     else:
-        emit('speech less than 10 seconds')
-
-    # and emit the topics
-    emit('topic modeling', google_speech.get_all_topics(10))
+        socketio.emit(event, *args, room=room)
 
 
 #==============ROUTING==============================#
@@ -431,6 +787,25 @@ def contact():
     )
 
 
+@app.route('/recordings/<sid>/<name>')
+def recording(sid, name):
+    """Serves a session's recording. Range requests are supported, so single
+    words can be fetched (see `emit_seek_index`)."""
+    path = app.artifacts.find(sid, name)
+    if path is None:
+        abort(404)
+    return send_file(os.path.abspath(path), conditional=True, max_age=0)
+
+
+@app.route('/metrics')
+def metrics_page():
+    """Latency histograms, counters and queue depths in the Prometheus text
+    format."""
+    return Response(
+        metrics.registry.render(), mimetype='text/plain; version=0.0.4'
+    )
+
+
 if __name__ == '__main__':
     socketio.run(
         app,
@@ -0,0 +1,245 @@
+# run.py
+#
+# Benchmarks the speech analysis at realistic talk lengths. Run (from `app/`):
+#
+#     python -m benchmarks.run --output results.json
+#     python -m benchmarks.run --baseline results.json
+#
+# The second command runs the benchmarks again, and exits with status 1 if any
+# of them got slower (or used more memory) than the baseline allows.
+
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import numpy as np
+import sklearn
+
+from streaming.speech import GoogleSpeech
+from streaming.topics import topic_models
+from streaming.analysis import iter_analysis_payloads
+from streaming.stats import (
+    count_words, words_per_min_array, get_running_words_per_min
+)
+
+from .synthetic import SEED_FILENAME, load_seed_responses, make_synthetic_responses
+
+
+DEFAULT_DURATIONS_MIN = [1, 5, 15, 30, 60, 120]
+TOPIC_COUNTS = [2, 5, 9]
+
+
+def _new_speech(responses):
+    return GoogleSpeech(responses, num_topics=5)
+
+
+def _fit_lda(n_topics):
+    def run(gs):
+        topic_models.discard(gs.key)
+        gs.fit_lda(n_topics)
+    return run
+
+
+def _count_words(gs):
+    gs.invalidate()
+    count_words(gs, include_stop_words=False, return_top_n=10)
+    count_words(gs, include_stop_words=True, return_top_n=10)
+
+
+def _words_per_min_array(gs):
+    gs.invalidate()
+    words_per_min_array(gs, bin_size_sec=10, num_points_to_return=60)
+
+
+def _get_running_words_per_min(gs):
+    gs.invalidate()
+    get_running_words_per_min(gs)
+
+
+def _analyze(responses):
+    """The work done by `analyze_user_google_speech` in app.py, without the
+    Socket.IO emits."""
+    gs = _new_speech(responses)
+    for _ in iter_analysis_payloads(gs, mode='user'):
+        pass
+    return gs
+
+
+def benchmark_cases():
+    """Lists the benchmarks as (name, function, needs_speech). Functions that
+    need a speech are called with a GoogleSpeech, the others with the
+    responses."""
+    cases = [('GoogleSpeech', _new_speech, False)]
+    cases += [
+        ('fit_lda[{}]'.format(n), _fit_lda(n), True) for n in TOPIC_COUNTS
+    ]
+    cases += [
+        ('count_words', _count_words, True),
+        ('words_per_min_array', _words_per_min_array, True),
+        ('get_running_words_per_min', _get_running_words_per_min, True),
+        ('analyze_user_google_speech', _analyze, False),
+    ]
+    return cases
+
+
+def _forget(result):
+    if isinstance(result, GoogleSpeech):
+        topic_models.discard(result.key)
+
+
+def time_case(func, arg, repeat=3):
+    """Runs `func(arg)` `repeat` times and once more while tracing memory.
+
+    Returns
+    -------
+    wall_secs : list of float
+    peak_mb : float
+        Peak memory allocated by Python while `func` ran (in MB).
+    """
+    wall_secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _forget(func(arg))
+        wall_secs.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        _forget(func(arg))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return wall_secs, peak / 1024. ** 2
+
+
+def run_benchmarks(durations_min=DEFAULT_DURATIONS_MIN, repeat=3,
+                   seed_filename=SEED_FILENAME, log=print):
+    """Runs every benchmark on a synthetic speech of each duration.
+
+    Returns
+    -------
+    results : dict
+        'meta' describes the machine and library versions, and 'results' is a
+        list with a dict for each (benchmark, duration).
+    """
+    seed = load_seed_responses(seed_filename)
+    results = []
+    for duration_min in durations_min:
+        responses = make_synthetic_responses(seed, duration_min)
+        gs = _new_speech(responses)
+        num_words = len(gs.transcript_as_list())
+
+        for name, func, needs_speech in benchmark_cases():
+            wall_secs, peak_mb = time_case(
+                func, gs if needs_speech else responses, repeat=repeat
+            )
+            result = {
+                'name': name,
+                'duration_min': duration_min,
+                'num_words': num_words,
+                'wall_sec': float(np.median(wall_secs)),
+                'wall_sec_min': float(np.min(wall_secs)),
+                'peak_mb': peak_mb
+            }
+            results.append(result)
+            log('{:>5} min  {:<28} {:>9.4f} s  {:>8.2f} MB'.format(
+                duration_min, name, result['wall_sec'], peak_mb))
+
+        topic_models.discard(gs.key)
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def compare(results, baseline, tolerance=0.25, min_wall_sec=0.01):
+    """Finds the benchmarks that got slower or used more memory than in the
+    baseline.
+
+    Parameters
+    ----------
+    results, baseline : dict
+        As returned by `run_benchmarks`.
+
+    tolerance : float (optional, default=0.25)
+        Relative increase allowed before a benchmark counts as a regression.
+
+    min_wall_sec : float (optional, default=0.01)
+        Timings shorter than this (in the baseline) are too noisy to compare.
+
+    Returns
+    -------
+    regressions : list of dict
+        Each is like {'name', 'duration_min', 'metric', 'baseline', 'value'}.
+    """
+    previous = {
+        (r['name'], r['duration_min']): r for r in baseline['results']
+    }
+    regressions = []
+    for result in results['results']:
+        old = previous.get((result['name'], result['duration_min']))
+        if old is None:
+            continue
+        for metric in ['wall_sec', 'peak_mb']:
+            if metric == 'wall_sec' and old[metric] < min_wall_sec:
+                continue
+            if result[metric] > old[metric] * (1 + tolerance):
+                regressions.append({
+                    'name': result['name'],
+                    'duration_min': result['duration_min'],
+                    'metric': metric,
+                    'baseline': old[metric],
+                    'value': result[metric]
+                })
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run',
+        description='Benchmarks the speech analysis at several talk lengths.'
+    )
+    parser.add_argument(
+        '--durations', type=float, nargs='+', default=DEFAULT_DURATIONS_MIN,
+        help='talk lengths to benchmark (in minutes)'
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', default=SEED_FILENAME,
+                        help='pickled responses the talks are made from')
+    parser.add_argument('--output', help='where to write the results (JSON)')
+    parser.add_argument('--baseline',
+                        help='results (JSON) to compare this run against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv[1:])
+
+    results = run_benchmarks(args.durations, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('wrote results to', args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+        for r in regressions:
+            print('REGRESSION {name} ({duration_min} min): {metric} '
+                  '{baseline:.4f} -> {value:.4f}'.format(**r))
+        if regressions:
+            return 1
+        print('no regressions against', args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,80 @@
+# synthetic.py
+
+import dill
+
+from streaming.speech import WordTimings
+from streaming.utils import set_duration_secs
+
+
+SEED_FILENAME = (
+    "data/Aala El-Khani -- What it's like to be a parent in a war zone.pkd"
+)
+
+
+def load_seed_responses(filename=SEED_FILENAME):
+    """Loads the pickled (dill) results that synthetic speeches are made of."""
+    with open(filename, 'rb') as f:
+        return dill.load(f)
+
+
+def make_synthetic_responses(seed_responses, duration_min, gap_secs=1.5,
+                             stream_secs=50.):
+    """Makes a speech of about `duration_min` minutes by repeating a recorded
+    speech back to back, shifting the timestamps of every copy.
+
+    Like the real API, the timestamps start again from zero (a new stream)
+    with the first result that starts more than `stream_secs` into the
+    current stream, so GoogleSpeech has to rebase them.
+
+    Parameters
+    ----------
+    seed_responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+
+    duration_min : float
+        How long the synthetic speech should be (in minutes). Only whole
+        results are used, so it ends at the last result that fits.
+
+    gap_secs : float (optional, default=1.5)
+        Pause between the end of one copy of the speech and the next.
+
+    stream_secs : float (optional, default=50.)
+        How long each stream lasts (in seconds of the speech).
+
+    Returns
+    -------
+    responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+    """
+    seed = [r for r in seed_responses if r.alternatives]
+    timings = WordTimings.from_responses(seed)
+    offsets = timings.response_offsets()
+    seed_secs = (timings.end_secs + offsets[timings.response_ixs]).max()
+
+    duration_secs = duration_min * 60.
+    responses = []
+    copy_ix = 0
+    # where the current stream started, on the speech's timeline.
+    stream_start = 0.
+    while True:
+        copy_shift = copy_ix * (seed_secs + gap_secs)
+        for result_ix, result in enumerate(seed):
+            shift = offsets[result_ix] + copy_shift
+            words = result.alternatives[0].words
+            if words and \
+               _secs(words[-1].end_time) + shift > duration_secs:
+                return responses
+            if words and \
+               _secs(words[0].start_time) + shift - stream_start > stream_secs:
+                stream_start = _secs(words[0].start_time) + shift
+            shift -= stream_start
+
+            synthetic = type(result)()
+            synthetic.CopyFrom(result)
+            for word in synthetic.alternatives[0].words:
+                for duration in [word.start_time, word.end_time]:
+                    set_duration_secs(duration, _secs(duration) + shift)
+            responses.append(synthetic)
+        copy_ix += 1
+
+
+def _secs(duration):
+    return duration.seconds + duration.nanos * 1e-9
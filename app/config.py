@@ -14,6 +14,82 @@ class BaseConfig(object):
     HOST = '0.0.0.0'
     PORT = 8000
 
+    # recording sessions (one per connected client) that are no longer
+    # recording are dropped after this many idle seconds, or sooner if all
+    # sessions together use more than the memory budget.
+    SESSION_IDLE_TIMEOUT_SEC = 30 * 60
+    SESSION_MEMORY_BUDGET_MB = 1024
+
+    # only each session's most recent speeches are kept as GoogleSpeech
+    # objects; older ones are spilled to this SQLite file (None keeps it in
+    # memory) and rebuilt when they are needed again.
+    SPEECHES_IN_MEMORY_PER_SESSION = 2
+    SPEECH_STORE_FILENAME = 'artifacts/speeches.sqlite'
+
+    # each session's recordings are kept in a directory of their own under
+    # `ARTIFACTS_DIR` (outside of static/, so they are only served through
+    # /recordings). Directories untouched for `ARTIFACTS_MAX_AGE_SEC` are
+    # removed, and then the oldest files until they fit in `ARTIFACTS_MAX_MB`.
+    ARTIFACTS_DIR = 'artifacts'
+    ARTIFACTS_MAX_MB = 512
+    ARTIFACTS_MAX_AGE_SEC = 24 * 60 * 60
+
+    # fitted LDA models are cached per (speech, number of topics). After a
+    # speech is analyzed, the topic counts within `TOPIC_PREFETCH_RADIUS` of
+    # the slider's value are fit in the background.
+    TOPIC_MODEL_CACHE_SIZE = 64
+    TOPIC_PREFETCH_RADIUS = 2
+    MIN_NUM_TOPICS = 1
+    MAX_NUM_TOPICS = 9
+
+    # finished recordings are analyzed by a pool of worker processes; at most
+    # `ANALYSIS_MAX_QUEUE` recordings can be waiting on (or in) analysis.
+    ANALYSIS_WORKERS = 2
+    ANALYSIS_MAX_QUEUE = 8
+    # how the workers are started; not 'fork', since the server has gRPC
+    # threads running by then.
+    ANALYSIS_START_METHOD = 'forkserver'
+    # how long to wait for the recognizer's last responses after a recording
+    # is stopped.
+    RESPONSE_WAIT_TIMEOUT_SEC = 5
+
+    # speech recognition backend used while recording ('google' or 'replay').
+    # 'replay' plays back `REPLAY_RESPONSES_FILENAME` instead of calling the
+    # Google Cloud Speech API, with `REPLAY_LATENCY_SEC` of response latency.
+    RECOGNIZER = 'google'
+    REPLAY_RESPONSES_FILENAME = (
+        "data/Aala El-Khani -- What it's like to be a parent in a war zone.pkd"
+    )
+    REPLAY_LATENCY_SEC = 0.2
+
+    # audio waiting to be sent to the recognizer is held in a bounded buffer
+    # (per stream). When it is full, the oldest audio is dropped ('drop-oldest'),
+    # or the backlog is trimmed to the most recent audio ('coalesce'). 'block'
+    # is not allowed here, since it would make the Socket.IO handler wait.
+    AUDIO_BUFFER_MAX_BYTES = 1024 ** 2
+    AUDIO_MAX_REQUEST_BYTES = 64 * 1024
+    AUDIO_OVERFLOW_POLICY = 'drop-oldest'
+
+    # audio is resampled to this rate (in Hz) before it is sent to the
+    # recognizer, which is all speech recognition needs. None sends the
+    # browser's native rate.
+    RESAMPLE_TARGET_HZ = 16000
+
+    # sustained silence is not sent to the recognizer. A frame is speech if it
+    # is `VAD_THRESHOLD_DB` above the noise floor; audio is still sent for
+    # `VAD_HANGOVER_MS` after speech and `VAD_PRE_ROLL_MS` before it.
+    VAD_ENABLED = True
+    VAD_THRESHOLD_DB = 12
+    VAD_HANGOVER_MS = 400
+    VAD_PRE_ROLL_MS = 200
+
+    # precomputed results for the /example page (see streaming/bundle.py).
+    EXAMPLE_BUNDLE_FILENAME = 'data/example-bundle.json.gz'
+
+    # TED talks the user's speech is matched against (see streaming/ted.py).
+    TED_INDEX_FILENAME = 'data/ted-index.npz'
+    SIMILAR_TED_TALKS = 5
+
 
 class Dev(BaseConfig):
     """Prints all debugging statements, and makes sure app will run on 
@@ -28,6 +104,15 @@ class DevFakeData(Dev):
     LOAD_FAKE_USER_DATA = True
 
 
+class DevReplay(Dev):
+    """Replays a recorded speech instead of using the Google Cloud Speech API,
+    so the app can be run without network access or credentials."""
+    RECOGNIZER = 'replay'
+    # the replayed results are clocked by the audio that is sent, which must
+    # not stall when the microphone only picks up background noise.
+    VAD_ENABLED = False
+
+
 class Production(BaseConfig):
     pass
 
@@ -17,6 +17,10 @@ var audioSignalBarWidth = 10;
 
 var audioBufferSize = 8192;  // 8192 is good for a streaming rate of 44100 Hz.
 
+// how each chunk of audio is sent to the server: 'int16' and 'float32' send
+// raw binary buffers, 'list' sends a JSON list of floats.
+var audioTransportFormat = 'int16';
+
 var audioContext = window.AudioContext || window.webkitAudioContext;
 var context = null;
 var audioInput = null;
@@ -48,6 +52,48 @@ socket.on('create audio url', function(filename) {
     $('audio').attr('src', filename);
 });
 
+// byte range of each word in the recording, so single words can be played.
+var audioSeekIndex = null;
+var playbackContext = null;
+
+socket.on('audio seek index', function(data) {
+    audioSeekIndex = data;
+});
+
+/**
+ * Fetches only the audio of a single word of the recording (with a Range
+ * request) and plays it.
+ * @param {int} wordIx - index of the word in the transcript
+ */
+var playWordAudio = function(wordIx) {
+    if (audioSeekIndex === null || wordIx >= audioSeekIndex['ranges'].length) {
+        return;
+    }
+    var range = audioSeekIndex['ranges'][wordIx];
+    if (range === null) {
+        return;
+    }
+    var sampleRate = audioSeekIndex['sample-rate'];
+    fetch(audioSeekIndex['url'], {headers: {'Range': 'bytes=' + range[0] + '-' + range[1]}})
+        .then(function(response) { return response.arrayBuffer(); })
+        .then(function(data) {
+            // the range holds 16 bit PCM samples, without a WAV header.
+            var samples = new Int16Array(data, 0, Math.floor(data.byteLength / 2));
+            if (playbackContext === null) {
+                playbackContext = new audioContext();
+            }
+            var buffer = playbackContext.createBuffer(1, samples.length, sampleRate);
+            var channel = buffer.getChannelData(0);
+            for (var i = 0; i < samples.length; i++) {
+                channel[i] = samples[i] / 32768;
+            }
+            var source = playbackContext.createBufferSource();
+            source.buffer = buffer;
+            source.connect(playbackContext.destination);
+            source.start();
+        });
+}
+
 socket.on('transcript update', function(data) {
     $('#streaming-transcript').text(data['transcript']);
 });
@@ -56,11 +102,42 @@ socket.on('wpm', function(data){
     $('#current-words-per-min').text(data['words-per-minute']);
 });
 
+socket.on('live pause stats', function(data){
+    var text = data['num-long-pauses'] + ' of ' + data['num-pauses'] +
+        ' (longer than ' + data['long-pause-threshold'].toFixed(2) + ' sec';
+    if (data['kmeans-pause-threshold'] !== null) {
+        text += '; k-means split at ' +
+            data['kmeans-pause-threshold'].toFixed(2) + ' sec';
+    }
+    $('#current-long-pauses').text(text + ')');
+});
+
+socket.on('live word counts', function(data){
+    $('#current-top-words').text(data.map(function(d) {
+        return d['word'] + ' (' + d['count'] + ')';
+    }).join(', '));
+});
+
 socket.on('waiting for responses', function(){
     // this should load a nav modal.
     console.log('waiting for responses.');
 });
 
+socket.on('analysis queued', function(data){
+    console.log('analysis queued, ' + data['queue-depth'] + ' job(s) ahead.');
+});
+
+socket.on('analysis queue full', function(){
+    console.log('the server is busy, your speech could not be analyzed.');
+});
+
+socket.on('similar ted talks', function(talks){
+    var names = talks.map(function(talk) {
+        return talk['name'] + ' (' + Math.round(talk['words-per-min']) + ' wpm)';
+    });
+    $('#similar-ted-talks').text('Most similar TED talks: ' + names.join(', '));
+});
+
 socket.on('waiting for responses complete', function(){
     console.log('we\'ve got responses!');
 });
@@ -100,12 +177,7 @@ var streamFromMicrophone = function () {
                 visualizeAudioSignal(left);
 
                 // send the raw audio to the server.
-                socket.emit(
-                    'audio stream', 
-                    {
-                        'audio': float32toArray(left)
-                    }
-                );
+                socket.emit('audio stream', encodeAudioChunk(left));
             }
             audioInput.connect(recorder);
             recorder.connect(context.destination);
@@ -136,6 +208,26 @@ function float32toArray(buffer){
     return buf;
 }
 
+function float32toInt16(buffer){
+    var buf = new Int16Array(buffer.length);
+    for (i = 0; i < buffer.length; i++) {
+        buf[i] = Math.max(-1, Math.min(1, buffer[i])) * 0x7FFF;
+    }
+    return buf;
+}
+
+// packages a chunk of audio in the format given by `audioTransportFormat`.
+// typed arrays are little-endian on every browser we support.
+var encodeAudioChunk = function(buffer) {
+    if (audioTransportFormat == 'int16') {
+        return {'audio': float32toInt16(buffer).buffer, 'dtype': 'int16'};
+    } else if (audioTransportFormat == 'float32') {
+        // copy, since the input buffer is reused by the audio node.
+        return {'audio': new Float32Array(buffer).buffer, 'dtype': 'float32'};
+    }
+    return {'audio': float32toArray(buffer)};
+}
+
 var visualizeAudioSignal = function(data) {
     var max = 0;
     var mean = 0;
@@ -172,10 +172,14 @@ var show_transcript = function(transcript) {
                     .duration(100)
                     .style('font-weight', 'normal');
             })
-            .on('click', function(datum) {
+            .on('click', function(datum, i) {
                 highlight_words('#completed-interactive-transcript', datum, 'gray');
                 highlight_bar('#most-common-words-plot', datum, 'black', 'steelblue');
                 highlight_bar('#tf-idf-words-plot', datum, 'black', 'orange');
+                // play the word, where the recording is available (/stream).
+                if (typeof playWordAudio === 'function') {
+                    playWordAudio(i);
+                }
             });
 }
 
@@ -52,6 +52,7 @@ socket.on('remove plots', function(d) {
 
     // and get rid of the interactive transcript.
     d3.select('#completed-interactive-transcript').selectAll('*').remove();
+    $('#similar-ted-talks').text('');
 
     //get rid of the running wpm plot and hide the div it's sitting in
     d3.select('#speed-dt-plot').selectAll('svg').selectAll('*').remove();
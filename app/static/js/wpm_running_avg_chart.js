@@ -6,6 +6,10 @@ var all_wpm_data = null;
 var current_slider_vals = null;
 var transcript_selection_num = 0;
 
+// this script is used on both the example.html and stream.html pages.
+var wpm_window_event = window.location.pathname.includes('example') ?
+    'example speech dt window' : 'speech dt window';
+
 /**
  * Sets discrete values for the wpm_running_avg slider given the appropriate
  * bin sizes.
@@ -25,6 +29,7 @@ socket.on('update speech dt slider', function(slider_vals) {
     var wpm_slider = document.getElementById('speed-bin-slider');
     wpm_slider.min = slider_vals[0];
     wpm_slider.max = slider_vals[slider_vals.length-1];
+    wpm_slider.step = 1;
     wpm_slider.value = slider_vals[0];
 
     $('#current-wpm-slider-val').text(slider_vals[0]);
@@ -33,6 +38,14 @@ socket.on('update speech dt slider', function(slider_vals) {
     $('#speed-plot-and-annotations').css('display', 'block');
 });
 
+socket.on('speech dt window data', function(d){
+    all_wpm_data[d.window] = d.data;
+    var wpm_slider = document.getElementById('speed-bin-slider');
+    if (parseInt(wpm_slider.value) == d.window) {
+        update_running_wpm_plot(d.window);
+    }
+});
+
 socket.on('speech less than 10 seconds', function(){
     // do something
 });
@@ -234,25 +247,17 @@ var update_running_wpm_plot = function(ix) {
 }
 
 /**
- * Snap the slider to a specific value on user input.
+ * Show the running average for any window size picked on the slider. Window
+ * sizes that haven't been seen yet are requested from the server.
  */
 $('#speed-bin-slider').change(function() {
     var wpm_slider = document.getElementById('speed-bin-slider');
-    var current_slider_val = wpm_slider.value;
-    
-    var diff = 0;
-    var min_diff = Infinity;
-    var min_diff_val = null;
-    // find out what the closest ticked value is:
-    for (i=0; i<current_slider_vals.length; i++) {
-        diff = Math.abs(current_slider_val - current_slider_vals[i]);
-        if (diff < min_diff) {
-            min_diff = diff;
-            min_diff_val = current_slider_vals[i];
-        }
-    }
+    var current_slider_val = parseInt(wpm_slider.value);
 
-    wpm_slider.value = min_diff_val;
-    $('#current-wpm-slider-val').text(min_diff_val);
-    update_running_wpm_plot(min_diff_val);
+    $('#current-wpm-slider-val').text(current_slider_val);
+    if (all_wpm_data[current_slider_val]) {
+        update_running_wpm_plot(current_slider_val);
+    } else {
+        socket.emit(wpm_window_event, current_slider_val);
+    }
 });
\ No newline at end of file
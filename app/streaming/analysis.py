@@ -0,0 +1,197 @@
+# analysis.py
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+
+from .metrics import timed_stage
+from .stats import count_words, get_running_words_per_min
+from .utils import format_transcript_data
+
+
+class SpeechAnalysis(object):
+    """Tokenizes a speech once, and serves everything the post-recording
+    analysis needs from that single pass.
+
+    The transcript is split into documents on long pauses and turned into a
+    sparse document-term matrix (stop words included). Word counts with and
+    without stop words, the per-word transcript and the input to the LDA are
+    all read from it.
+
+    Parameters
+    ----------
+    google_speech : GoogleSpeech
+    """
+    def __init__(self, google_speech):
+        self.words = google_speech.transcript_as_list()
+        self.documents = google_speech.transcript_split_on_pause()
+
+        self.vectorizer = CountVectorizer(lowercase=True)
+        self.doc_term = self.vectorizer.fit_transform(self.documents).tocsr()
+
+        vocab = self.vectorizer.vocabulary_
+        self.feature_names = np.asarray(sorted(vocab, key=vocab.get))
+        self.is_stop_word = np.asarray(
+            [w in ENGLISH_STOP_WORDS for w in self.feature_names], dtype=bool
+        )
+        self.counts = np.asarray(self.doc_term.sum(axis=0)).ravel()
+
+        self._lda_input = None
+
+    @property
+    def nbytes(self):
+        """Approximate number of bytes held by this analysis."""
+        matrices = [self.doc_term]
+        if self._lda_input is not None:
+            matrices.append(self._lda_input[0])
+        num_bytes = sum(
+            m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in matrices
+        )
+        num_bytes += self.feature_names.nbytes + self.is_stop_word.nbytes
+        num_bytes += self.counts.nbytes
+        num_bytes += sum(len(w) for w in self.words)
+        num_bytes += sum(len(d) for d in self.documents)
+        return num_bytes
+
+    def top_words(self, top_n=10, include_stop_words=False):
+        """Finds the most frequently used words in the speech.
+
+        Parameters
+        ----------
+        top_n : int (optional, default=10)
+            How many words should be returned?
+
+        include_stop_words : bool (optional, default=False)
+            Whether stop words should be included.
+
+        Returns
+        -------
+        list of dict :
+            Each item in the list is a dict like {'word': <word>, 'count': <count>}
+        """
+        if include_stop_words:
+            candidates = np.arange(self.counts.size)
+        else:
+            candidates = np.flatnonzero(~self.is_stop_word)
+
+        # make sure that we have enough words to return.
+        top_n = min(top_n, candidates.size)
+        if top_n <= 0:
+            return []
+
+        # most frequent first; ties are broken in reverse alphabetical order
+        # (the columns are in alphabetical order), as the original stable
+        # sort by count did. Counts and columns are combined into one key,
+        # so only the top n need to be sorted.
+        keys = self.counts[candidates].astype(np.int64) * self.counts.size + candidates
+        if top_n < candidates.size:
+            part = np.argpartition(-keys, top_n - 1)[:top_n]
+            candidates, keys = candidates[part], keys[part]
+        top_n_ixs = candidates[np.argsort(-keys)]
+
+        return [
+            {'word': str(self.feature_names[ix]), 'count': int(self.counts[ix])}
+            for ix in top_n_ixs
+        ]
+
+    def transcript_payload(self):
+        """Every word of the transcript, formatted so it can be plotted by D3.
+
+        Returns
+        -------
+        list of dict
+            Each item is a single word in the transcript, like [{'word': <word>}]
+        """
+        return [{'word': word} for word in self.words]
+
+    def lda_input(self):
+        """The document-term matrix without stop words, used to fit the LDA.
+
+        Returns
+        -------
+        doc_term : scipy.sparse.csr_matrix of shape (N_documents, N_words)
+
+        feature_names : np.array of string
+            The word belonging to each column of `doc_term`.
+        """
+        if self._lda_input is None:
+            columns = np.flatnonzero(~self.is_stop_word)
+            if columns.size == 0:
+                raise ValueError(
+                    'empty vocabulary; the speech only contains stop words'
+                )
+            self._lda_input = (
+                self.doc_term[:, columns],
+                self.feature_names[columns]
+            )
+        return self._lda_input
+
+
+def iter_analysis_payloads(google_speech, mode='user', live_stats=None,
+                           stage_secs=None):
+    """Runs each stage of the analysis of a speech, yielding the Socket.IO
+    event (and data) for each stage as soon as it is done.
+
+    Parameters
+    ----------
+    google_speech : GoogleSpeech
+    mode : string (options are 'user' or 'example')
+        If mode == 'user', 'speech processing done' is yielded along with the
+        other events.
+    live_stats : OnlineSpeechStats (optional, default=None)
+        The statistics kept while the speech was being recorded. If given, the
+        word counts are read from it instead of being computed again.
+    stage_secs : dict (optional, default=None)
+        If given, how long each stage took (in seconds) is stored in it. Every
+        stage is also timed in the `talk_analysis_stage_seconds` metric.
+
+    Yields
+    ------
+    event : string
+        'speech processing done' (if mode == 'user')
+        'word counts including stop'
+        'word counts excluding stop'
+        'update speech dt slider'
+        'make speech dt plot' (or 'speech less than 10 seconds')
+        'topic modeling'
+
+    data : object or None
+        What to emit with the event. None if the event has no data.
+    """
+    if mode not in ['user', 'example']:
+        raise AttributeError('`mode` must be either \'user\' or \'example\'')
+
+    with timed_stage('analysis.word_counts', stage_secs):
+        transcript_data = format_transcript_data(google_speech)
+        if live_stats is not None:
+            word_data_excluding_stop = live_stats.top_words(10, include_stop_words=False)
+            word_data_including_stop = live_stats.top_words(10, include_stop_words=True)
+        else:
+            word_data_excluding_stop = count_words(
+                google_speech, include_stop_words=False, return_top_n=10
+            )
+            word_data_including_stop = count_words(
+                google_speech, include_stop_words=True, return_top_n=10
+            )
+
+    if mode == 'user':
+        yield 'speech processing done', None
+
+    yield (
+        'word counts including stop',
+        {'counts': word_data_including_stop, 'transcript': transcript_data}
+    )
+    yield 'word counts excluding stop', word_data_excluding_stop
+
+    # and plot the running average of wpm values.
+    with timed_stage('analysis.words_per_min', stage_secs):
+        bin_sizes, data = get_running_words_per_min(google_speech)
+    if bin_sizes != -1:
+        yield 'update speech dt slider', bin_sizes
+        yield 'make speech dt plot', data
+    else:
+        yield 'speech less than 10 seconds', None
+
+    # and the topics
+    with timed_stage('analysis.topics', stage_secs):
+        topics = google_speech.get_all_topics(10)
+    yield 'topic modeling', topics
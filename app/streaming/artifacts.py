@@ -0,0 +1,150 @@
+# artifacts.py
+
+import os
+import re
+import time
+import shutil
+import threading
+
+
+# artifacts are plain file names, which cannot lead out of their directory.
+ARTIFACT_NAME = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*$')
+
+
+def _safe_name(name):
+    """Makes a string safe to use as a file or directory name."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', name)
+
+
+class ArtifactStore(object):
+    """Keeps the files made for each session (recordings, speech files) in a
+    directory of their own under `root`.
+
+    Old files are removed by `sweep`: a session's directory is removed once
+    nothing in it has changed for `max_age_sec`, and then the oldest files are
+    removed until everything together takes up at most `max_bytes`.
+
+    Parameters
+    ----------
+    root : string
+
+    max_bytes : int (optional, default=512 MB)
+
+    max_age_sec : float (optional, default=86400)
+    """
+    def __init__(self, root, max_bytes=512 * 1024**2, max_age_sec=24 * 60 * 60):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self._lock = threading.Lock()
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def _session_dir(self, sid):
+        return os.path.join(self.root, _safe_name(sid))
+
+    def path(self, sid, name):
+        """Where the file `name` of a session is kept. The session's
+        directory is made if needed.
+
+        Raises
+        ------
+        ValueError
+            If `name` is not a plain file name.
+        """
+        if not ARTIFACT_NAME.match(name):
+            raise ValueError('{!r} is not a valid artifact name.'.format(name))
+        session_dir = self._session_dir(sid)
+        with self._lock:
+            if not os.path.exists(session_dir):
+                os.makedirs(session_dir)
+        return os.path.join(session_dir, name)
+
+    def find(self, sid, name):
+        """The path of an existing file of a session, or None if there is no
+        such file."""
+        if not ARTIFACT_NAME.match(name):
+            return None
+        path = os.path.join(self._session_dir(sid), name)
+        return path if os.path.isfile(path) else None
+
+    def remove_session(self, sid):
+        """Removes every file of a session."""
+        with self._lock:
+            shutil.rmtree(self._session_dir(sid), ignore_errors=True)
+
+    def _files(self):
+        """Every file, as (session dir name, path, size, mtime)."""
+        files = []
+        for dir_name in os.listdir(self.root):
+            session_dir = os.path.join(self.root, dir_name)
+            if not os.path.isdir(session_dir):
+                continue
+            for name in os.listdir(session_dir):
+                path = os.path.join(session_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((dir_name, path, stat.st_size, stat.st_mtime))
+        return files
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(size for _, _, size, _ in self._files())
+
+    def sweep(self, keep=(), now=None):
+        """Removes old files, leaving the sessions in `keep` alone.
+
+        Parameters
+        ----------
+        keep : iterable of string
+            `sid`s of the sessions whose files are in use (like the ones that
+            are still recording).
+
+        now : float (optional, default=None)
+            Current time (as from `time.time`).
+
+        Returns
+        -------
+        removed : list of string
+            Paths of the files that were removed.
+        """
+        if now is None:
+            now = time.time()
+        keep = set(_safe_name(sid) for sid in keep)
+
+        with self._lock:
+            files = self._files()
+            # empty directories expire too.
+            last_modified = dict(
+                (dir_name, os.path.getmtime(os.path.join(self.root, dir_name)))
+                for dir_name in os.listdir(self.root)
+                if os.path.isdir(os.path.join(self.root, dir_name))
+            )
+            for dir_name, _, _, mtime in files:
+                last_modified[dir_name] = max(last_modified.get(dir_name, 0), mtime)
+            expired = set(
+                dir_name for dir_name, mtime in last_modified.items()
+                if dir_name not in keep and now - mtime > self.max_age_sec
+            )
+
+            removed = [path for dir_name, path, _, _ in files if dir_name in expired]
+            files = [f for f in files if f[0] not in expired]
+            for dir_name in expired:
+                shutil.rmtree(os.path.join(self.root, dir_name), ignore_errors=True)
+
+            # then the oldest files, until everything fits.
+            total = sum(size for _, _, size, _ in files)
+            for dir_name, path, size, _ in sorted(files, key=lambda f: f[3]):
+                if total <= self.max_bytes:
+                    break
+                if dir_name in keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed.append(path)
+                total -= size
+        return removed
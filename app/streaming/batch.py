@@ -0,0 +1,420 @@
+# batch.py
+#
+# Analyzes every recording in a directory, outside of the app, in a pool of
+# worker processes. Run (from `app/`):
+#
+#     python -m streaming.batch <recordings dir> <reports dir> [--workers N]
+#
+# A recording is a speech file (.speech), a pickled (dill) list of the
+# recognizer's results (.pkd) or a WAV file (.wav), which is transcribed with
+# `--recognizer` first. If a recording is in more than one of these formats,
+# the first one in INPUT_EXTENSIONS is used.
+#
+# A JSON report is written for each recording (mirroring the layout of the
+# recordings dir), along with `summary.csv`, which has a row per recording.
+# Recordings that already have a report are skipped, so an interrupted run
+# picks up where it left off; use `--force` to analyze everything again.
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import dill
+import numpy as np
+import scipy.io.wavfile
+
+from .speech import GoogleSpeech, WordTimings
+from .topics import topic_models
+from .analysis import iter_analysis_payloads
+from .streaming import AudioStream
+from .recognizers import make_recognizer
+from .utils import float_to_int16
+
+
+REPORT_VERSION = 1
+
+# in order of preference.
+INPUT_EXTENSIONS = ['.speech', '.pkd', '.wav']
+
+SUMMARY_FILENAME = 'summary.csv'
+SUMMARY_COLUMNS = [
+    'talk', 'status', 'num-words', 'duration-sec', 'words-per-min',
+    'mean-pause-sec', 'num-long-pauses', 'top-words', 'analysis-sec', 'error'
+]
+
+
+def find_recordings(directory):
+    """Finds the recordings in a directory (and its subdirectories).
+
+    Returns
+    -------
+    recordings : list of (string, string)
+        (name, filename) of each recording, sorted by name. The name is the
+        recording's path relative to `directory`, without its extension.
+    """
+    found = {}
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in files:
+            stem, extension = os.path.splitext(filename)
+            extension = extension.lower()
+            if extension not in INPUT_EXTENSIONS:
+                continue
+            name = os.path.relpath(os.path.join(root, stem), directory)
+            name = name.replace(os.sep, '/')
+            found.setdefault(name, []).append(
+                (INPUT_EXTENSIONS.index(extension), os.path.join(root, filename))
+            )
+    return [(name, min(found[name])[1]) for name in sorted(found)]
+
+
+def report_filename(output_dir, name):
+    return os.path.join(output_dir, *(name + '.json').split('/'))
+
+
+def read_wav(filename):
+    """Reads a WAV file as mono 16 bit PCM.
+
+    Returns
+    -------
+    sample_rate : int
+    audio : np.array of np.int16
+    """
+    sample_rate, audio = scipy.io.wavfile.read(filename)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1).astype(audio.dtype)
+    if audio.dtype.kind == 'f':
+        audio = float_to_int16(audio)
+    elif audio.dtype != np.int16:
+        raise ValueError('{} is not 16 bit PCM or float.'.format(filename))
+    return sample_rate, audio
+
+
+def transcribe_wav(filename, recognizer='google', language_code='en-US',
+                   recognizer_options=None, chunk_ms=250, timeout_sec=60):
+    """Transcribes a WAV file by streaming it through an AudioStream, the
+    same way the app streams a recording.
+
+    Parameters
+    ----------
+    filename : string
+    recognizer : string (optional, default='google')
+        'google' or 'replay' (see `make_recognizer`).
+    language_code : string (optional, default='en-US')
+    recognizer_options : dict (optional, default=None)
+        Passed on to `make_recognizer`.
+    chunk_ms : int (optional, default=250)
+        Length of each chunk of audio added to the stream (in milliseconds).
+    timeout_sec : float (optional, default=60)
+        How long to wait for the last responses once all of the audio has
+        been sent.
+
+    Returns
+    -------
+    responses : list of google.cloud.speech_v1.types.StreamingRecognitionResult
+        The `is_final` results, on the recording's timeline.
+    """
+    sample_rate, audio = read_wav(filename)
+    audio_stream = AudioStream(
+        sample_rate, language_code=language_code,
+        recognizer=make_recognizer(
+            recognizer, sample_rate, language_code=language_code,
+            **(recognizer_options or {})
+        ),
+        overflow='block'
+    )
+    audio_stream.closed = False
+    audio_stream.start()
+    try:
+        chunk_size = max(int(sample_rate * chunk_ms / 1000.), 1)
+        max_queued_bytes = 4 * chunk_size * 2
+        for start in range(0, audio.size, chunk_size):
+            audio_stream.add_chunk(audio[start:start + chunk_size])
+            # the file is read far faster than real time; let the recognizer
+            # keep up, or the backlog of rotated streams would be dropped.
+            while audio_stream.buffer_metrics()['queued_bytes'] > max_queued_bytes:
+                time.sleep(0.001)
+    finally:
+        audio_stream.closed = True
+
+    wait_start = time.time()
+    while audio_stream.waiting_for_responses or not audio_stream.is_finished():
+        if time.time() - wait_start > timeout_sec:
+            raise RuntimeError(
+                'the recognizer did not finish {} within {} sec.'.format(
+                    filename, timeout_sec)
+            )
+        time.sleep(0.05)
+    return list(audio_stream.responses)
+
+
+def load_recording(filename, num_topics=5, **transcribe_options):
+    """Builds a GoogleSpeech from a recording in any of INPUT_EXTENSIONS."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.speech':
+        return GoogleSpeech.from_file(filename, num_topics=num_topics)
+    if extension == '.pkd':
+        with open(filename, 'rb') as f:
+            responses = dill.load(f)
+    else:
+        # AudioStream already moved them onto the recording's timeline.
+        responses = WordTimings.from_responses(
+            transcribe_wav(filename, **transcribe_options), rebased=True
+        )
+    return GoogleSpeech(responses, num_topics=num_topics)
+
+
+def speech_summary(google_speech, analysis):
+    """The numbers that go in the summary table, for a speech and the results
+    of `iter_analysis_payloads` for it."""
+    timestamps = google_speech.mean_timestamps()
+    pauses = google_speech.pause_durations()
+    duration_sec = float(timestamps[-1] - timestamps[0]) if timestamps.size else 0.
+    summary = {
+        'num-words': len(google_speech.transcript_as_list()),
+        'duration-sec': duration_sec,
+        'words-per-min': None,
+        'mean-pause-sec': None,
+        'num-long-pauses': 0,
+        'top-words': [
+            item['word'] for item in analysis['word counts excluding stop'][:5]
+        ]
+    }
+    if duration_sec > 0:
+        summary['words-per-min'] = float(google_speech.words_per_min())
+    if pauses.size:
+        summary['mean-pause-sec'] = float(np.mean(pauses))
+        summary['num-long-pauses'] = int(
+            np.sum(pauses > google_speech.std_threshold())
+        )
+    return summary
+
+
+def analyze_recording(name, filename, report, num_topics=5,
+                      transcribe_options=None):
+    """Runs the full analysis of a recording and writes its report. Runs in a
+    worker process.
+
+    Parameters
+    ----------
+    name : string
+    filename : string
+        The recording.
+    report : string
+        Where to write the report (JSON).
+    num_topics : int (optional, default=5)
+    transcribe_options : dict (optional, default=None)
+        Passed on to `transcribe_wav` for WAV files.
+
+    Returns
+    -------
+    row : dict
+        The recording's row of the summary table.
+    """
+    start = time.perf_counter()
+    google_speech = load_recording(
+        filename, num_topics=num_topics, **(transcribe_options or {})
+    )
+    try:
+        stage_secs = dict(google_speech.stage_secs)
+        analysis = dict(iter_analysis_payloads(
+            google_speech, mode='example', stage_secs=stage_secs
+        ))
+    finally:
+        # the worker only sees each speech once.
+        topic_models.discard(google_speech.key)
+
+    summary = speech_summary(google_speech, analysis)
+    summary['analysis-sec'] = time.perf_counter() - start
+    data = {
+        'version': REPORT_VERSION,
+        'talk': name,
+        'source': os.path.abspath(filename),
+        'summary': summary,
+        'stage-secs': stage_secs,
+        'analysis': analysis
+    }
+
+    # written in one go, so an interrupted run never leaves half a report.
+    report_dir = os.path.dirname(report)
+    if report_dir and not os.path.exists(report_dir):
+        os.makedirs(report_dir, exist_ok=True)
+    with open(report + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(report + '.tmp', report)
+    return summary_row(name, summary)
+
+
+def summary_row(name, summary, error=None):
+    if error is not None:
+        return {'talk': name, 'status': 'failed', 'error': error}
+    row = dict(summary, talk=name, status='ok')
+    row['top-words'] = ' '.join(summary['top-words'])
+    return row
+
+
+def read_summary_row(name, report):
+    """The summary row of a recording that was analyzed in an earlier run."""
+    with open(report) as f:
+        return summary_row(name, json.load(f)['summary'])
+
+
+def write_summary(rows, filename):
+    with open(filename + '.tmp', 'w', newline='') as f:
+        writer = csv.DictWriter(f, SUMMARY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(
+                (column, '{:.3f}'.format(value) if isinstance(value, float) else value)
+                for column, value in row.items()
+            ))
+    os.replace(filename + '.tmp', filename)
+
+
+def _format_secs(secs):
+    minutes, secs = divmod(int(round(secs)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{}:{:02}:{:02}'.format(hours, minutes, secs)
+
+
+class Progress(object):
+    """Prints a line for each recording as it is done, with the throughput
+    so far and an estimate of the time left.
+
+    Parameters
+    ----------
+    total : int
+        Number of recordings that will be analyzed.
+
+    out : file (optional, default=sys.stdout)
+    """
+    def __init__(self, total, out=sys.stdout):
+        self.total = total
+        self.out = out
+        self.num_done = 0
+        self.num_failed = 0
+        self.speech_secs = 0.
+        self.start = time.time()
+
+    def update(self, row):
+        self.num_done += 1
+        if row['status'] == 'ok':
+            self.speech_secs += row['duration-sec']
+            status = 'ok ({:.1f} sec)'.format(row['analysis-sec'])
+        else:
+            self.num_failed += 1
+            status = 'FAILED: {}'.format(row['error'])
+
+        elapsed = max(time.time() - self.start, 1e-9)
+        rate = self.num_done / elapsed
+        print('[{:>{width}}/{}] {} {} | {:.2f} talks/sec, {:.1f} speech-min/sec, '
+              'eta {}'.format(
+                  self.num_done, self.total, row['talk'], status, rate,
+                  self.speech_secs / 60 / elapsed,
+                  _format_secs((self.total - self.num_done) / rate),
+                  width=len(str(self.total))),
+              file=self.out)
+        self.out.flush()
+
+
+def run_batch(directory, output_dir, workers=None, num_topics=5, force=False,
+              transcribe_options=None, out=sys.stdout):
+    """Analyzes every recording in `directory` that does not have a report
+    in `output_dir` yet (or every recording, if `force`), then writes the
+    summary table.
+
+    Returns
+    -------
+    rows : list of dict
+        Summary row of every recording (including those analyzed before).
+    """
+    recordings = find_recordings(directory)
+    reports = dict(
+        (name, report_filename(output_dir, name)) for name, _ in recordings
+    )
+    todo = [
+        (name, filename) for name, filename in recordings
+        if force or not os.path.exists(reports[name])
+    ]
+    print('{} recordings, {} already analyzed, {} to analyze.'.format(
+        len(recordings), len(recordings) - len(todo), len(todo)), file=out)
+
+    rows = {}
+    progress = Progress(len(todo), out=out)
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = dict(
+                (pool.submit(analyze_recording, name, filename, reports[name],
+                             num_topics, transcribe_options), name)
+                for name, filename in todo
+            )
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    rows[name] = future.result()
+                except Exception as e:
+                    rows[name] = summary_row(name, None, error=repr(e))
+                progress.update(rows[name])
+
+    for name, _ in recordings:
+        if name not in rows:
+            rows[name] = read_summary_row(name, reports[name])
+    rows = [rows[name] for name, _ in recordings]
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    summary = os.path.join(output_dir, SUMMARY_FILENAME)
+    write_summary(rows, summary)
+
+    elapsed = time.time() - progress.start
+    print('analyzed {} recordings ({} failed) in {}, wrote {}'.format(
+        progress.num_done, progress.num_failed, _format_secs(elapsed), summary),
+        file=out)
+    return rows
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m streaming.batch',
+        description='Analyzes every recording in a directory.'
+    )
+    parser.add_argument('recordings', help='directory of .speech, .pkd or .wav files')
+    parser.add_argument('output', help='directory to write the reports to')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--num-topics', type=int, default=5)
+    parser.add_argument('--force', action='store_true',
+                        help='analyze recordings that already have a report again')
+    parser.add_argument('--recognizer', default='google', choices=['google', 'replay'],
+                        help='how WAV files are transcribed')
+    parser.add_argument('--replay-file', default=None,
+                        help='pickled results the replay recognizer plays back')
+    parser.add_argument('--language-code', default='en-US')
+    args = parser.parse_args(argv[1:])
+
+    if not os.path.isdir(args.recordings):
+        parser.error('{} is not a directory'.format(args.recordings))
+    transcribe_options = {
+        'recognizer': args.recognizer, 'language_code': args.language_code
+    }
+    if args.recognizer == 'replay':
+        if args.replay_file is None:
+            parser.error('--recognizer replay needs --replay-file')
+        transcribe_options['recognizer_options'] = {
+            'filename': args.replay_file, 'latency_sec': 0.
+        }
+
+    rows = run_batch(
+        args.recordings, args.output, workers=args.workers,
+        num_topics=args.num_topics, force=args.force,
+        transcribe_options=transcribe_options
+    )
+    return 1 if any(row['status'] != 'ok' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,231 @@
+# buffers.py
+
+import bisect
+import threading
+from collections import deque
+
+
+OVERFLOW_POLICIES = ['block', 'drop-oldest', 'coalesce']
+# the policies that never make `put` wait.
+NON_BLOCKING_OVERFLOW_POLICIES = ['drop-oldest', 'coalesce']
+
+
+class AudioRingBuffer(object):
+    """Bounded buffer of 16 bit audio waiting to be sent to the recognizer.
+
+    At most `max_bytes` of audio are held at once. What happens to audio that
+    does not fit depends on `overflow`:
+
+    'block'
+        `put` waits (for up to `block_timeout_sec`) for the recognizer to take
+        audio out of the buffer. If there is still no room, the new chunk is
+        dropped.
+    'drop-oldest'
+        Whole chunks are dropped from the front of the buffer until the new
+        one fits.
+    'coalesce'
+        The buffer is joined into one contiguous block of audio, and only the
+        most recent `max_bytes` of it are kept (so no more audio is dropped
+        than needed).
+
+    Dropped audio leaves gaps in what `get` returns; `input_position` maps a
+    position in the returned audio back onto the audio that was `put`.
+
+    Parameters
+    ----------
+    max_bytes : int (optional, default=1048576)
+        Most audio the buffer can hold (in bytes).
+
+    max_request_bytes : int (optional, default=65536)
+        Most audio returned by a single `get` (in bytes), i.e. the largest
+        request that is sent to the recognizer.
+
+    overflow : string (optional, default='drop-oldest')
+        One of 'block', 'drop-oldest' or 'coalesce'.
+
+    block_timeout_sec : float (optional, default=1.)
+        How long `put` waits for room when `overflow` is 'block'.
+    """
+    def __init__(self, max_bytes=1024 ** 2, max_request_bytes=65536,
+                 overflow='drop-oldest', block_timeout_sec=1.):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('`overflow` must be one of {}'.format(OVERFLOW_POLICIES))
+        # whole samples only.
+        self.max_bytes = max_bytes - max_bytes % 2
+        self.max_request_bytes = max(max_request_bytes - max_request_bytes % 2, 2)
+        self.overflow = overflow
+        self.block_timeout_sec = block_timeout_sec
+
+        self.nbytes = 0
+        self.max_nbytes = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.num_overflows = 0
+        self.dropped_bytes = 0
+
+        # (input position, chunk), where the input position counts every
+        # byte that was `put` before the chunk, dropped or not.
+        self._chunks = deque()
+        self._cond = threading.Condition()
+        # output and input positions where the audio returned by `get` skips
+        # over dropped audio.
+        self._gap_outputs = [0]
+        self._gap_inputs = [0]
+
+    def __len__(self):
+        """Number of chunks in the buffer."""
+        return len(self._chunks)
+
+    def empty(self):
+        return self.nbytes == 0
+
+    def put(self, chunk):
+        """Adds a chunk of audio (bytes) to the end of the buffer.
+
+        Returns
+        -------
+        accepted : bool
+            False if the chunk was dropped.
+        """
+        with self._cond:
+            position = self.bytes_in
+            self.bytes_in += len(chunk)
+            if len(chunk) > self.max_bytes:
+                # only the end of the chunk can ever fit.
+                self.num_overflows += 1
+                self.dropped_bytes += len(chunk) - self.max_bytes
+                position += len(chunk) - self.max_bytes
+                chunk = chunk[len(chunk) - self.max_bytes:]
+            if len(chunk) == 0:
+                return True
+
+            if self.nbytes + len(chunk) > self.max_bytes:
+                self.num_overflows += 1
+                if not self._make_room(len(chunk)):
+                    self.dropped_bytes += len(chunk)
+                    return False
+
+            self._chunks.append((position, chunk))
+            self.nbytes += len(chunk)
+            self.max_nbytes = max(self.max_nbytes, self.nbytes)
+            self._cond.notify()
+        return True
+
+    def _make_room(self, nbytes):
+        """Makes room for `nbytes` according to the overflow policy. Must hold
+        `self._cond`. Returns False if there is no room."""
+        if self.overflow == 'block':
+            return self._cond.wait_for(
+                lambda: self.nbytes + nbytes <= self.max_bytes,
+                timeout=self.block_timeout_sec
+            )
+
+        if self.overflow == 'drop-oldest':
+            while self._chunks and self.nbytes + nbytes > self.max_bytes:
+                _, dropped = self._chunks.popleft()
+                self.nbytes -= len(dropped)
+                self.dropped_bytes += len(dropped)
+            return True
+
+        # coalesce. The buffered audio is contiguous, since this policy only
+        # ever drops from the front.
+        position = self._chunks[0][0] if self._chunks else 0
+        data = b''.join(chunk for _, chunk in self._chunks)
+        num_dropped = len(data) + nbytes - self.max_bytes
+        self._chunks = deque(
+            [(position + num_dropped, data[num_dropped:])]
+            if num_dropped < len(data) else []
+        )
+        self.nbytes = len(data) - min(num_dropped, len(data))
+        self.dropped_bytes += min(num_dropped, len(data))
+        return True
+
+    def clear(self):
+        """Drops all the audio in the buffer.
+
+        Returns
+        -------
+        num_bytes : int
+            How much audio was dropped.
+        """
+        with self._cond:
+            num_bytes = self.nbytes
+            if num_bytes > 0:
+                self.num_overflows += 1
+                self.dropped_bytes += num_bytes
+            self._chunks.clear()
+            self.nbytes = 0
+            self._cond.notify_all()
+        return num_bytes
+
+    def get(self, timeout=None):
+        """Takes up to `max_request_bytes` of audio from the front of the
+        buffer, waiting up to `timeout` seconds for some to arrive.
+
+        Returns
+        -------
+        data : bytes or None
+            None if there was no audio.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.nbytes > 0, timeout=timeout):
+                return None
+
+            data = []
+            size = 0
+            while self._chunks and size < self.max_request_bytes:
+                position, chunk = self._chunks.popleft()
+                room = self.max_request_bytes - size
+                if len(chunk) > room:
+                    self._chunks.appendleft((position + room, chunk[room:]))
+                    chunk = chunk[:room]
+                output = self.bytes_out + size
+                if position != self._input_position(output):
+                    self._gap_outputs.append(output)
+                    self._gap_inputs.append(position)
+                data.append(chunk)
+                size += len(chunk)
+
+            self.nbytes -= size
+            self.bytes_out += size
+            self._cond.notify_all()
+        return b''.join(data)
+
+    def _input_position(self, output):
+        ix = bisect.bisect_right(self._gap_outputs, output) - 1
+        return self._gap_inputs[ix] + output - self._gap_outputs[ix]
+
+    def input_position(self, output):
+        """Maps a position in the audio returned by `get` onto the audio that
+        was `put`, counting the audio that was dropped before it.
+
+        Parameters
+        ----------
+        output : int
+            Bytes into the audio returned by `get`.
+
+        Returns
+        -------
+        input : int
+            Bytes into the audio given to `put`.
+        """
+        with self._cond:
+            return self._input_position(output)
+
+    def metrics(self):
+        """Current size of the buffer and how often it has overflowed.
+
+        Returns
+        -------
+        metrics : dict
+        """
+        with self._cond:
+            return {
+                'queue_depth': len(self._chunks),
+                'queued_bytes': self.nbytes,
+                'max_queued_bytes': self.max_nbytes,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'overflows': self.num_overflows,
+                'dropped_bytes': self.dropped_bytes
+            }
@@ -0,0 +1,119 @@
+# bundle.py
+#
+# Precomputes everything the /example page shows, so the server does not have
+# to analyze the example speech at all. Build the bundle (from `app/`) with:
+#
+#     python -m streaming.bundle <responses.pkd> <bundle.json.gz>
+#
+# The bundle for the example speech is committed as data/example-bundle.json.gz
+# (it is not rebuilt when the app is deployed). tests/test_bundle.py checks
+# that it is what this module builds, so rebuild it whenever the analysis
+# changes.
+
+import sys
+import gzip
+import json
+
+import dill
+import numpy as np
+
+from .speech import GoogleSpeech
+from .analysis import iter_analysis_payloads
+
+
+BUNDLE_VERSION = 2
+
+
+def _to_builtin(obj):
+    """Used by json.dump for the numpy types found in the payloads."""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError('{} is not JSON serializable'.format(type(obj)))
+
+
+def build_example_bundle(responses, topic_counts=range(1, 10),
+                         default_num_topics=5):
+    """Runs the full analysis of a speech, for every number of topics.
+
+    Parameters
+    ----------
+    responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+
+    topic_counts : iterable of int (optional, default=range(1, 10))
+        Every value the topics slider can take.
+
+    default_num_topics : int (optional, default=5)
+        The number of topics shown when the page is first loaded.
+
+    Returns
+    -------
+    bundle : dict
+        'payloads' is a list of [event, data] pairs to emit when the page is
+        loaded (without 'topic modeling'), and 'topics' maps each number of
+        topics (as a string) to its 'topic modeling' data. 'word_times' and
+        'words' are the mean timestamp of each word and the transcript, used
+        to build a WordRateIndex for any other speech dt window.
+    """
+    gs = GoogleSpeech(responses, num_topics=default_num_topics)
+    payloads = [
+        [event, data] for event, data in iter_analysis_payloads(gs, mode='example')
+        if event != 'topic modeling'
+    ]
+
+    topics = {}
+    for n_topics in topic_counts:
+        gs.fit_lda(n_topics)
+        topics[str(n_topics)] = gs.get_all_topics(10)
+
+    return {
+        'version': BUNDLE_VERSION,
+        'default_num_topics': default_num_topics,
+        'payloads': payloads,
+        'topics': topics,
+        'word_times': np.round(gs.mean_timestamps(), 3),
+        'words': gs.transcript_as_list()
+    }
+
+
+def save_bundle(bundle, filename):
+    """Writes a bundle as gzipped JSON."""
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        json.dump(bundle, f, default=_to_builtin, separators=(',', ':'))
+
+
+def load_bundle(filename):
+    """Reads a bundle written by `save_bundle`.
+
+    Raises
+    ------
+    ValueError
+        If the bundle was built by an incompatible version of this module.
+    """
+    with gzip.open(filename, 'rt', encoding='utf-8') as f:
+        bundle = json.load(f)
+    if bundle.get('version') != BUNDLE_VERSION:
+        raise ValueError(
+            '{} has bundle version {}, expected {}. Rebuild it with '
+            '`python -m streaming.bundle`.'.format(
+                filename, bundle.get('version'), BUNDLE_VERSION)
+        )
+    return bundle
+
+
+def main(argv):
+    if len(argv) != 3:
+        print('usage: python -m streaming.bundle <responses.pkd> <bundle.json.gz>')
+        return 1
+    with open(argv[1], 'rb') as f:
+        responses = dill.load(f)
+    save_bundle(build_example_bundle(responses), argv[2])
+    print('wrote example bundle to', argv[2])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,164 @@
+# history.py
+
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from .speech import GoogleSpeech
+from .speechfile import dump_speech, parse_speech
+from .topics import topic_models
+
+
+class SpeechStore(object):
+    """SQLite table of speeches in the compact speech file format (see
+    streaming/speechfile.py), which SpeechHistory spills speeches to.
+
+    Parameters
+    ----------
+    filename : string (optional, default=':memory:')
+        Where the database is kept. By default it is only kept in memory
+        (which is still far smaller than the GoogleSpeech objects).
+    """
+    def __init__(self, filename=':memory:'):
+        self.filename = filename
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS speeches ('
+                'key TEXT PRIMARY KEY, num_topics INTEGER, data BLOB)'
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM speeches').fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM speeches WHERE key = ?', (key,)
+            ).fetchone()
+        return row is not None
+
+    def put(self, google_speech):
+        """Stores a speech's word timings and number of topics."""
+        data = dump_speech(google_speech.timings)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO speeches VALUES (?, ?, ?)',
+                (google_speech.key, google_speech.num_topics, sqlite3.Binary(data))
+            )
+
+    def get(self, key):
+        """Rebuilds a stored speech.
+
+        Returns
+        -------
+        google_speech : GoogleSpeech
+
+        Raises
+        ------
+        KeyError
+            If there is no speech stored under `key`.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT num_topics, data FROM speeches WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        num_topics, data = row
+        # the stored timings were already moved onto the speech's timeline
+        # (and are marked as such), so GoogleSpeech does not rebase them.
+        timings = parse_speech(data, 'speech {}'.format(key))
+        return GoogleSpeech(timings, num_topics=num_topics, key=key)
+
+    def delete(self, keys):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'DELETE FROM speeches WHERE key = ?', [(key,) for key in keys]
+            )
+
+    def clear(self):
+        """Deletes every stored speech."""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM speeches')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SpeechHistory(object):
+    """Every speech a session has recorded, with only the `max_in_memory`
+    most recently used kept as GoogleSpeech objects.
+
+    Older speeches are spilled to a SpeechStore and rebuilt (which means
+    fitting their LDA again, unless it is still in the topic model cache)
+    the next time they are needed. Speeches are indexed like a list, in the
+    order they were added.
+
+    Parameters
+    ----------
+    store : SpeechStore (optional, default=None)
+        Where speeches are spilled to. A new in-memory store is made if None.
+
+    max_in_memory : int (optional, default=2)
+    """
+    def __init__(self, store=None, max_in_memory=2):
+        if store is None:
+            store = SpeechStore()
+        self.store = store
+        self.max_in_memory = max(max_in_memory, 1)
+        self._keys = []
+        self._loaded = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, ix):
+        """The speech at `ix`, rebuilt from the store if it was spilled."""
+        with self._lock:
+            key = self._keys[ix]
+            google_speech = self._loaded.get(key)
+            if google_speech is None:
+                google_speech = self.store.get(key)
+                self._loaded[key] = google_speech
+                self._spill()
+            self._loaded.move_to_end(key)
+            return google_speech
+
+    def append(self, google_speech):
+        with self._lock:
+            self._keys.append(google_speech.key)
+            self._loaded[google_speech.key] = google_speech
+            self._spill()
+
+    def _spill(self):
+        """Moves the least recently used speeches to the store until only
+        `max_in_memory` are left. Must hold `self._lock`."""
+        while len(self._loaded) > self.max_in_memory:
+            # stored every time, since its number of topics may have changed.
+            _, google_speech = self._loaded.popitem(last=False)
+            self.store.put(google_speech)
+
+    def in_memory(self):
+        """The speeches that are currently held as GoogleSpeech objects."""
+        with self._lock:
+            return list(self._loaded.values())
+
+    def memory_bytes(self):
+        """Approximate memory held by the speeches that are not spilled,
+        including their analyses and LDA models (see `GoogleSpeech.nbytes`)."""
+        return sum(gs.nbytes for gs in self.in_memory())
+
+    def clear(self):
+        """Forgets every speech, including the spilled ones, and drops their
+        LDA models from the topic model cache."""
+        with self._lock:
+            self.store.delete(self._keys)
+            for key in self._keys:
+                topic_models.discard(key)
+            self._keys = []
+            self._loaded.clear()
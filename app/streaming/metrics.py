@@ -0,0 +1,264 @@
+# metrics.py
+#
+# A small set of Prometheus-style metrics (counters, gauges and histograms)
+# that can be rendered in the Prometheus text format, served at /metrics.
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.
+)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in labels
+    ) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric(object):
+    """Base class for a metric with optional labels.
+
+    Parameters
+    ----------
+    name : string
+    documentation : string
+    labelnames : tuple of string (optional, default=())
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{} expects labels {}, got {}'.format(
+                self.name, self.labelnames, tuple(labels)))
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Lists (name, labels, value) for each sample of this metric."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.kind)
+        ]
+        for name, labels, value in self.samples():
+            lines.append('{}{} {}'.format(
+                name, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """A value that can go up and down. If `function` is given, it is called
+    for the value every time the metrics are rendered."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function=None):
+        Metric.__init__(self, name, documentation)
+        self.function = function
+
+    def set(self, value):
+        with self._lock:
+            self._values[()] = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            return [(self.name, (), self.function())]
+        with self._lock:
+            return [(self.name, (), self._values.get((), 0))]
+
+
+class Histogram(Metric):
+    """Counts observations (like durations) in cumulative buckets."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the body of a `with` statement takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.))
+        return sum(counts)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(counts), total)
+                     for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((
+                    self.name + '_bucket', key + (('le', _format_value(bound)),),
+                    cumulative
+                ))
+            samples.append((self.name + '_sum', key, total))
+            samples.append((self.name + '_count', key, cumulative))
+        return samples
+
+
+class MetricsRegistry(object):
+    """Holds every metric, and renders them in the Prometheus text format."""
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, function=None):
+        return self.register(Gauge(name, documentation, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# shared by everything in this process.
+registry = MetricsRegistry()
+
+chunk_handler_seconds = registry.histogram(
+    'talk_audio_chunk_handler_seconds',
+    'Time spent handling each chunk of audio from the browser.'
+)
+chunk_to_transcript_seconds = registry.histogram(
+    'talk_chunk_to_transcript_seconds',
+    'Time from audio arriving to the transcript it produced being sent to the client.'
+)
+recognizer_round_trip_seconds = registry.histogram(
+    'talk_recognizer_round_trip_seconds',
+    'Time from audio arriving to the recognizer finalizing the words in it.'
+)
+recognizer_streams_total = registry.counter(
+    'talk_recognizer_streams_total',
+    'Recognizer streams opened, by reason.',
+    labelnames=('reason',)
+)
+recognizer_stream_errors_total = registry.counter(
+    'talk_recognizer_stream_errors_total',
+    'Recognizer streams that ended with an error (like a timeout), by error.',
+    labelnames=('error',)
+)
+recognizer_responses_total = registry.counter(
+    'talk_recognizer_responses_total',
+    'Responses returned by the recognizer.',
+    labelnames=('kind',)
+)
+analysis_stage_seconds = registry.histogram(
+    'talk_analysis_stage_seconds',
+    'Time spent in each stage of the speech analysis.',
+    labelnames=('stage',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+)
+audio_queue_depth = registry.gauge(
+    'talk_audio_queue_depth',
+    'Chunks of audio waiting to be sent to the recognizer.'
+)
+audio_queue_bytes = registry.gauge(
+    'talk_audio_queue_bytes',
+    'Bytes of audio waiting to be sent to the recognizer.'
+)
+audio_in_flight_bytes = registry.gauge(
+    'talk_audio_in_flight_bytes',
+    'Bytes of audio sent to the recognizer that it has not finalized yet.'
+)
+audio_dropped_bytes = registry.gauge(
+    'talk_audio_dropped_bytes',
+    'Bytes of audio dropped by full buffers (in the current sessions).'
+)
+analysis_queue_depth = registry.gauge(
+    'talk_analysis_queue_depth',
+    'Recordings that are being analyzed or waiting to be.'
+)
+sessions_active = registry.gauge(
+    'talk_sessions',
+    'Recording sessions held in memory.'
+)
+
+
+@contextmanager
+def timed_stage(stage, stage_secs=None):
+    """Observes how long a stage of the analysis takes in
+    `analysis_stage_seconds`.
+
+    Parameters
+    ----------
+    stage : string
+    stage_secs : dict (optional, default=None)
+        If given, the time (in seconds) is also stored under `stage`, so it
+        can be sent back from a worker process.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        secs = time.perf_counter() - start
+        analysis_stage_seconds.observe(secs, stage=stage)
+        if stage_secs is not None:
+            stage_secs[stage] = secs
@@ -0,0 +1,126 @@
+# pauses.py
+
+import numpy as np
+
+
+class PauseClassifier(object):
+    """Splits pauses into short and long ones with two-cluster k-means.
+
+    In one dimension the optimal two-cluster split is always between two
+    neighbouring values once they are sorted, so it can be found exactly by
+    sorting the pauses and scanning every split point with prefix sums. This
+    is deterministic, O(n log n), and gives the same clusters as a k-means
+    that has converged to the global optimum.
+
+    Parameters
+    ----------
+    pauses : array-like of float (optional, default=None)
+        Pause durations (in seconds) to fit the classifier to.
+
+    Attributes
+    ----------
+    split_ix : int
+        Number of (sorted) pauses in the short cluster.
+
+    threshold : float
+        Pauses longer than this are long; half way between the longest short
+        pause and the shortest long pause.
+
+    cluster_centers_ : np.array of shape (2,)
+        Mean duration of the short and long pauses.
+    """
+    def __init__(self, pauses=None):
+        self._sorted = np.empty(0)
+        # pauses added since the last merge into `_sorted`.
+        self._pending = []
+        self._dirty = False
+        self._split_ix = None
+        self._threshold = None
+        self._centers = None
+        if pauses is not None:
+            self.fit(pauses)
+
+    def __len__(self):
+        return self._sorted.size + len(self._pending)
+
+    def fit(self, pauses):
+        """Fits the classifier to a set of pause durations, replacing any
+        pauses it has seen before."""
+        self._sorted = np.sort(np.asarray(pauses, dtype=float).ravel())
+        self._pending = []
+        self._dirty = True
+        return self
+
+    def insert(self, pause):
+        """Adds a single pause duration. The pauses added since the split
+        was last found are only merged in (and the split found again) the
+        next time it is needed, so adding n pauses one at a time costs
+        O(n log n) rather than O(n^2)."""
+        self._pending.append(float(pause))
+        self._dirty = True
+
+    def _merge(self):
+        if self._pending:
+            pending = np.sort(np.asarray(self._pending))
+            ixs = np.searchsorted(self._sorted, pending)
+            self._sorted = np.insert(self._sorted, ixs, pending)
+            self._pending = []
+
+    def _solve(self):
+        if not self._dirty:
+            return
+        self._merge()
+        x = self._sorted
+        n = x.size
+        if n < 2 or x[0] == x[-1]:
+            raise ValueError(
+                'at least two different pause durations are needed to find '
+                'short and long pauses.'
+            )
+
+        # minimizing the within-cluster sum of squares is the same as
+        # maximizing S_left^2 / n_left + S_right^2 / n_right.
+        cumsum = np.cumsum(x)
+        total = cumsum[-1]
+        n_left = np.arange(1, n)
+        s_left = cumsum[:-1]
+        score = s_left ** 2 / n_left + (total - s_left) ** 2 / (n - n_left)
+        # equal durations always end up in the same cluster.
+        score[x[:-1] == x[1:]] = -np.inf
+
+        split_ix = int(np.argmax(score)) + 1
+        self._split_ix = split_ix
+        self._threshold = (x[split_ix - 1] + x[split_ix]) / 2
+        self._centers = np.array([
+            cumsum[split_ix - 1] / split_ix,
+            (total - cumsum[split_ix - 1]) / (n - split_ix)
+        ])
+        self._dirty = False
+
+    @property
+    def split_ix(self):
+        self._solve()
+        return self._split_ix
+
+    @property
+    def threshold(self):
+        self._solve()
+        return self._threshold
+
+    @property
+    def cluster_centers_(self):
+        self._solve()
+        return self._centers
+
+    def predict(self, pauses):
+        """Labels each pause as long (True) or short (False).
+
+        Parameters
+        ----------
+        pauses : array-like of float
+
+        Returns
+        -------
+        labels : np.array of bool
+        """
+        return np.asarray(pauses, dtype=float) > self.threshold
@@ -0,0 +1,305 @@
+# recognizers.py
+
+import time
+import bisect
+
+import dill
+import numpy as np
+
+from google.cloud import speech
+
+from .speech import WordTimings
+from .utils import set_duration_secs
+
+
+def make_recognizer(name, sample_rate, language_code='en-US', **kwargs):
+    """Creates the recognizer backend called `name`.
+
+    Parameters
+    ----------
+    name : string
+        'google' or 'replay'.
+
+    sample_rate : int
+        Sample rate of audio signal (in Hz).
+
+    language_code : string (optional, default='en-US')
+
+    **kwargs
+        Passed on to the recognizer. ReplayRecognizer needs `filename`.
+
+    Returns
+    -------
+    recognizer : GoogleRecognizer or ReplayRecognizer
+    """
+    if name == 'google':
+        return GoogleRecognizer(sample_rate, language_code=language_code)
+    if name == 'replay':
+        filename = kwargs.pop('filename')
+        return ReplayRecognizer.from_file(
+            filename, sample_rate, language_code=language_code, **kwargs
+        )
+    raise ValueError('unknown recognizer \'{}\''.format(name))
+
+
+class GoogleRecognizer(object):
+    """Streams audio to the Google Cloud Speech API.
+
+    A recognizer takes an iterable of chunks of 16 bit PCM audio (bytes) in
+    `streaming_recognize`, and returns an iterable of
+    StreamingRecognizeResponse for it. Each call is a single stream, and more
+    than one can be open at the same time.
+
+    Parameters
+    ----------
+    sample_rate : int
+        Sample rate of audio signal (in Hz).
+
+    language_code : string (optional, default='en-US')
+    """
+    def __init__(self, sample_rate, language_code='en-US'):
+        self.sample_rate = sample_rate
+        self.language_code = language_code
+
+        self.client = speech.SpeechClient()
+        self.config = speech.types.RecognitionConfig(
+            encoding=speech.enums.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate,
+            language_code=language_code,
+            max_alternatives=1,
+            enable_word_time_offsets=True,
+            enable_automatic_punctuation=True
+        )
+        self.streaming_config = speech.types.StreamingRecognitionConfig(
+            config=self.config,
+            interim_results=True
+        )
+
+    def streaming_recognize(self, audio_chunks, start_secs=0.):
+        """Opens a stream and sends `audio_chunks` to it.
+
+        Parameters
+        ----------
+        audio_chunks : iterable of bytes
+
+        start_secs : float (optional, default=0.)
+            Where the audio starts in the recording. Not needed by the API,
+            whose timestamps are always relative to the start of the stream.
+
+        Returns
+        -------
+        responses : iterable of StreamingRecognizeResponse
+        """
+        requests = (
+            speech.types.StreamingRecognizeRequest(audio_content=content)
+            for content in audio_chunks
+        )
+        return self.client.streaming_recognize(self.streaming_config, requests)
+
+
+class ReplayRecognizer(object):
+    """Replays a recorded list of `is_final` results as if they were being
+    recognized from the audio that is streamed to it, without a network.
+
+    The recorded results are placed on one timeline (streams that restarted
+    at zero are shifted the same way GoogleSpeech does it). The audio sent to
+    the recognizer is the clock: once the audio has passed the end of a word,
+    an interim result with the transcript up to that word is sent, and once
+    it has passed the last word of a result, the recorded final result is
+    sent. When a stream is closed, the results it has partly heard are
+    finalized with the words it heard. Each response is held back for
+    `latency_sec` (of wall time) after the audio that completed it was sent.
+    Like the real API, word timestamps are relative to the start of each
+    stream, and interim results have no words.
+
+    Parameters
+    ----------
+    results : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+        Recorded `is_final` results, such as the contents of a .pkd file.
+
+    sample_rate : int
+        Sample rate of the audio that will be streamed (in Hz).
+
+    language_code : string (optional, default='en-US')
+        Not used, accepted for compatibility with GoogleRecognizer.
+
+    latency_sec : float (optional, default=0.2)
+        Delay between the audio that completes a response being sent, and the
+        response being returned.
+
+    final_delay_sec : float (optional, default=0.5)
+        Audio time after the last word of a result before its final result is
+        sent (Google waits for a short silence before finalizing).
+
+    interim_results : bool (optional, default=True)
+        Whether to send interim results.
+
+    Attributes
+    ----------
+    latencies : list of float
+        Wall time between the audio that completed each response being sent,
+        and the response being returned (in seconds).
+    """
+    def __init__(self, results, sample_rate, language_code='en-US',
+                 latency_sec=0.2, final_delay_sec=0.5, interim_results=True):
+        self.sample_rate = sample_rate
+        self.language_code = language_code
+        self.latency_sec = latency_sec
+        self.final_delay_sec = final_delay_sec
+        self.interim_results = interim_results
+
+        self.results = [r for r in results if r.alternatives]
+        self.latencies = []
+        self.num_streams = 0
+        # how far into the recording the furthest stream has got (in seconds).
+        self.audio_secs = 0.
+        self._events = self._schedule()
+        self._finalized = set()
+
+    @classmethod
+    def from_file(cls, filename, sample_rate, **kwargs):
+        """Loads the results to replay from a pickled (dill) list of results."""
+        with open(filename, 'rb') as f:
+            results = dill.load(f)
+        return cls(results, sample_rate, **kwargs)
+
+    @property
+    def finished(self):
+        """True once every recorded result has been finalized."""
+        return len(self._finalized) == self._num_finals
+
+    def _schedule(self):
+        """Lists every response to send as (audio time, result index, number
+        of words), sorted by audio time. A number of words of None stands for
+        the final result."""
+        timings = WordTimings.from_responses(self.results)
+        offsets = timings.response_offsets()
+        start_secs = timings.start_secs + offsets[timings.response_ixs]
+        end_secs = timings.end_secs + offsets[timings.response_ixs]
+
+        events = []
+        self._word_starts = {}
+        for result_ix in range(len(self.results)):
+            is_result = timings.response_ixs == result_ix
+            word_ends = end_secs[is_result]
+            if word_ends.size == 0:
+                continue
+            self._word_starts[result_ix] = start_secs[is_result]
+            if self.interim_results:
+                events.extend(
+                    (t, result_ix, i + 1) for i, t in enumerate(word_ends[:-1])
+                )
+            events.append((word_ends[-1] + self.final_delay_sec, result_ix, None))
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        self._offsets = offsets
+        self._num_finals = len(self._word_starts)
+        return events
+
+    def _response(self, result_ix, first_word, num_words, is_final,
+                  stream_start_sec):
+        """Builds the response for words `first_word` to `num_words` of a
+        result."""
+        result = self.results[result_ix]
+        words = result.alternatives[0].words
+        if not is_final:
+            interim = speech.types.StreamingRecognitionResult(
+                alternatives=[speech.types.SpeechRecognitionAlternative(
+                    transcript=' '.join(w.word for w in words[first_word:num_words])
+                )],
+                is_final=False,
+                stability=0.9
+            )
+            return speech.types.StreamingRecognizeResponse(results=[interim])
+
+        # recorded results may be either kind of result; both have alternatives.
+        final = speech.types.StreamingRecognitionResult(is_final=True)
+        alternative = final.alternatives.add()
+        alternative.CopyFrom(result.alternatives[0])
+        if first_word > 0 or num_words < len(words):
+            del alternative.words[num_words:]
+            del alternative.words[:first_word]
+            alternative.transcript = ' '.join(w.word for w in alternative.words)
+
+        shift = self._offsets[result_ix] - stream_start_sec
+        for word in alternative.words:
+            for duration in [word.start_time, word.end_time]:
+                secs = duration.seconds + duration.nanos * 1e-9
+                set_duration_secs(duration, secs + shift)
+        return speech.types.StreamingRecognizeResponse(results=[final])
+
+    def streaming_recognize(self, audio_chunks, start_secs=0.):
+        """Replays the results that fall within the audio in `audio_chunks`.
+
+        A stream only hears the words that start after `start_secs`. Several
+        streams can be open at once (they are then sent the same audio).
+
+        Parameters
+        ----------
+        audio_chunks : iterable of bytes
+            16 bit PCM audio.
+
+        start_secs : float (optional, default=0.)
+            Where the audio starts in the recording.
+
+        Yields
+        ------
+        response : StreamingRecognizeResponse
+        """
+        self.num_streams += 1
+        stream_start_sec = start_secs
+        stream_secs = stream_start_sec
+        next_event = bisect.bisect_left(
+            [event[0] for event in self._events], stream_start_sec
+        )
+        # index of the first word this stream heard, for each result.
+        first_words = {}
+        finalized = set()
+        pending = []
+
+        def due(result_ix, num_words, is_final):
+            first_word = first_words.setdefault(
+                result_ix,
+                int(np.searchsorted(self._word_starts[result_ix], stream_start_sec))
+            )
+            if num_words <= first_word:
+                return
+            if is_final:
+                finalized.add(result_ix)
+                self._finalized.add(result_ix)
+            pending.append(
+                (time.time(), (result_ix, first_word, num_words, is_final))
+            )
+
+        for chunk in audio_chunks:
+            stream_secs += len(chunk) / 2. / self.sample_rate
+            self.audio_secs = max(self.audio_secs, stream_secs)
+            while next_event < len(self._events) and \
+                  self._events[next_event][0] <= stream_secs:
+                _, result_ix, num_words = self._events[next_event]
+                next_event += 1
+                if num_words is None:
+                    due(result_ix, len(self._word_starts[result_ix]), True)
+                else:
+                    due(result_ix, num_words, False)
+
+            while pending and time.time() - pending[0][0] >= self.latency_sec:
+                yield self._send(pending.pop(0), stream_start_sec)
+
+        # the stream was closed; results that were partly heard are finalized.
+        for result_ix in sorted(set(first_words) - finalized):
+            num_heard = int(np.searchsorted(
+                self._word_starts[result_ix], stream_secs
+            ))
+            due(result_ix, num_heard, True)
+
+        while pending:
+            wait_sec = self.latency_sec - (time.time() - pending[0][0])
+            if wait_sec > 0:
+                time.sleep(wait_sec)
+            yield self._send(pending.pop(0), stream_start_sec)
+
+    def _send(self, item, stream_start_sec):
+        sent, response_args = item
+        self.latencies.append(time.time() - sent)
+        return self._response(*response_args, stream_start_sec=stream_start_sec)
@@ -0,0 +1,124 @@
+# recording.py
+
+import wave
+
+import numpy as np
+
+
+# size of the header the wave module writes for 16 bit PCM; the audio follows.
+WAV_HEADER_BYTES = 44
+
+
+class WavRecorder(object):
+    """Spools 16 bit mono audio to a WAV file while it is being recorded.
+
+    Incoming chunks are copied into a fixed size block of samples, which is
+    written out to the file every time it fills up. Memory use therefore does
+    not depend on how long the recording is, and closing the recorder only has
+    to flush the last block and patch the sizes in the WAV header.
+
+    Parameters
+    ----------
+    filename : string
+        Where the WAV file should be written.
+
+    sample_rate : int
+        Sample rate of audio signal (in Hz).
+
+    block_size : int (optional, default=65536)
+        Number of samples to hold in memory before writing them to disk.
+    """
+    def __init__(self, filename, sample_rate, block_size=65536):
+        self.filename = filename
+        self.sample_rate = int(sample_rate)
+        self.num_samples = 0
+        self.closed = False
+
+        self._block = np.empty(block_size, dtype='<i2')
+        self._block_len = 0
+
+        self._wav = wave.open(filename, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(self.sample_rate)
+
+    @property
+    def nbytes(self):
+        """Number of bytes of audio held in memory."""
+        return self._block.nbytes
+
+    @property
+    def duration_secs(self):
+        """Length of the recording so far (in seconds)."""
+        return self.num_samples / float(self.sample_rate)
+
+    def append(self, chunk):
+        """Adds a chunk of audio to the recording.
+
+        Parameters
+        ----------
+        chunk : np.array of np.int16
+        """
+        if self.closed:
+            raise ValueError('cannot append audio to a closed recording.')
+
+        chunk = np.asarray(chunk, dtype='<i2')
+        start = 0
+        while start < chunk.size:
+            n = min(chunk.size - start, self._block.size - self._block_len)
+            self._block[self._block_len:self._block_len + n] = chunk[start:start + n]
+            self._block_len += n
+            start += n
+            if self._block_len == self._block.size:
+                self.flush()
+        self.num_samples += chunk.size
+
+    def flush(self):
+        """Writes any audio held in memory to the WAV file."""
+        if self._block_len > 0:
+            self._wav.writeframesraw(self._block[:self._block_len].tobytes())
+            self._block_len = 0
+
+    def close(self):
+        """Writes the remaining audio and finalizes the WAV header."""
+        if self.closed:
+            return
+        self.flush()
+        self._wav.close()
+        self.closed = True
+
+
+def word_byte_ranges(start_secs, end_secs, sample_rate, num_samples,
+                     pad_secs=0.15, header_bytes=WAV_HEADER_BYTES):
+    """Finds the bytes of a WAV file written by a WavRecorder that hold each
+    word, so that a single word can be fetched with an HTTP Range request.
+
+    Parameters
+    ----------
+    start_secs : np.array of float
+        When each word started (in seconds, on the recording's timeline).
+
+    end_secs : np.array of float
+        When each word ended.
+
+    sample_rate : int
+    num_samples : int
+        Length of the recording (in samples).
+
+    pad_secs : float (optional, default=0.15)
+        Audio to include before and after each word, so it is not clipped.
+
+    header_bytes : int (optional, default=44)
+        Size of the WAV header that comes before the audio.
+
+    Returns
+    -------
+    ranges : np.array of int, shape (N_words, 2)
+        First and last byte (inclusive, as in a Range header) of each word.
+    """
+    pad = int(round(pad_secs * sample_rate))
+    first = np.floor(np.asarray(start_secs, dtype=np.float64) * sample_rate) - pad
+    last = np.ceil(np.asarray(end_secs, dtype=np.float64) * sample_rate) + pad
+    first = np.clip(first, 0, max(num_samples - 1, 0)).astype(np.int64)
+    last = np.clip(last, first + 1, max(num_samples, 1)).astype(np.int64)
+    return np.stack([header_bytes + 2 * first, header_bytes + 2 * last - 1], axis=1)
@@ -0,0 +1,99 @@
+# resample.py
+
+from fractions import Fraction
+
+import numpy as np
+from scipy.signal import firwin, upfirdn
+
+
+def output_sample_rate(sample_rate, target_hz):
+    """The sample rate audio is sent to the recognizer at. Audio is only ever
+    downsampled, so this is `sample_rate` if `target_hz` is None or higher.
+
+    Parameters
+    ----------
+    sample_rate : int
+        Sample rate of the incoming audio (in Hz).
+
+    target_hz : int or None
+
+    Returns
+    -------
+    sample_rate : int
+    """
+    if not target_hz or target_hz >= sample_rate:
+        return int(sample_rate)
+    return int(target_hz)
+
+
+class StreamingResampler(object):
+    """Polyphase resampler for audio that comes in one chunk at a time.
+
+    Uses the same anti-aliasing filter as `scipy.signal.resample_poly`, but
+    keeps the last samples of each chunk so that the next chunk is filtered
+    as if the audio was never split up (there are no artifacts at the chunk
+    boundaries). Only the output samples that can be computed from the audio
+    seen so far are returned; the output lags the input by half the filter
+    length (well under a millisecond).
+
+    Parameters
+    ----------
+    input_rate : int
+        Sample rate of the incoming audio (in Hz).
+
+    output_rate : int
+        Sample rate to resample to (in Hz).
+
+    half_len : int (optional, default=10)
+        Half the number of filter taps per output sample.
+    """
+    def __init__(self, input_rate, output_rate, half_len=10):
+        ratio = Fraction(int(output_rate), int(input_rate))
+        self.input_rate = int(input_rate)
+        self.output_rate = int(output_rate)
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+
+        max_rate = max(self.up, self.down)
+        self.taps = firwin(2 * half_len * max_rate + 1, 1. / max_rate,
+                           window=('kaiser', 5.0)) * self.up
+        self.taps_per_phase = -(-self.taps.size // self.up)
+
+        # input samples kept from earlier chunks, which start at input sample
+        # `self._history_start`. This is always a multiple of `down`, so the
+        # first kept sample lines up with an output sample.
+        self._history = np.zeros(0)
+        self._history_start = 0
+        self._num_in = 0
+        self._num_out = 0
+
+    def process(self, chunk):
+        """Resamples the next chunk of audio.
+
+        Parameters
+        ----------
+        chunk : np.array of np.int16
+
+        Returns
+        -------
+        resampled : np.array of np.int16
+        """
+        x = np.concatenate([self._history, np.asarray(chunk, dtype=np.float64)])
+        self._num_in += len(chunk)
+
+        # output sample m needs input samples up to (m * down) // up, so only
+        # outputs before this one can be computed yet.
+        num_total = -(-self._num_in * self.up // self.down)
+        first_out = self._history_start * self.up // self.down
+        y = upfirdn(self.taps, x, self.up, self.down)[
+            self._num_out - first_out:num_total - first_out
+        ]
+        self._num_out = num_total
+
+        # keep enough input for the filter taps of the next output sample.
+        keep_from = self._num_in - (self.taps_per_phase - 1)
+        keep_from = max(keep_from - keep_from % self.down, self._history_start)
+        self._history = x[keep_from - self._history_start:]
+        self._history_start = keep_from
+
+        return np.clip(np.round(y), -32768, 32767).astype(np.int16)
@@ -0,0 +1,281 @@
+# sessions.py
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from .history import SpeechHistory, SpeechStore
+from .speech import TranscriptAccumulator
+
+
+class RecordingSession(object):
+    """Holds all of the recording state for a single Socket.IO connection.
+
+    Parameters
+    ----------
+    sid : string
+        Socket.IO session id of the client that owns this session.
+
+    language_code : string (optional, default='en-US')
+        Language passed on to the AudioStream when a recording is started.
+
+    speeches : SpeechHistory (optional, default=None)
+        Where the analyzed speeches are kept. A SpeechHistory with its own
+        in-memory store is made if None.
+    """
+    def __init__(self, sid, language_code='en-US', speeches=None):
+        self.sid = sid
+        self.language_code = language_code
+        self.connected = True
+        self.last_active = time.time()
+
+        self.num_recordings = 0
+        self.sample_rate = None
+        self.recorder = None        # WavRecorder spooling the current recording
+        self.audio_stream = None
+        self.audio_stream_started = False
+        self.record_start_time = None
+        self.record_secs_elapsed = None
+        self.waiting_for_responses_callback_sig = True
+
+        self.transcript = ''        # current transcript across all responses
+        self.live_transcript = TranscriptAccumulator()
+        self.prev_num_responses = 0 # number of previous is_final responses
+        self.responses = []         # this contains all of the is_final responses
+        # all of the responses that have been converted to GoogleSpeech
+        # objects (only the most recent are kept in memory).
+        self.speeches = speeches if speeches is not None else SpeechHistory()
+        self.speech_timeline = None # speech/pause segments found in the audio
+        self.requested_num_topics = None # latest number of topics asked for
+
+    def touch(self):
+        """Marks the session as active right now."""
+        self.last_active = time.time()
+
+    def idle_secs(self, now=None):
+        """How long (in seconds) since this session was last active."""
+        if now is None:
+            now = time.time()
+        return now - self.last_active
+
+    def start_recording(self, audio_stream, recorder):
+        """Resets the per-recording state and attaches a new AudioStream.
+
+        Parameters
+        ----------
+        audio_stream : AudioStream
+            A stream that has not yet been started.
+
+        recorder : WavRecorder
+            Where the audio for this recording is written to. Any previous
+            recording made in this session is deleted.
+        """
+        self.remove_recording()
+        self.recorder = recorder
+        self.responses = []
+        self.transcript = ''
+        self.live_transcript = TranscriptAccumulator()
+        self.prev_num_responses = 0
+        self.speech_timeline = None
+        self.num_recordings += 1
+        self.waiting_for_responses_callback_sig = True
+
+        self.audio_stream = audio_stream
+        self.record_start_time = time.time()
+        self.record_secs_elapsed = 0
+
+    def is_recording(self):
+        """Whether an AudioStream is still open or still has audio to send."""
+        return (
+            self.audio_stream is not None and
+            not self.audio_stream.is_finished()
+        )
+
+    def is_finished(self):
+        """A session is finished once nothing is being recorded for it."""
+        return not self.is_recording()
+
+    def memory_bytes(self):
+        """Rough estimate of how much memory this session is holding on to.
+
+        Returns
+        -------
+        num_bytes : int
+        """
+        num_bytes = 0
+        if self.recorder is not None:
+            num_bytes += self.recorder.nbytes
+        if self.audio_stream is not None:
+            num_bytes += self.audio_stream.buffer_metrics()['queued_bytes']
+        num_bytes += sum(r.ByteSize() for r in self.responses)
+        num_bytes += self.speeches.memory_bytes()
+        return num_bytes
+
+    def remove_recording(self):
+        """Closes the current recording and deletes its WAV file."""
+        if self.recorder is None:
+            return
+        self.recorder.close()
+        if os.path.exists(self.recorder.filename):
+            os.remove(self.recorder.filename)
+        self.recorder = None
+
+    def close(self):
+        """Stops any open stream, and removes the recorded audio and the
+        speeches."""
+        if self.audio_stream is not None:
+            self.audio_stream.closed = True
+        self.connected = False
+        self.remove_recording()
+        self.speeches.clear()
+
+
+class SessionRegistry(object):
+    """Keeps one RecordingSession per Socket.IO `sid`.
+
+    Finished sessions are evicted once they have been idle for longer than
+    `idle_timeout_sec`, or (oldest first) whenever the sessions together hold
+    more than `memory_budget_bytes`. Sessions that are still recording are
+    never evicted.
+
+    Parameters
+    ----------
+    idle_timeout_sec : float (optional, default=1800)
+
+    memory_budget_bytes : int (optional, default=1 GB)
+
+    speech_store : SpeechStore (optional, default=None)
+        Where every session's older speeches are spilled to. An in-memory
+        store is made if None.
+
+    max_speeches_in_memory : int (optional, default=2)
+        How many of each session's speeches are kept as GoogleSpeech objects.
+    """
+    def __init__(self, idle_timeout_sec=1800, memory_budget_bytes=1024**3,
+                 speech_store=None, max_speeches_in_memory=2):
+        self.idle_timeout_sec = idle_timeout_sec
+        self.memory_budget_bytes = memory_budget_bytes
+        self.speech_store = speech_store if speech_store is not None else SpeechStore()
+        self.max_speeches_in_memory = max_speeches_in_memory
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, sid):
+        return sid in self._sessions
+
+    def get(self, sid, language_code='en-US'):
+        """Returns the session for `sid`, creating a new one if needed.
+
+        Parameters
+        ----------
+        sid : string
+        language_code : string (optional, default='en-US')
+            Only used if a new session has to be created.
+
+        Returns
+        -------
+        session : RecordingSession
+        """
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                speeches = SpeechHistory(
+                    self.speech_store, max_in_memory=self.max_speeches_in_memory
+                )
+                session = RecordingSession(
+                    sid, language_code=language_code, speeches=speeches
+                )
+                self._sessions[sid] = session
+            else:
+                self._sessions.move_to_end(sid)
+            session.connected = True
+            session.touch()
+            return session
+
+    def disconnect(self, sid):
+        """Marks a session as disconnected; it can now be evicted once idle."""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is not None:
+                session.connected = False
+                session.touch()
+
+    def remove(self, sid):
+        """Closes and drops the session for `sid` (if it exists)."""
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def recording_sids(self):
+        """The `sid`s of the sessions that are still recording."""
+        with self._lock:
+            return [sid for sid, s in self._sessions.items() if s.is_recording()]
+
+    def memory_bytes(self):
+        """Estimated memory held across all sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sum(s.memory_bytes() for s in sessions)
+
+    def buffer_metrics(self):
+        """Totals of the recognizer buffer metrics of every session that has
+        an AudioStream (see `AudioStream.buffer_metrics`).
+
+        Returns
+        -------
+        metrics : dict
+        """
+        with self._lock:
+            streams = [s.audio_stream for s in self._sessions.values()
+                       if s.audio_stream is not None]
+        totals = {'queue_depth': 0, 'queued_bytes': 0, 'bytes_in_flight': 0,
+                  'dropped_bytes': 0}
+        for audio_stream in streams:
+            metrics = audio_stream.buffer_metrics()
+            for key in totals:
+                totals[key] += metrics[key]
+        return totals
+
+    def evict(self, now=None):
+        """Evicts idle sessions, then evicts least recently used finished
+        sessions until the memory budget is met.
+
+        Returns
+        -------
+        evicted : list of string
+            The `sid`s that were evicted.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            finished = [
+                (sid, s) for sid, s in self._sessions.items()
+                if s.is_finished()
+            ]
+            sizes = {sid: s.memory_bytes() for sid, s in self._sessions.items()}
+
+        evicted = [
+            sid for sid, s in finished
+            if s.idle_secs(now) > self.idle_timeout_sec
+        ]
+
+        # evict disconnected sessions before connected ones, oldest first.
+        remaining = [(sid, s) for sid, s in finished if sid not in evicted]
+        remaining.sort(key=lambda item: (item[1].connected, item[1].last_active))
+        total = sum(sizes[sid] for sid in sizes if sid not in evicted)
+        for sid, s in remaining:
+            if total <= self.memory_budget_bytes:
+                break
+            evicted.append(sid)
+            total -= sizes[sid]
+
+        for sid in evicted:
+            self.remove(sid)
+        return evicted
@@ -1,17 +1,13 @@
-import os
-import sys
-import dill
-from copy import deepcopy
+import re
+import uuid
 
 import numpy as np
 
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.cluster import KMeans
-from sklearn.utils.validation import check_is_fitted
-from sklearn.exceptions import NotFittedError
-
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
-from sklearn.decomposition import NMF, LatentDirichletAllocation
+from .analysis import SpeechAnalysis
+from .metrics import timed_stage
+from .pauses import PauseClassifier
+from .stats import WordRateIndex
+from .topics import model_nbytes, topic_models
 
 
 class Speech(object):
@@ -31,51 +27,312 @@ class Speech(object):
         return self.transcript_as_string().split()
 
 
+class TranscriptAccumulator(object):
+    """Keeps a running transcript (and word count) while a speech is being
+    streamed.
+
+    Each `is_final` result is appended exactly once, and the interim result
+    that follows it is tracked separately, so updating the word count costs
+    the same no matter how long the speech has been going on for.
+    """
+    def __init__(self):
+        self.final_transcripts = []
+        self.num_final_words = 0
+        self.interim_transcript = ''
+        self.num_interim_words = 0
+
+    @property
+    def num_words(self):
+        """Number of words in the final results plus the interim tail."""
+        return self.num_final_words + self.num_interim_words
+
+    def add_final(self, transcript):
+        """Appends the transcript of an `is_final` result. This also clears
+        the interim tail, since the final result replaces it."""
+        self.final_transcripts.append(transcript)
+        self.num_final_words += len(transcript.split())
+        self.set_interim('')
+
+    def set_interim(self, transcript):
+        """Replaces the interim (not yet final) tail of the transcript."""
+        if transcript != self.interim_transcript:
+            self.interim_transcript = transcript
+            self.num_interim_words = len(transcript.split())
+
+    def transcript_as_string(self):
+        """Get the full transcript, including the interim tail."""
+        transcript = ''.join(self.final_transcripts)
+        if self.interim_transcript:
+            transcript += ' ' + self.interim_transcript
+        return transcript
+
+
+class WordTimings(object):
+    """Columnar table holding the timing of every word in a speech.
+
+    Parameters
+    ----------
+    start_secs : np.array of float
+        When each word started (in seconds, including nanos).
+
+    end_secs : np.array of float
+        When each word ended (in seconds, including nanos).
+
+    response_ixs : np.array of int
+        The response to which each word belongs.
+
+    word_ids : np.array of int
+        Index of each word into `vocabulary`.
+
+    vocabulary : list of string
+        Every distinct word, as given by the recognizer.
+
+    transcripts : list of string
+        The transcript of each response.
+
+    rebased : bool (optional, default=False)
+        Whether the timestamps are already relative to the start of the
+        speech. If False, they are relative to the start of the stream
+        (response) they belong to, as the recognizer returns them.
+    """
+    def __init__(self, start_secs, end_secs, response_ixs, word_ids,
+                 vocabulary, transcripts, rebased=False):
+        self.start_secs = np.asarray(start_secs, dtype=np.float64)
+        self.end_secs = np.asarray(end_secs, dtype=np.float64)
+        self.response_ixs = np.asarray(response_ixs, dtype=np.int32)
+        self.word_ids = np.asarray(word_ids, dtype=np.int32)
+        self.vocabulary = list(vocabulary)
+        self.transcripts = list(transcripts)
+        self.rebased = rebased
+
+    @classmethod
+    def from_responses(cls, responses, rebased=False):
+        """Builds the table with a single pass over the recognizer's responses.
+
+        Parameters
+        ----------
+        responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+        rebased : bool (optional, default=False)
+            Whether the responses were already moved onto the speech's
+            timeline (like the ones committed by AudioStream).
+
+        Returns
+        -------
+        timings : WordTimings
+        """
+        start_secs = []
+        end_secs = []
+        response_ixs = []
+        word_ids = []
+        vocabulary = {}
+        transcripts = []
+        for ix, response in enumerate(responses):
+            alternative = response.alternatives[0]
+            transcripts.append(alternative.transcript)
+            for word in alternative.words:
+                start_secs.append(
+                    word.start_time.seconds + word.start_time.nanos * 1e-9
+                )
+                end_secs.append(
+                    word.end_time.seconds + word.end_time.nanos * 1e-9
+                )
+                response_ixs.append(ix)
+                word_ids.append(vocabulary.setdefault(word.word, len(vocabulary)))
+
+        return cls(
+            start_secs, end_secs, response_ixs, word_ids,
+            sorted(vocabulary, key=vocabulary.get), transcripts,
+            rebased=rebased
+        )
+
+    def __len__(self):
+        return self.start_secs.size
+
+    @property
+    def num_responses(self):
+        return len(self.transcripts)
+
+    @property
+    def nbytes(self):
+        """Approximate number of bytes held by this table."""
+        num_bytes = (
+            self.start_secs.nbytes + self.end_secs.nbytes +
+            self.response_ixs.nbytes + self.word_ids.nbytes
+        )
+        num_bytes += sum(len(w) for w in self.vocabulary)
+        num_bytes += sum(len(t) for t in self.transcripts)
+        return num_bytes
+
+    def mean_secs(self):
+        """The mean timestamp of each word."""
+        return (self.start_secs + self.end_secs) / 2
+
+    def response_offsets(self, gap_secs=1):
+        """Finds how much time should be added to each response so that the
+        timestamps are relative to the start of the speech.
+
+        Every stream opened with the recognizer starts counting time from
+        zero, so a new stream shows up as a response whose first word comes
+        before the last word of the previous response. Each of these responses
+        (and every response after it) is shifted to start `gap_secs` after
+        the previous word.
+
+        Parameters
+        ----------
+        gap_secs : float (optional, default=1)
+            Time to leave between the last word of one stream and the first
+            word of the next, so that the words do not overlap.
+
+        Returns
+        -------
+        offsets : np.array of float
+            Seconds to add to every word of each response.
+        """
+        shifts = np.zeros(self.num_responses)
+        if len(self) > 1:
+            mean_times = self.mean_secs()
+            # index of the first word of each response that has any words
+            first_words = np.flatnonzero(np.diff(self.response_ixs)) + 1
+            restarts = first_words[
+                mean_times[first_words] < mean_times[first_words - 1]
+            ]
+            shifts[self.response_ixs[restarts]] = (
+                mean_times[restarts - 1] - mean_times[restarts] + gap_secs
+            )
+        return np.cumsum(shifts)
+
+    def words(self):
+        """Every word spoken, as given by the recognizer."""
+        vocabulary = self.vocabulary
+        return [vocabulary[ix] for ix in self.word_ids]
+
+    def transcript_word_ixs(self):
+        """Finds the word (of `words`) that each word of the transcript is.
+
+        The transcript of a response usually splits into the same words the
+        recognizer timed, but not always (e.g. "5:30" may be timed as two
+        words), so the transcript words of such a response are spread evenly
+        over its timed words.
+
+        Returns
+        -------
+        word_ixs : np.array of int
+            For each word of `''.join(transcripts).split()`, the index of its
+            timed word, or -1 if its response has no timed words.
+        """
+        bounds = np.searchsorted(
+            self.response_ixs, np.arange(self.num_responses + 1)
+        )
+        word_ixs = []
+        for ix, transcript in enumerate(self.transcripts):
+            num_tokens = len(transcript.split())
+            first, last = bounds[ix], bounds[ix + 1]
+            if first == last:
+                word_ixs.extend([-1] * num_tokens)
+            else:
+                offsets = np.arange(num_tokens) * (last - first) // max(num_tokens, 1)
+                word_ixs.extend((first + offsets).tolist())
+        return np.asarray(word_ixs, dtype=np.int64)
+
+
 class GoogleSpeech(object):
-    def __init__(self, responses, num_topics=8):
+    def __init__(self, responses, num_topics=8, key=None):
         """Class to more easily get information out of speech responses.
 
+        The responses are read once into a WordTimings table, which is what
+        all of the analysis is done on; the responses themselves are not kept.
+
         Parameters
         ----------
         responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
-            Each response represents a single 'chunk' of the speech.
+                    or WordTimings
+            Each response represents a single 'chunk' of the speech. The
+            WordTimings of the responses (with the timestamps as the
+            recognizer returned them, like from `load_speech`) can be given
+            instead. Timings that are already `rebased` are not rebased
+            again.
 
         num_topics : int (optional, default=8)
             The number of topics to search for in a given speech via LDA.
+
+        key : string (optional, default=None)
+            Identifies this speech in the shared topic model cache, so a
+            speech that is rebuilt can reuse the models fit for it before. A
+            new key is made if None.
         """
-        # make a copy of this since we are going to be altering the timestamps
-        self.responses = deepcopy(responses)
-        if len(self.responses) > 1:
-            self._update_timestamps()
+        # identifies this speech in the shared topic model cache.
+        self.key = key if key is not None else uuid.uuid4().hex
+        # how long each stage of building this object took (in seconds).
+        self.stage_secs = {}
+
+        with timed_stage('speech.word_timings', self.stage_secs):
+            if isinstance(responses, WordTimings):
+                # the timestamps are replaced when they are rebased, so do
+                # not touch the caller's table.
+                self.timings = WordTimings(
+                    responses.start_secs, responses.end_secs,
+                    responses.response_ixs, responses.word_ids,
+                    responses.vocabulary, responses.transcripts,
+                    rebased=responses.rebased
+                )
+            else:
+                self.timings = WordTimings.from_responses(responses)
+        with timed_stage('speech.rebase', self.stage_secs):
+            if not self.timings.rebased and self.timings.num_responses > 1:
+                self._update_timestamps()
+            self.timings.rebased = True
+
+        # these are used by nearly every analysis, so only compute them once.
+        self._mean_timestamps = self.timings.mean_secs()
+        self._mean_timestamps.flags.writeable = False
+        self._pause_duration = np.diff(self._mean_timestamps)
+        self._pause_duration.flags.writeable = False
 
         self.num_topics = num_topics
+        self._analysis = None
+        self._word_rate = None
 
-        # create a KMeans classifier to find short and long pauses in speech,
-        # and fit it to our data.
-        self.kmeans_pause = KMeans(n_clusters=2)
-        self._fit_kmeans()
+        # cluster the pauses in the speech into short and long ones.
+        with timed_stage('speech.pause_classifier', self.stage_secs):
+            self.pause_classifier = PauseClassifier()
+            self._fit_pause_classifier()
 
         # fit an LDA model using the transcript.
-        self.fit_lda(num_topics)
+        with timed_stage('speech.lda', self.stage_secs):
+            self.fit_lda(num_topics)
+
+    @classmethod
+    def from_file(cls, filename, num_topics=8):
+        """Builds a GoogleSpeech from a speech file (see streaming/speechfile.py).
+
+        Parameters
+        ----------
+        filename : string
+        num_topics : int (optional, default=8)
+
+        Returns
+        -------
+        google_speech : GoogleSpeech
+        """
+        # imported here, since speechfile imports this module.
+        from .speechfile import load_speech
+        return cls(load_speech(filename), num_topics=num_topics)
 
     def get_timestamp_secs(self, timepoint='start_time'):
         """
         Returns
         -------
         timestamps : np.array
-            The timestamps for each word across all responses.
+            The timestamps (in seconds) for each word across all responses.
 
         response_ixs : np.array
             The response to which each timestamp belongs.
         """
-        timestamps = []
-        response_ixs = []
-        for ix, response in enumerate(self.responses):
-            for word in response.alternatives[0].words:
-                timestamps.append(getattr(word, timepoint).seconds)
-                response_ixs.append(ix)
-
-        return np.asarray(timestamps), np.asarray(response_ixs)
+        if timepoint == 'start_time':
+            timestamps = self.timings.start_secs
+        else:
+            timestamps = self.timings.end_secs
+        return timestamps.copy(), self.timings.response_ixs.copy()
 
     def get_updated_seconds(self):
         """Gets the correct (updated) start and end times for each word spoken
@@ -83,49 +340,17 @@ class GoogleSpeech(object):
 
         Returns
         -------
-        new_start_times (seconds)
-        new_end_times (seconds)
+        new_start_times : np.array (seconds)
+        new_end_times : np.array (seconds)
         """
-        # get all of the start and end times for every word
-        start_times, response_ixs = self.get_timestamp_secs('start_time')
-        end_times, _ = self.get_timestamp_secs('end_time')
-
-        # get the mean time of each word
-        mean_times = (start_times + end_times) / 2
-
-        # calculate where one word comes before the next --
-        # this is where the response times need to be updated
-        diffs = np.diff(mean_times)
-        diffs_neg = np.where(diffs < 0)[0]
-        response_diff_neg = response_ixs[diffs_neg + 1]
-
-        # determine how much time should be added to each word in each response.
-        # add 1 second to these times to make sure these words are non-overlapping
-        add_to_responses = np.cumsum(np.abs(diffs[diffs_neg])).astype(np.int) + 1
-
-        # update the times
-        new_start_times = []
-        new_end_times = []
-        for i, response in enumerate(self.responses):
-            starts = start_times[response_ixs == i]
-            ends = end_times[response_ixs == i]
-            if i in response_diff_neg.tolist():
-                starts += add_to_responses[response_diff_neg == i]
-                ends += add_to_responses[response_diff_neg == i]
-            new_start_times.extend(starts.tolist())
-            new_end_times.extend(ends.tolist())
-
+        word_offsets = self.timings.response_offsets()[self.timings.response_ixs]
+        new_start_times = self.timings.start_secs + word_offsets
+        new_end_times = self.timings.end_secs + word_offsets
         return new_start_times, new_end_times
 
     def _update_timestamps(self):
         """Updates all of the timestamps for each word across all responses."""
-        new_start_sec, new_end_sec = self.get_updated_seconds()
-        counter = 0
-        for response in self.responses:
-            for word in response.alternatives[0].words:
-                word.start_time.seconds = new_start_sec[counter]
-                word.end_time.seconds = new_end_sec[counter]
-                counter += 1
+        self.timings.start_secs, self.timings.end_secs = self.get_updated_seconds()
 
     def transcript_as_list(self):
         """Returns the transcript as a list of words."""
@@ -133,30 +358,77 @@ class GoogleSpeech(object):
 
     def transcript_as_string(self):
         """Get the full transcript, compiled across responses."""
-        t = []
-        for response in self.responses:
-            t.append(response.alternatives[0].transcript)
-        return ''.join(t)
+        return ''.join(self.timings.transcripts)
 
     def transcript_split_on_pause(self):
         """Splits a transcript based on where `long` pauses occur."""
         _, long_pause_ix = self._pause_labels()
         trans = self.transcript_as_list()
         splits = []
-        split_ixs = [0] + (np.where(long_pause_ix)[0] + 1).tolist()
+        split_ixs = [0] + (np.where(long_pause_ix)[0] + 1).tolist() + [len(trans)]
         for i in range(len(split_ixs) - 1):
-            splits.append(' '.join(trans[split_ixs[i]:split_ixs[i+1]]))
+            if split_ixs[i] < split_ixs[i+1]:
+                splits.append(' '.join(trans[split_ixs[i]:split_ixs[i+1]]))
         return splits
 
+    @property
+    def word_rate(self):
+        """The WordRateIndex for this speech, used to find the words per minute
+        over any window of time. It is only built once."""
+        if self._word_rate is None:
+            self._word_rate = WordRateIndex(
+                self.mean_timestamps(), words=self.transcript_as_list()
+            )
+        return self._word_rate
+
+    @property
+    def analysis(self):
+        """The SpeechAnalysis (tokenized transcript, word counts and LDA input)
+        for this speech. It is only built once."""
+        if self._analysis is None:
+            self._analysis = SpeechAnalysis(self)
+        return self._analysis
+
+    def invalidate(self):
+        """Drops the SpeechAnalysis and WordRateIndex built for this speech, so
+        they are rebuilt the next time they are used. The fitted LDA models are
+        kept in the shared topic model cache (see `topic_models.discard`)."""
+        self._analysis = None
+        self._word_rate = None
+
+    @property
+    def nbytes(self):
+        """Approximate number of bytes held by this speech, including the
+        indexes built for it and its LDA models (its current one, and the
+        ones in the shared topic model cache)."""
+        num_bytes = self.timings.nbytes
+        num_bytes += self._mean_timestamps.nbytes + self._pause_duration.nbytes
+        if self._analysis is not None:
+            num_bytes += self._analysis.nbytes
+        if self._word_rate is not None:
+            num_bytes += self._word_rate.nbytes
+        models = dict((id(m[0]), m) for m in topic_models.models(self.key))
+        models[id(self.lda_model)] = (self.lda_model, self.lda_Z)
+        num_bytes += sum(model_nbytes(m) for m in models.values())
+        return num_bytes
+
     def mean_timestamps(self):
-        """Get the mean timestamp for each word spoken."""
-        timestamps = []
-        for response in self.responses:
-            for word in response.alternatives[0].words:
-                start = word.start_time.seconds + word.start_time.nanos * 1e-9
-                end = word.end_time.seconds + word.end_time.nanos * 1e-9
-                timestamps.append(np.mean([start, end]))
-        return timestamps
+        """Get the mean timestamp for each word spoken.
+
+        Returns
+        -------
+        timestamps : np.array (read-only)
+        """
+        return self._mean_timestamps
+
+    def pause_durations(self):
+        """Get the time between each pair of consecutive words.
+
+        Returns
+        -------
+        pause_duration : np.array (read-only)
+        """
+        return self._pause_duration
 
     def words_per_min(self):
         timestamps = self.mean_timestamps()
@@ -166,10 +438,9 @@ class GoogleSpeech(object):
         num_words_spoken = len(self.transcript_as_list())
         return num_words_spoken / duration_min
 
-    def _fit_kmeans(self):
-        """Fits and returns a KMeans classifier to find long/short pauses in speech."""
-        pause_duration = np.diff(self.mean_timestamps())
-        self.kmeans_pause.fit(pause_duration.reshape(-1, 1))
+    def _fit_pause_classifier(self):
+        """Fits the classifier that finds long/short pauses in speech."""
+        self.pause_classifier.fit(self.pause_durations())
 
     def _pause_labels(self, split_metric='std'):
         """Gets labels for where short and long pauses occurred in speech.
@@ -189,10 +460,10 @@ class GoogleSpeech(object):
         long_pauses : bool
             Indexes containing long pauses are True.
         """
-        pause_duration = np.diff(self.mean_timestamps())
+        pause_duration = self.pause_durations()
 
         if split_metric == 'kmeans':
-            labels = self.kmeans_pause.labels_.astype(np.bool)
+            labels = self.pause_classifier.predict(pause_duration)
         else:
             labels = pause_duration > self.std_threshold()
 
@@ -211,22 +482,22 @@ class GoogleSpeech(object):
     def std_threshold(self):
         """Finds the threshold for splitting between short and long pauses by taking
         the mean + 1 standard deviation of the average time between words as 'long'"""
-        pause_duration = np.diff(self.mean_timestamps())
+        pause_duration = self.pause_durations()
         mean_diff = np.mean(pause_duration)
         std_diff = np.std(pause_duration)
         return mean_diff + std_diff
 
     def kmeans_pause_threshold(self):
-        """Finds the threshold between short and long pauses using KMeans clustering."""
-        pause_duration = np.diff(self.mean_timestamps())
-        short_pause_ix, long_pause_ix = self._pause_labels()
-        short_pauses = pause_duration[short_pause_ix]
-        long_pauses = pause_duration[long_pause_ix]
-        return np.mean([np.max(short_pauses), np.min(long_pauses)])
+        """Finds the threshold between short and long pauses using (exact, 1-D)
+        k-means clustering."""
+        return self.pause_classifier.threshold
 
     def fit_lda(self, n_topics=8):
         """Fits an LDA to this speech transcribed by Google Speech API.
 
+        Fitted models are kept in a shared cache, so going back to a number of
+        topics that has been used (or prefetched) before does not refit.
+
         Parameters
         ----------
         n_topics : int
@@ -236,8 +507,8 @@ class GoogleSpeech(object):
         ----------
         These attributes are set upon a call to `fit_lda`.
 
-        vectorizer : CountVectorizer
-            Used to create word counts for this speech.
+        feature_names : np.array of string
+            The word belonging to each column of the LDA's components.
 
         model : LatentDirichletAllocation
             Fit to passed speech.
@@ -246,16 +517,37 @@ class GoogleSpeech(object):
             These are the weights of each of the documents for each of the
             topics found via LDA.
         """
-        vectorizer = CountVectorizer(stop_words='english', lowercase=True)
-        vectorized_speech = vectorizer.fit_transform(self.transcript_split_on_pause())
+        vectorized_speech, feature_names = self.analysis.lda_input()
+        lda_model, lda_Z = topic_models.get(self.key, n_topics, vectorized_speech)
 
-        lda_model = LatentDirichletAllocation(n_components=n_topics, max_iter=10, learning_method='online')
-        lda_Z = lda_model.fit_transform(vectorized_speech)
-
-        self.vectorizer = vectorizer
+        self.num_topics = n_topics
+        self.feature_names = feature_names
         self.lda_model = lda_model
         self.lda_Z = lda_Z
 
+    def fit_lda_async(self, n_topics):
+        """Starts fitting an LDA with `n_topics` in the background (unless it
+        is cached or already being fit), without waiting for it.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Once it is done, `fit_lda(n_topics)` only needs a cache lookup.
+        """
+        vectorized_speech, _ = self.analysis.lda_input()
+        return topic_models.get_async(self.key, n_topics, vectorized_speech)
+
+    def prefetch_topics(self, topic_counts):
+        """Fits LDAs for each of `topic_counts` in the background, so a later
+        call to `fit_lda` with one of them only needs a cache lookup.
+
+        Parameters
+        ----------
+        topic_counts : iterable of int
+        """
+        vectorized_speech, _ = self.analysis.lda_input()
+        topic_models.prefetch(self.key, topic_counts, vectorized_speech)
+
     def get_topic_proportions(self):
         return self.lda_Z.mean(axis=0)
 
@@ -263,20 +555,47 @@ class GoogleSpeech(object):
         """Gets all the topics in a format that can be plotted by `linked_charts.js`."""
         data = []
         proportions = self.get_topic_proportions()
-        vec_feature_names = self.vectorizer.get_feature_names()
+        vec_feature_names = self.feature_names
         for ix, topic in enumerate(self.lda_model.components_):
             topic_data = {'proportion': proportions[ix]}
             topic_data['topic'] = 'Topic {}'.format(ix+1)
             topic_data['categories'] = []
             for i in topic.argsort()[:-top_n - 1:-1]:
-                topic_data['categories'].append({'name': vec_feature_names[i], 'value': topic[i]})
+                topic_data['categories'].append({'name': str(vec_feature_names[i]), 'value': topic[i]})
             data.append(topic_data)
         return data
 
 
 class TedSpeech(object):
-    """This class will generate an object for analyzing transcript data
-    scraped from the TED.com website."""
-    def __init__(self, transcript, duration_min):
-        self.transcript = transcript
-        self.duration_min = None
+    """A talk scraped from the TED.com website: its transcript and how long it
+    is.
+
+    There are no word timings, so unlike a GoogleSpeech it has no timestamps
+    or pauses; only its overall pace (`words_per_min`) is known. It has the
+    parts of the GoogleSpeech interface that the TED reference index uses
+    (see streaming/ted.py).
+
+    Parameters
+    ----------
+    transcript : string
+
+    duration_min : float
+        Length of the talk (in minutes).
+
+    name : string (optional, default=None)
+    """
+    def __init__(self, transcript, duration_min, name=None):
+        self.name = name
+        self.duration_min = float(duration_min)
+        # "(Laughter)", "(Applause)" and the like are not words.
+        self.transcript = ' '.join(re.sub(r'\([^)]*\)', ' ', transcript).split())
+
+    def transcript_as_string(self):
+        return self.transcript
+
+    def transcript_as_list(self):
+        """Returns the transcript as a list of words."""
+        return self.transcript.split()
+
+    def words_per_min(self):
+        return len(self.transcript_as_list()) / self.duration_min
@@ -0,0 +1,243 @@
+# speechfile.py
+#
+# A compact binary format for the recognizer's results, which can be read
+# through a memory map without unpickling anything. Convert a pickled (dill)
+# list of results (from `app/`) with:
+#
+#     python -m streaming.speechfile <responses.pkd> [<responses.speech>]
+#
+# Layout (everything little-endian):
+#
+#     header       magic (8 bytes), version (uint16), flags (uint16),
+#                  num_words, num_responses, vocabulary size (uint32 each)
+#     sections     (offset, num_bytes) as uint64, for each of SECTIONS
+#
+# followed by the sections themselves, each starting on an 8 byte boundary.
+# The word timestamps are in seconds. If the FLAG_REBASED flag is set they
+# are relative to the start of the speech (like the ones the app records);
+# otherwise they are relative to the start of the response (stream) they
+# belong to, just as the recognizer returned them. Strings are
+# stored as one UTF-8 blob plus the offset at which each string starts (and
+# one past the last).
+
+import os
+import sys
+import mmap
+import struct
+
+import dill
+import numpy as np
+
+from .speech import WordTimings
+
+
+SPEECH_FILE_MAGIC = b'TLTSPCH\x00'
+SPEECH_FILE_VERSION = 1
+
+# set in the header's flags if the timestamps are already on the speech's
+# timeline.
+FLAG_REBASED = 0x1
+
+HEADER = struct.Struct('<8sHHIII')
+
+# name and dtype of every section, in the order they are written.
+SECTIONS = [
+    ('start_secs', '<f8'),
+    ('end_secs', '<f8'),
+    ('word_ids', '<i4'),
+    # index of the first word of each response (and one past the last word).
+    ('response_starts', '<i4'),
+    ('vocabulary_offsets', '<u4'),
+    ('vocabulary', 'u1'),
+    ('transcript_offsets', '<u4'),
+    ('transcripts', 'u1'),
+]
+
+SECTION_TABLE = struct.Struct('<' + 'QQ' * len(SECTIONS))
+
+
+def _encode_strings(strings):
+    """Joins strings into a UTF-8 blob, and the offset of each one in it."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype='u1')
+
+
+def _decode_strings(offsets, blob):
+    data = blob.tobytes()
+    return [
+        data[start:end].decode('utf-8')
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    ]
+
+
+def save_speech(timings, filename):
+    """Writes a speech's word timings to `filename`.
+
+    Parameters
+    ----------
+    timings : WordTimings
+        Whether its timestamps are on the speech's timeline is kept (see
+        `WordTimings.rebased`).
+
+    filename : string
+    """
+    with open(filename, 'wb') as f:
+        f.write(dump_speech(timings))
+
+
+def dump_speech(timings):
+    """The contents of the speech file for `timings` (see `save_speech`).
+
+    Returns
+    -------
+    data : bytes
+    """
+    counts = np.bincount(timings.response_ixs, minlength=timings.num_responses)
+    response_starts = np.zeros(timings.num_responses + 1, dtype='<i4')
+    np.cumsum(counts, out=response_starts[1:])
+    vocabulary_offsets, vocabulary = _encode_strings(timings.vocabulary)
+    transcript_offsets, transcripts = _encode_strings(timings.transcripts)
+
+    arrays = {
+        'start_secs': timings.start_secs,
+        'end_secs': timings.end_secs,
+        'word_ids': timings.word_ids,
+        'response_starts': response_starts,
+        'vocabulary_offsets': vocabulary_offsets,
+        'vocabulary': vocabulary,
+        'transcript_offsets': transcript_offsets,
+        'transcripts': transcripts,
+    }
+
+    table = []
+    sections = []
+    offset = HEADER.size + SECTION_TABLE.size
+    for name, dtype in SECTIONS:
+        data = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+        padding = -offset % 8
+        offset += padding
+        table += [offset, len(data)]
+        sections.append(b'\x00' * padding + data)
+        offset += len(data)
+
+    flags = FLAG_REBASED if timings.rebased else 0
+    header = HEADER.pack(
+        SPEECH_FILE_MAGIC, SPEECH_FILE_VERSION, flags, len(timings),
+        timings.num_responses, len(timings.vocabulary)
+    )
+    return b''.join([header, SECTION_TABLE.pack(*table)] + sections)
+
+
+def load_speech(filename):
+    """Reads a speech written by `save_speech`. The timestamps and word ids
+    are read-only views of a memory map of the file.
+
+    Returns
+    -------
+    timings : WordTimings
+
+    Raises
+    ------
+    ValueError
+        If the file is not a speech file, or was written by an incompatible
+        version of this module.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size + SECTION_TABLE.size:
+            raise ValueError('{} is not a speech file.'.format(filename))
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return parse_speech(buf, filename)
+
+
+def parse_speech(buf, filename='speech'):
+    """Reads the contents of a speech file from a buffer (like bytes or a
+    memory map). The timestamps and word ids are read-only views of it.
+
+    Parameters
+    ----------
+    buf : bytes-like
+    filename : string (optional, default='speech')
+        Where the data came from, for error messages.
+
+    Returns
+    -------
+    timings : WordTimings
+    """
+    if len(buf) < HEADER.size + SECTION_TABLE.size:
+        raise ValueError('{} is not a speech file.'.format(filename))
+    magic, version, flags, num_words, num_responses, vocabulary_size = \
+        HEADER.unpack_from(buf)
+    if magic != SPEECH_FILE_MAGIC:
+        raise ValueError('{} is not a speech file.'.format(filename))
+    if version != SPEECH_FILE_VERSION:
+        raise ValueError(
+            '{} has speech file version {}, expected {}. Convert it again '
+            'with `python -m streaming.speechfile`.'.format(
+                filename, version, SPEECH_FILE_VERSION)
+        )
+
+    table = SECTION_TABLE.unpack_from(buf, HEADER.size)
+    arrays = {}
+    for i, (name, dtype) in enumerate(SECTIONS):
+        offset, num_bytes = table[2 * i], table[2 * i + 1]
+        if offset + num_bytes > len(buf):
+            raise ValueError('{} is truncated.'.format(filename))
+        arrays[name] = np.frombuffer(
+            buf, dtype=dtype, count=num_bytes // np.dtype(dtype).itemsize,
+            offset=offset
+        )
+
+    response_starts = arrays['response_starts']
+    if len(arrays['start_secs']) != num_words or \
+       len(response_starts) != num_responses + 1 or \
+       len(arrays['vocabulary_offsets']) != vocabulary_size + 1:
+        raise ValueError('{} is corrupt.'.format(filename))
+
+    response_ixs = np.repeat(
+        np.arange(num_responses, dtype=np.int32), np.diff(response_starts)
+    )
+    return WordTimings(
+        arrays['start_secs'], arrays['end_secs'], response_ixs,
+        arrays['word_ids'],
+        _decode_strings(arrays['vocabulary_offsets'], arrays['vocabulary']),
+        _decode_strings(arrays['transcript_offsets'], arrays['transcripts']),
+        rebased=bool(flags & FLAG_REBASED)
+    )
+
+
+def convert_pkd(pkd_filename, filename=None):
+    """Converts a pickled (dill) list of the recognizer's results into a
+    speech file.
+
+    Parameters
+    ----------
+    pkd_filename : string
+    filename : string (optional, default=None)
+        Defaults to `pkd_filename` with a .speech extension.
+
+    Returns
+    -------
+    filename : string
+    """
+    if filename is None:
+        filename = os.path.splitext(pkd_filename)[0] + '.speech'
+    with open(pkd_filename, 'rb') as f:
+        responses = dill.load(f)
+    save_speech(WordTimings.from_responses(responses), filename)
+    return filename
+
+
+def main(argv):
+    if len(argv) not in [2, 3]:
+        print('usage: python -m streaming.speechfile <responses.pkd> '
+              '[<responses.speech>]')
+        return 1
+    filename = convert_pkd(*argv[1:])
+    print('wrote speech to', filename)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,7 +1,19 @@
 # stats.py
 
+import re
+import math
+import heapq
+import threading
+from collections import Counter
+
 import numpy as np
-from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from .pauses import PauseClassifier
+
+
+# same tokens as sklearn's CountVectorizer, so counts match the final analysis.
+TOKEN_PATTERN = re.compile(r'(?u)\b\w\w+\b')
 
 
 def count_words(google_speech, include_stop_words=False, return_top_n=10):
@@ -22,28 +34,287 @@ def count_words(google_speech, include_stop_words=False, return_top_n=10):
     list of dict :
         Each item in the list is a dict like {'word': <word>, 'count': <count>}
     """
-    if include_stop_words:
-        stop_words = None
-    else:
-        stop_words = 'english'
+    return google_speech.analysis.top_words(
+        top_n=return_top_n, include_stop_words=include_stop_words
+    )
 
-    transcript = google_speech.transcript_as_string()
-    vectorizer = CountVectorizer(stop_words=stop_words)
 
-    counts = vectorizer.fit_transform([transcript]).toarray().flatten().tolist()
+class WordRateIndex(object):
+    """Cumulative count of the words spoken over a fine time grid.
 
-    # make sure that we have enough words to return.
-    if len(counts) < return_top_n:
-        return_top_n = len(counts)
+    The number of words spoken in any window of time is the difference of two
+    entries of the cumulative count, and the average over a range of windows
+    is the difference of two entries of its running sum. So the words per
+    minute for any window size (and any number of points) can be found in O(1)
+    per point, without going back to the timestamps.
 
-    top_n_ixs = np.argsort(counts)[-return_top_n:][::-1]
+    Parameters
+    ----------
+    timestamps : array-like of float
+        When each word was spoken (in seconds).
 
-    words = vectorizer.get_feature_names()
-    data = []
-    for ix in top_n_ixs:
-        data.append({'word': words[ix], 'count': counts[ix]})
+    words : list of string (optional, default=None)
+        The transcript, in the order the words were spoken. Only needed by
+        `timeline`.
+
+    resolution_sec : float (optional, default=0.1)
+        Size of each step of the time grid (in seconds).
+    """
+    def __init__(self, timestamps, words=None, resolution_sec=0.1):
+        timestamps = np.sort(np.asarray(timestamps, dtype=np.float64))
+        self.resolution_sec = resolution_sec
+        self.words = words
+        self.num_words = timestamps.size
+        self.last_word_sec = float(timestamps[-1]) if timestamps.size else 0.0
+
+        cells = np.floor(np.clip(timestamps, 0, None) / resolution_sec).astype(np.int64)
+        self.num_cells = int(cells[-1]) + 1 if cells.size else 1
+        counts = np.bincount(cells, minlength=self.num_cells)
+
+        # cumulative[k] is the number of words spoken before k * resolution_sec.
+        # it is padded by the length of the speech on either side, so that any
+        # window can be looked up without checking for the ends of the speech.
+        num_cells = self.num_cells
+        cumulative = np.concatenate(([0], np.cumsum(counts)))
+        self._cumulative = np.concatenate((
+            np.zeros(num_cells, dtype=np.int64),
+            cumulative,
+            np.full(num_cells, cumulative[-1], dtype=np.int64)
+        ))
+        self._running_sum = np.concatenate(([0], np.cumsum(self._cumulative)))
+
+    @property
+    def duration_sec(self):
+        return self.num_cells * self.resolution_sec
+
+    @property
+    def nbytes(self):
+        """Approximate number of bytes held by the index."""
+        return self._cumulative.nbytes + self._running_sum.nbytes
+
+    def _to_grid(self, secs):
+        grid = np.rint(np.asarray(secs, dtype=np.float64) / self.resolution_sec)
+        return np.clip(grid.astype(np.int64), 0, self.num_cells)
+
+    def _window_cells(self, window_sec):
+        """Number of grid steps in a window, and how far it reaches before and
+        after each point."""
+        num = int(np.clip(round(window_sec / self.resolution_sec), 1, 2 * self.num_cells))
+        before = num // 2
+        return num, before, num - before
+
+    def count_between(self, start_sec, end_sec):
+        """Number of words spoken between `start_sec` and `end_sec`."""
+        start = self._to_grid(start_sec) + self.num_cells
+        end = self._to_grid(end_sec) + self.num_cells
+        return self._cumulative[end] - self._cumulative[start]
+
+    def words_per_min(self, times_sec, window_sec=10):
+        """Words per minute over a window of `window_sec` centered on each of
+        `times_sec`.
+
+        Returns
+        -------
+        wpm : np.array
+        """
+        num, before, after = self._window_cells(window_sec)
+        points = self._to_grid(times_sec) + self.num_cells
+        counts = self._cumulative[points + after] - self._cumulative[points - before]
+        return counts / (num * self.resolution_sec / 60)
+
+    def mean_words_per_min(self, edges_sec, window_sec=10):
+        """Average of `words_per_min` over each interval between consecutive
+        `edges_sec`.
+
+        Returns
+        -------
+        wpm : np.array of size len(edges_sec) - 1
+        """
+        num, before, after = self._window_cells(window_sec)
+        edges = self._to_grid(edges_sec)
+        starts = edges[:-1] + self.num_cells
+        ends = np.maximum(edges[1:], edges[:-1] + 1) + self.num_cells
+
+        running_sum = self._running_sum
+        window_sums = (
+            running_sum[ends + after] - running_sum[starts + after] -
+            running_sum[ends - before] + running_sum[starts - before]
+        )
+        mean_counts = window_sums / (ends - starts)
+        return mean_counts / (num * self.resolution_sec / 60)
+
+    def timeline(self, window_sec=10, num_points=60):
+        """Splits the speech into `num_points` equal intervals, and finds the
+        average words per minute (over a sliding window of `window_sec`) and
+        the transcript of each one.
+
+        Returns
+        -------
+        list of dict
+            Like {'wpm': <wpm>, 'transcript': <transcript>}
+        """
+        edges = np.linspace(0, self.duration_sec, num_points + 1)
+        wpms = self.mean_words_per_min(edges, window_sec)
+
+        words = self.words if self.words is not None else []
+        word_ixs = self.count_between(np.zeros(edges.size), edges)
+        word_ixs[-1] = len(words)
+        return [
+            {
+                'wpm': float(wpms[i]),
+                'transcript': ' '.join(words[word_ixs[i]:word_ixs[i+1]])
+            }
+            for i in range(num_points)
+        ]
+
+
+class OnlineSpeechStats(object):
+    """Pause statistics and word counts that are kept up to date as each
+    `is_final` result comes in, so they are available while the user is still
+    talking.
+
+    Pauses are the time between the mean timestamps of consecutive words. A
+    running mean and variance (Welford's method) gives the same threshold as
+    `GoogleSpeech.std_threshold` (mean + 1 standard deviation), and each new
+    pause is classified as short or long against the threshold at the time it
+    comes in. Every pause is also inserted into a PauseClassifier, which
+    gives the k-means split between short and long pauses (as
+    `GoogleSpeech.kmeans_pause_threshold` does) at any point of the talk.
 
-    return data
+    Parameters
+    ----------
+    gap_secs : float (optional, default=1)
+        When a new recognizer stream restarts the timestamps, its words are
+        placed this long after the previous word (see
+        `WordTimings.response_offsets`).
+    """
+    def __init__(self, gap_secs=1):
+        self.gap_secs = gap_secs
+        self.num_results = 0
+        self.num_pauses = 0
+        self.num_long_pauses = 0
+        self.last_pause_long = False
+        self.word_counts = Counter()
+        self.pause_classifier = PauseClassifier()
+
+        self._mean = 0.
+        self._m2 = 0.
+        self._offset_sec = 0.
+        self._last_word_sec = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def mean_pause(self):
+        return self._mean
+
+    @property
+    def std_pause(self):
+        """Population standard deviation of the pauses, like `np.std`."""
+        if self.num_pauses == 0:
+            return 0.
+        return math.sqrt(self._m2 / self.num_pauses)
+
+    def threshold(self):
+        """Pauses longer than this are 'long' (mean + 1 standard deviation)."""
+        return self.mean_pause + self.std_pause
+
+    def kmeans_threshold(self):
+        """The k-means split between short and long pauses so far, or None
+        until there are two different pauses."""
+        try:
+            return self.pause_classifier.threshold
+        except ValueError:
+            return None
+
+    def add_result(self, result):
+        """Adds the words of an `is_final` result.
+
+        Parameters
+        ----------
+        result : google.cloud.speech_v1.types.SpeechRecognitionResult
+        """
+        alternative = result.alternatives[0]
+        times = [
+            (w.start_time.seconds + w.start_time.nanos * 1e-9 +
+             w.end_time.seconds + w.end_time.nanos * 1e-9) / 2
+            for w in alternative.words
+        ]
+        tokens = TOKEN_PATTERN.findall(alternative.transcript.lower())
+
+        with self._lock:
+            self.num_results += 1
+            self.word_counts.update(tokens)
+            if len(times) == 0:
+                return
+
+            # a new stream starts counting from zero again.
+            if self._last_word_sec is not None and \
+               times[0] + self._offset_sec < self._last_word_sec:
+                self._offset_sec = self._last_word_sec - times[0] + self.gap_secs
+
+            for t in times:
+                t += self._offset_sec
+                if self._last_word_sec is not None:
+                    self._add_pause(t - self._last_word_sec)
+                self._last_word_sec = t
+
+    def extend(self, results):
+        """Adds the words of each of `results`."""
+        for result in results:
+            self.add_result(result)
+
+    def _add_pause(self, pause):
+        self.last_pause_long = bool(
+            self.num_pauses > 1 and pause > self.threshold()
+        )
+        if self.last_pause_long:
+            self.num_long_pauses += 1
+
+        self.pause_classifier.insert(pause)
+        self.num_pauses += 1
+        delta = pause - self._mean
+        self._mean += delta / self.num_pauses
+        self._m2 += delta * (pause - self._mean)
+
+    def top_words(self, top_n=10, include_stop_words=False):
+        """The most frequently used words so far.
+
+        Returns
+        -------
+        list of dict :
+            Each item in the list is a dict like {'word': <word>, 'count': <count>}
+        """
+        with self._lock:
+            items = [
+                item for item in self.word_counts.items()
+                if include_stop_words or item[0] not in ENGLISH_STOP_WORDS
+            ]
+        # most frequent first; ties are broken in reverse alphabetical order,
+        # like the final analysis.
+        top = heapq.nlargest(top_n, items, key=lambda item: (item[1], item[0]))
+        return [{'word': word, 'count': count} for word, count in top]
+
+    def pause_summary(self):
+        """Current pause statistics, formatted for the client."""
+        with self._lock:
+            return {
+                'mean-pause': self.mean_pause,
+                'std-pause': self.std_pause,
+                'long-pause-threshold': self.threshold(),
+                'kmeans-pause-threshold': self.kmeans_threshold(),
+                'num-pauses': self.num_pauses,
+                'num-long-pauses': self.num_long_pauses,
+                'last-pause-long': self.last_pause_long
+            }
 
 
 def words_per_min_array(gs, bin_size_sec=10, num_points_to_return=60):
@@ -54,7 +325,7 @@ def words_per_min_array(gs, bin_size_sec=10, num_points_to_return=60):
     gs : GoogleSpeech
         Speech to find windowed number of words per min.
 
-    bin_size_sec : int
+    bin_size_sec : float
         How big the sliding window should be (in seconds)
 
     num_points_to_return : int
@@ -63,71 +334,66 @@ def words_per_min_array(gs, bin_size_sec=10, num_points_to_return=60):
 
     Returns
     -------
-    words_per_min : np.array
-    transcript : list of string
-        Contains transcript associated with wpm.
+    list of dict
+        Like {'wpm': <wpm>, 'transcript': <transcript>}, where the transcript
+        is what was said during that part of the speech.
     """
-    timestamps = np.asarray(gs.mean_timestamps()).astype(np.int)
-
-    counts, _ = np.histogram(timestamps, bins=np.arange(np.max(timestamps) + 2))
-    windowed_counts = np.convolve(counts, np.ones(bin_size_sec), 'same')
+    return gs.word_rate.timeline(bin_size_sec, num_points_to_return)
 
-    ixs = np.linspace(0, windowed_counts.size - 1, num_points_to_return).astype(np.int)
-    avgs = []
 
-    transcript = gs.transcript_as_list()
-    transcript_chunks = []
-    start_ix = 0
-    for i in range(ixs.size - 1):
-        wc = windowed_counts[ixs[i]:ixs[i+1]]
-        c = counts[ixs[i]:ixs[i+1]]
-        num_words_in_window = int(np.sum(c))
-        avgs.append(np.mean(wc))
-        transcript_chunks.append(' '.join(transcript[start_ix:(start_ix + num_words_in_window)]))
-        start_ix += num_words_in_window
-    avgs.append(np.mean(windowed_counts[ixs[i+1]:]))
-    transcript_chunks.append(' '.join(transcript[start_ix:]))
+def running_words_per_min_settings(duration_sec):
+    """Which bin sizes to offer, and how many points to plot, for a speech of
+    the given length.
 
-    wpms = np.asarray(avgs).flatten() / (bin_size_sec / 60)
+    Returns
+    -------
+    bin_sizes : list of int (or -1)
+        If -1, then the speech was < 10 seconds.
 
-    return [{'wpm': wpms[i], 'transcript': transcript_chunks[i]} for i in range(len(wpms))]
+    num_values_to_return : int (or -1)
+    """
+    # don't return anything if the speech is less than 10 seconds
+    if duration_sec <= 10:
+        return -1, -1
+    elif duration_sec <= 30:
+        return [1, 5, 10], 10
+    elif duration_sec <= 60:
+        return [1, 5, 10, 30], 30
+    return [1, 5, 10, 30, 60], 60
 
 
-def get_running_words_per_min(google_speech, num_values_to_return=60):
+def get_running_words_per_min(google_speech, num_values_to_return=None):
     """Gets the running average of the user's speech speed.
 
+    Every bin size in `bin_sizes` is computed (each is O(points) with the
+    speech's WordRateIndex); any other window size can be looked up later
+    with `words_per_min_array`.
+
     Parameters
     ----------
     google_speech : GoogleSpeech
-    num_values_to_return : int (optional, default=60)
-        If this is less than the length of the user's speech (in seconds),
-        then the speech will be evenly split into `num_values_to_return` bins
-        and the average running average within that bin will be returned.
+    num_values_to_return : int (optional, default=None)
+        The speech will be evenly split into `num_values_to_return` bins and
+        the average running average within that bin will be returned. By
+        default this depends on the length of the speech.
 
     Returns
     -------
     bin_sizes : list of int (or -1)
-        Each bin size will be one of [1, 5, 10, 30, 60] seconds in lenght;
+        Each bin size will be one of [1, 5, 10, 30, 60] seconds in length;
         the elements in this list is dependent on the length of the speech.
         If -1, then the speech was < 10 seconds.
 
     running_words_per_min : dict
-        Each key is a bins size, and each value is a list of dicts, like:
+        The key is the bin size, and the value is a list of dicts, like:
         {'wpm': <wpm>, 'transcript': <transcript>}
     """
     duration_sec = int(np.max(google_speech.mean_timestamps()))
-
-    # don't return anything if the speech is less than 10 seconds
-    if duration_sec <= 10:
+    bin_sizes, num_points = running_words_per_min_settings(duration_sec)
+    if bin_sizes == -1:
         return -1, -1
-    elif duration_sec <= 30:
-        num_values_to_return = 10
-        bin_sizes = [1, 5, 10]
-    elif duration_sec <= 60:
-        num_values_to_return = 30
-        bin_sizes = [1, 5, 10, 30]
-    else:
-        bin_sizes = [1, 5, 10, 30, 60]
+    if num_values_to_return is None:
+        num_values_to_return = num_points
 
     data = {}
     for bin_size in bin_sizes:
@@ -136,5 +402,4 @@ def get_running_words_per_min(google_speech, num_values_to_return=60):
             bin_size_sec=bin_size,
             num_points_to_return=num_values_to_return
         )
-
-    return bin_sizes, data
\ No newline at end of file
+    return bin_sizes, data
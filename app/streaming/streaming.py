@@ -1,11 +1,23 @@
 
 import time
+import bisect
 
+import logging
 import threading
 import numpy as np
 
-from six.moves import queue
-from google.cloud import speech
+from collections import deque
+
+from . import metrics
+from .buffers import AudioRingBuffer
+from .recognizers import GoogleRecognizer
+from .resample import StreamingResampler, output_sample_rate
+from .stats import OnlineSpeechStats
+from .utils import float_to_int16, set_duration_secs
+from .vad import VoiceActivityGate
+
+
+logger = logging.getLogger(__name__)
 
 
 def get_current_time():
@@ -15,70 +27,434 @@ def duration_to_secs(duration):
     return duration.seconds + (duration.nanos / float(1e9))
 
 
+class RecognizerStream(threading.Thread):
+    """A single stream opened with the recognizer. The audio it is sent is
+    buffered here, and every response it returns is handed to its
+    AudioStream.
+
+    Parameters
+    ----------
+    audio_stream : AudioStream
+        Where the responses are sent.
+
+    index : int
+        Streams are numbered in the order they are opened.
+
+    start_sample : int
+        Sample of the recording that the first audio sent to this stream
+        starts at. Word timestamps are relative to it.
+
+    **buffer_options
+        Passed on to the stream's AudioRingBuffer.
+    """
+    def __init__(self, audio_stream, index, start_sample, **buffer_options):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.audio_stream = audio_stream
+        self.index = index
+        self.start_sample = start_sample
+        self.start_secs = start_sample / float(audio_stream.sample_rate)
+
+        self.buffer = AudioRingBuffer(**buffer_options)
+        self.closed = False
+        # set once the recognizer will not return anything else.
+        self.done = False
+        self.num_samples = 0
+        self.bytes_sent = 0
+        # end of the last word the recognizer has finalized (stream time).
+        self.finalized_secs = 0.
+        # final results that are waiting to be committed, in order.
+        self.pending = []
+        # when the audio sent to this stream arrived, as the sample each
+        # chunk ends at and the time (`time.perf_counter`) it came in.
+        self._chunk_ends = []
+        self._arrival_times = []
+
+    @property
+    def duration_ms(self):
+        """Length of the audio sent to this stream (in milliseconds)."""
+        return 1000. * self.num_samples / self.audio_stream.sample_rate
+
+    @property
+    def bytes_in_flight(self):
+        """Audio sent to the recognizer that it has not finalized yet."""
+        finalized_bytes = int(self.finalized_secs * self.audio_stream.sample_rate) * 2
+        return max(self.bytes_sent - finalized_bytes, 0)
+
+    def add_chunk(self, chunk, arrival_time=None):
+        """Adds a chunk of 16 bit audio (bytes) to this stream's buffer.
+
+        Parameters
+        ----------
+        chunk : bytes
+        arrival_time : float (optional, default=None)
+            When the audio came in (from `time.perf_counter`). Defaults to
+            now.
+
+        Returns
+        -------
+        accepted : bool
+            False if the buffer was full and the chunk was dropped.
+        """
+        if arrival_time is None:
+            arrival_time = time.perf_counter()
+        accepted = self.buffer.put(chunk)
+        if accepted:
+            self.num_samples += len(chunk) // 2
+            self._chunk_ends.append(self.num_samples)
+            self._arrival_times.append(arrival_time)
+        return accepted
+
+    def _input_samples(self, secs):
+        """How much of the audio given to this stream (in samples) comes
+        before `secs` into the audio it sent, counting the audio its buffer
+        dropped."""
+        samples = secs * self.audio_stream.sample_rate
+        sent = int(samples)
+        return self.buffer.input_position(2 * sent) // 2 + samples - sent
+
+    def to_recording_secs(self, secs):
+        """Maps a timestamp from the recognizer (`secs` into the audio this
+        stream sent) onto the audio given to the AudioStream."""
+        return (self.start_sample + self._input_samples(secs)) / \
+            float(self.audio_stream.sample_rate)
+
+    def arrival_time(self, secs):
+        """When the audio at `secs` into this stream arrived (from
+        `time.perf_counter`), or None if nothing has been sent yet."""
+        if not self._arrival_times:
+            return None
+        ix = bisect.bisect_left(self._chunk_ends, secs * self.audio_stream.sample_rate)
+        return self._arrival_times[min(ix, len(self._arrival_times) - 1)]
+
+    def close(self):
+        """Stops sending audio once the buffer is empty, which lets the
+        recognizer finalize whatever it has heard."""
+        self.closed = True
+
+    def is_finished(self):
+        return self.closed and self.buffer.empty()
+
+    def run(self):
+        try:
+            responses = self.audio_stream.recognizer.streaming_recognize(
+                self.generator(), start_secs=self.start_secs
+            )
+            self.audio_stream.analyze_responses(self, responses)
+        except Exception as e:
+            # like Google ending a stream that has not been sent audio for a
+            # while. The next audio opens a new stream.
+            metrics.recognizer_stream_errors_total.inc(error=type(e).__name__)
+            logger.warning('recognizer stream %d failed: %s', self.index, e)
+        finally:
+            self.closed = True
+            self.done = True
+            self.audio_stream.stream_finished(self)
+
+    def generator(self):
+        """Generator which yields chunks of audio."""
+        while not self.is_finished():
+            # block for a short time, so that closing the stream is noticed
+            # quickly even if no audio is coming in. Each request holds at
+            # most the buffer's `max_request_bytes` of audio.
+            data = self.buffer.get(timeout=0.1)
+            if data is None:
+                continue
+            self.bytes_sent += len(data)
+            yield data
+
+
 class AudioStream(threading.Thread):
     """Stream for passing audio data to GCS.
 
+    A recognizer stream can only be kept open for a limited time, so they are
+    rotated: `overlap_ms` before the current stream reaches `stream_limit_ms`,
+    the next one is opened, and both are sent the same audio until the old one
+    is closed at the limit. Final results are rebased onto the recording's
+    timeline and committed in stream order. Words from the new stream that
+    were already committed from the old one are dropped.
+
     Parameters
     ----------
     sample_rate : int
         Sample rate of audio signal (in Hz).
 
+    language_code : string (optional, default='en-US')
+
     stream_limit_ms : int (optional, default=50000)
-        Limit on how long the stream can be kept open (in milliseconds). Note
-        that GCS will not process streams longer than 60 seconds in length.
+        Limit on how long the stream can be kept open (in milliseconds of
+        audio). Note that GCS will not process streams longer than 60 seconds
+        in length.
+
+    recognizer : object (optional, default=None)
+        The speech recognition backend (see streaming/recognizers.py). Uses a
+        GoogleRecognizer if None.
+
+    overlap_ms : int (optional, default=3000)
+        How much audio is sent to both the old and the new stream when they
+        are rotated (in milliseconds). If the recognizer ends a stream on its
+        own, this much of the most recent audio is sent to the next stream
+        again.
+
+    max_buffer_bytes : int (optional, default=1048576)
+        Most audio each stream can have waiting to be sent (in bytes). If the
+        streams together hold more than this, the backlog of streams that
+        are being closed is dropped first.
+
+    max_request_bytes : int (optional, default=65536)
+        Most audio sent to the recognizer in a single request (in bytes).
+
+    overflow : string (optional, default='drop-oldest')
+        What to do with audio that does not fit in a stream's buffer; one of
+        'block', 'drop-oldest' or 'coalesce' (see AudioRingBuffer). Dropped
+        audio is not sent to the recognizer, but the timestamps of later words
+        are still placed correctly in the recording.
+
+    resample_hz : int (optional, default=None)
+        If given (and lower than `sample_rate`), the audio is resampled to
+        this rate before it is sent to the recognizer. `self.sample_rate` is
+        then the resampled rate, and `self.input_sample_rate` the original.
+
+    vad_options : dict (optional, default=None)
+        If given, sustained silence is held back from the recognizer by a
+        VoiceActivityGate made with these options, and word timestamps are
+        mapped back onto the recording. The speech and pause segments it
+        finds are returned by `speech_timeline`.
     """
-    def __init__(self, sample_rate, language_code='en-US', stream_limit_ms=50000):
+    def __init__(self, sample_rate, language_code='en-US', stream_limit_ms=50000,
+                 recognizer=None, overlap_ms=3000, max_buffer_bytes=1024 ** 2,
+                 max_request_bytes=65536, overflow='drop-oldest',
+                 resample_hz=None, vad_options=None):
         threading.Thread.__init__(self)
-        self.sample_rate = sample_rate
+        self.input_sample_rate = sample_rate
+        self.sample_rate = output_sample_rate(sample_rate, resample_hz)
+        self.resampler = None
+        if self.sample_rate != self.input_sample_rate:
+            self.resampler = StreamingResampler(sample_rate, self.sample_rate)
+        self.vad = None
+        if vad_options is not None:
+            self.vad = VoiceActivityGate(self.sample_rate, **vad_options)
         self.stream_limit_ms = stream_limit_ms
+        self.overlap_ms = overlap_ms
         self.language_code = language_code
-        self.waiting_for_responses = False
 
-        self.buffer = queue.Queue()
-        self.closed = True
+        self._closed = True
         self.start_time = get_current_time()
         self.transcript = ''
-        self.num_requests = 1
+        self.interim_transcript = ''
+        self.num_requests = 0
+        self.num_samples = 0
         self.responses = []
+        self.stats = OnlineSpeechStats()
+        # when the audio behind the current `self.transcript` arrived (from
+        # `time.perf_counter`).
+        self.transcript_arrival_time = None
 
-        self.client = speech.SpeechClient()
-        self.config = speech.types.RecognitionConfig(
-            encoding=speech.enums.RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz=sample_rate,
-            language_code=language_code,
-            max_alternatives=1,
-            enable_word_time_offsets=True,
-            enable_automatic_punctuation=True
-        )
-        self.streaming_config = speech.types.StreamingRecognitionConfig(
-            config=self.config,
-            interim_results=True
-        )
+        if recognizer is None:
+            recognizer = GoogleRecognizer(
+                self.sample_rate, language_code=language_code
+            )
+        self.recognizer = recognizer
+
+        self.buffer_options = {
+            'max_bytes': max_buffer_bytes,
+            'max_request_bytes': max_request_bytes,
+            'overflow': overflow
+        }
+        self.streams = []
+        self._lock = threading.RLock()
+        # (start sample, chunk, arrival time) of the most recent audio, for
+        # the overlap.
+        self._history = deque()
+        # streams before this one have had all their results committed.
+        self._commit_ix = 0
+        self._committed_until_secs = 0.
+        # words of the current stream that end before this were already
+        # committed from the previous stream.
+        self._seam_secs = None
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @closed.setter
+    def closed(self, closed):
+        with self._lock:
+            self._closed = closed
+            if closed:
+                for stream in self.streams:
+                    stream.close()
+
+    @property
+    def waiting_for_responses(self):
+        """True while any recognizer stream can still return responses."""
+        with self._lock:
+            return any(stream.is_alive() for stream in self.streams)
 
     def run(self):
         """Run thread."""
         self.streaming_audio_loop()
 
     def streaming_audio_loop(self):
-        """Start streaming audio to GCS."""
-        while not self.is_finished():
-            print('running audiostream')
-            self.waiting_for_responses = True
-            gen = self.generator()
-            responses = self.client.streaming_recognize(
-                self.streaming_config,
-                (speech.types.StreamingRecognizeRequest(audio_content=content) for content in gen)
-                )
+        """Start streaming audio to GCS. If the recognizer ends a stream on
+        its own, the next one is opened by `add_chunk` once there is audio
+        to send to it."""
+        with self._lock:
+            # audio may have come in before the thread was started.
+            self._open_stream(resend_recent_audio=True, reason='start')
 
-            self.analyze_responses(responses)
+    def _open_stream(self, resend_recent_audio=False, reason='rotation'):
+        """Opens the next recognizer stream. Must hold `self._lock`.
 
-    def analyze_responses(self, resp):
-        """Checks streaming responses and appends is_final responses to
-        `self.responses`. Also updates `self.transcript` with the most current
-        transcript.
+        Parameters
+        ----------
+        resend_recent_audio : bool (optional, default=False)
+            Whether the last `overlap_ms` of audio should be sent to the new
+            stream first, for when the previous stream ended without overlap.
+            Only the audio after the last word the previous stream finalized
+            is sent again.
+
+        reason : string (optional, default='rotation')
+            Why the stream is opened ('start', 'rotation' or 'restart'), for
+            the `talk_recognizer_streams_total` metric.
+        """
+        history = []
+        if resend_recent_audio:
+            resend_from = 0
+            if self.streams:
+                previous = self.streams[-1]
+                resend_from = previous.start_sample + \
+                    int(previous._input_samples(previous.finalized_secs))
+            history = [
+                h for h in self._history if h[0] + len(h[1]) // 2 > resend_from
+            ]
+        start_sample = history[0][0] if history else self.num_samples
+        stream = RecognizerStream(
+            self, len(self.streams), start_sample, **self.buffer_options
+        )
+        for _, chunk, arrival_time in history:
+            stream.add_chunk(chunk, arrival_time)
+        self.streams.append(stream)
+        self.num_requests += 1
+        metrics.recognizer_streams_total.inc(reason=reason)
+        logger.info('opening recognizer stream %d (%s)', stream.index, reason)
+        stream.start()
+        return stream
+
+    def add_chunk(self, chunk):
+        """Adds a chunk of audio to the stream's buffer.
+
+        Parameters
+        ----------
+        chunk : np.array of np.int16 or list of float
+            This is raw audio signal (at `self.input_sample_rate`). If it is
+            not already 16 bit PCM, each value must be between -1 and 1.
+        """
+        arrival_time = time.perf_counter()
+        if not (isinstance(chunk, np.ndarray) and chunk.dtype == np.int16):
+            chunk = float_to_int16(chunk)
+        if self.resampler is not None:
+            chunk = self.resampler.process(chunk)
+        if self.vad is not None:
+            chunk = self.vad.process(chunk)
+        if chunk.size == 0:
+            return
+        data = chunk.tobytes()
+
+        with self._lock:
+            if self.streams and self.streams[-1].done and not self.closed:
+                # the recognizer ended the stream on its own (like Google
+                # does after a while without audio).
+                self._open_stream(resend_recent_audio=True, reason='restart')
+            self._history.append((self.num_samples, data, arrival_time))
+            self.num_samples += chunk.size
+            overlap_samples = self.overlap_ms * self.sample_rate // 1000
+            while self._history and \
+                  self._history[0][0] + len(self._history[0][1]) // 2 <= \
+                  self.num_samples - overlap_samples:
+                self._history.popleft()
+
+            open_streams = [s for s in self.streams if not s.closed]
+
+        # outside of the lock, so a blocking buffer does not hold up the
+        # responses coming back from the recognizer.
+        for stream in open_streams:
+            stream.add_chunk(data, arrival_time)
+
+        with self._lock:
+            if self.streams and not self.closed:
+                self._rotate_streams()
+            self._limit_closed_backlog()
+
+    def _limit_closed_backlog(self):
+        """Drops the audio still waiting for streams that have been closed
+        (oldest first) while all the streams together hold more than
+        `max_buffer_bytes`. Must hold `self._lock`."""
+        waiting = [s for s in self.streams if not s.done]
+        total = sum(s.buffer.nbytes for s in waiting)
+        for stream in waiting:
+            if total <= self.buffer_options['max_bytes']:
+                break
+            if stream.closed:
+                total -= stream.buffer.clear()
+
+    def buffer_metrics(self):
+        """Backlog of audio waiting on (or in) the recognizer.
+
+        Returns
+        -------
+        metrics : dict
+            'queue_depth', 'queued_bytes' and 'bytes_in_flight' are totals
+            over the open streams; 'max_queued_bytes', 'overflows' and
+            'dropped_bytes' are over every stream so far.
+        """
+        with self._lock:
+            streams = list(self.streams)
+        totals = {
+            'queue_depth': 0, 'queued_bytes': 0, 'bytes_in_flight': 0,
+            'max_queued_bytes': 0, 'overflows': 0, 'dropped_bytes': 0
+        }
+        for stream in streams:
+            metrics = stream.buffer.metrics()
+            if not stream.done:
+                totals['queue_depth'] += metrics['queue_depth']
+                totals['queued_bytes'] += metrics['queued_bytes']
+                totals['bytes_in_flight'] += stream.bytes_in_flight
+            totals['max_queued_bytes'] = max(
+                totals['max_queued_bytes'], metrics['max_queued_bytes']
+            )
+            totals['overflows'] += metrics['overflows']
+            totals['dropped_bytes'] += metrics['dropped_bytes']
+        return totals
+
+    def _rotate_streams(self):
+        """Opens the next stream once the newest one is `overlap_ms` from its
+        time limit, and closes the older streams that have reached it. Must
+        hold `self._lock`."""
+        newest = self.streams[-1]
+        for stream in self.streams[:-1]:
+            if not stream.closed and stream.duration_ms >= self.stream_limit_ms:
+                stream.close()
+
+        open_streams = [s for s in self.streams if not s.closed]
+        if open_streams == [newest] and \
+           newest.duration_ms >= self.stream_limit_ms - self.overlap_ms:
+            self._open_stream()
+
+    def analyze_responses(self, stream, resp):
+        """Checks streaming responses from one of the recognizer streams, and
+        commits its `is_final` results to `self.responses`. Also updates
+        `self.transcript` with the most current transcript, and
+        `self.interim_transcript` with the transcript of the result that is
+        not yet final (if any). Each committed result is also added to the
+        running pause statistics and word counts in `self.stats`.
+
+        The time from the audio arriving to the recognizer finalizing the
+        words in it is observed in `talk_recognizer_round_trip_seconds`.
 
         Parameters
         ----------
+        stream : RecognizerStream
         resp : list of StreamingRecognizeResponse
         """
         responses = (r for r in resp if r is not None)
@@ -88,83 +464,140 @@ class AudioStream(threading.Thread):
             result = response.results[0]
             if not result.alternatives:
                 continue
-            # only append a result if it has an `is_final` flag.
-            if result.is_final:
-                self.responses.append(result)
 
-            self.transcript = result.alternatives[0].transcript
-        self.waiting_for_responses = False
+            received_time = time.perf_counter()
+            with self._lock:
+                if result.is_final:
+                    metrics.recognizer_responses_total.inc(kind='final')
+                    stream.finalized_secs = max(
+                        stream.finalized_secs, _last_word_end_secs(result)
+                    )
+                    arrival_time = stream.arrival_time(stream.finalized_secs)
+                    if arrival_time is not None:
+                        metrics.recognizer_round_trip_seconds.observe(
+                            received_time - arrival_time
+                        )
+                    stream.pending.append(self._rebase(result, stream))
+                    self._commit()
+                    self.interim_transcript = ''
+                else:
+                    metrics.recognizer_responses_total.inc(kind='interim')
+                    # interim results have no timestamps; they cover at most
+                    # the audio sent so far.
+                    arrival_time = stream.arrival_time(
+                        stream.bytes_sent / 2. / self.sample_rate
+                    )
+                    if stream is self.streams[-1]:
+                        self.interim_transcript = result.alternatives[0].transcript
+                self.transcript = result.alternatives[0].transcript
+                self.transcript_arrival_time = arrival_time
 
-    def add_chunk(self, chunk):
-        """Adds a chunk of audio to the stream's buffer.
+    def stream_finished(self, stream):
+        """Called by a RecognizerStream once it will not return anything else."""
+        with self._lock:
+            self._commit()
 
-        Parameters
-        ----------
-        chunk : list of float
-            This is raw audio signal. Note that each value in the list must be
-            between 0 and 1.
-        """
-        # convert from float to int16
-        scaled_chunk = (np.asarray(chunk).astype(np.float32) * 0x7FFF).astype(np.int16)
-        self.buffer.put(scaled_chunk.tobytes())
+    def _rebase(self, result, stream):
+        """Copies a result, moving its word timestamps from the stream's
+        timeline onto the recording's. Audio the stream's buffer dropped is
+        counted, so words after it are not early."""
+        rebased = type(result)()
+        rebased.CopyFrom(result)
+        for word in rebased.alternatives[0].words:
+            for duration in [word.start_time, word.end_time]:
+                secs = stream.to_recording_secs(duration_to_secs(duration))
+                if self.vad is not None:
+                    secs = self.vad.to_recording_secs(secs)
+                set_duration_secs(duration, secs)
+        return rebased
 
-    def is_finished(self):
-        """Checks whether both the stream is closed and the chunk buffer is empty.
+    def speech_timeline(self):
+        """Where the voice activity gate found speech and pauses in the audio.
 
         Returns
         -------
-        is_finished : bool
+        timeline : dict or None
+            'speech' and 'pauses' are lists of [start_secs, end_secs] in the
+            recording. None if silence is not being gated.
         """
-        return self.closed and self.buffer.empty()
+        if self.vad is None:
+            return None
+        with self._lock:
+            return {'speech': [list(s) for s in self.vad.segments],
+                    'pauses': self.vad.pauses()}
 
-    def send_silence(self, seconds=1, num_chunks=5):
-        """This function simply yields a specified number of seconds of silence,
-        with a time delay.
+    def _commit(self):
+        """Commits the pending results of each stream in order; results of a
+        stream are held back until every stream before it has finished. Must
+        hold `self._lock`."""
+        while self._commit_ix < len(self.streams):
+            stream = self.streams[self._commit_ix]
+            for result in stream.pending:
+                result = self._drop_committed_words(result)
+                if result is not None:
+                    # a stream's first result has no leading space.
+                    transcript = result.alternatives[0].transcript
+                    if self.responses and not transcript.startswith(' '):
+                        result.alternatives[0].transcript = ' ' + transcript
+                    self.stats.add_result(result)
+                    self.responses.append(result)
+                    self._committed_until_secs = max(
+                        self._committed_until_secs, _last_word_end_secs(result)
+                    )
+            stream.pending = []
 
-        Parameters
-        ----------
-        seconds : int (optional, default=1)
-        num_chunks : int (optional, default=5)
+            if not stream.done:
+                break
+            self._commit_ix += 1
+            self._seam_secs = self._committed_until_secs
+
+    def _drop_committed_words(self, result):
+        """Drops the words at the start of a result that were already
+        committed from the previous stream (where the two overlap).
+
+        Returns
+        -------
+        result : StreamingRecognitionResult or None
+            None if every word of the result was already committed.
         """
-        for i in range(num_chunks):
-            yield np.zeros(int(self.sample_rate/num_chunks)).astype(np.int16).tobytes()
-            time.sleep(seconds/num_chunks)
+        seam_secs = self._seam_secs
+        words = result.alternatives[0].words
+        if seam_secs is None or not words:
+            return result
 
-    def generator(self):
-        """Generator which yields chunks of audio."""
-        while not self.is_finished():
-            if get_current_time() - self.start_time > self.stream_limit_ms:
-                # spit out a second's worth of 'silence' to make sure we
-                #       get an is_final flag.
-                for silent_chunk in self.send_silence():
-                    yield silent_chunk
-                print('max time exceeded, starting a new request.')
-                self.num_requests += 1
-                self.start_time = get_current_time()
+        num_dropped = 0
+        for word in words:
+            mean_secs = (duration_to_secs(word.start_time) +
+                         duration_to_secs(word.end_time)) / 2
+            if mean_secs > seam_secs:
                 break
+            num_dropped += 1
+
+        if num_dropped == 0:
+            return result
+        if num_dropped == len(words):
+            return None
+
+        alternative = result.alternatives[0]
+        del alternative.words[:num_dropped]
+        prefix = ' ' if alternative.transcript.startswith(' ') else ''
+        alternative.transcript = prefix + ' '.join(w.word for w in alternative.words)
+        return result
+
+    def is_finished(self):
+        """Checks whether both the stream is closed and the chunk buffers are
+        empty.
+
+        Returns
+        -------
+        is_finished : bool
+        """
+        with self._lock:
+            return self.closed and all(s.buffer.empty() for s in self.streams)
+
 
-            # this uses a blocking operation to make sure that we are
-            # actually pulling something from the stream.. set the timeout to
-            # 300 ms, so when the user hits the stop button, this loop
-            # doesn't get stuck (which will trigger a timeout error on GCS).
-            try:
-                chunk = self.buffer.get(block=True, timeout=0.3)
-            except queue.Empty:
-                # send 'silence' to GCS for a second, then return;
-                # this essentially makes sure that an is_final flag will be
-                # returned.
-                for silent_chunk in self.send_silence():
-                    yield silent_chunk
-                return
-
-            data = [chunk]
-
-            # then collect any chunks that are left in the buffer.
-            while True:
-                try:
-                    chunk = self.buffer.get(block=False)
-                    data.append(chunk)
-                except queue.Empty:
-                    break
-
-            yield b''.join(data)
\ No newline at end of file
+def _last_word_end_secs(result):
+    words = result.alternatives[0].words
+    if not words:
+        return 0.
+    return duration_to_secs(words[-1].end_time)
@@ -0,0 +1,324 @@
+# ted.py
+#
+# Reference index of TED talks, used to find the talks most similar to a
+# user's speech. Build it (from `app/`) from a CSV of TED transcripts with:
+#
+#     python -m streaming.ted <transcripts.csv> <ted-index.npz> [--talks <ted_main.csv>]
+#
+# The transcripts CSV needs a `transcript` column. The name and duration (in
+# seconds) of each talk are read from its `name` and `duration` columns, or
+# from the talks CSV (joined on `url`) if it does not have them, as with the
+# Kaggle "TED Talks" dataset.
+#
+# No index is shipped with the app. Until one is built at `TED_INDEX_FILENAME`
+# (see config.py), the similar talks are simply not shown.
+
+import sys
+import csv
+import time
+import argparse
+from collections import Counter
+
+import numpy as np
+from sklearn.neighbors import BallTree
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+from sklearn.decomposition import LatentDirichletAllocation
+
+from .speech import TedSpeech
+from .stats import TOKEN_PATTERN
+
+
+TED_INDEX_VERSION = 2
+
+# number of words in each window the type-token ratio is found over.
+TTR_WINDOW = 100
+
+# a TED transcript has no word timings, so the only thing about the delivery
+# of a talk that can be compared is its overall pace (how the pace changes
+# over the talk, and where the speaker pauses, are not known).
+FEATURE_GROUPS = [
+    ('pace', ['words-per-min']),
+    ('vocabulary', ['type-token-ratio', 'mean-word-length',
+                    'stop-word-fraction', 'hapax-fraction']),
+]
+
+
+def feature_names(num_topics):
+    """Name of each column of the feature matrix."""
+    names = [name for _, names in FEATURE_GROUPS for name in names]
+    return names + ['topic-{}'.format(i) for i in range(num_topics)]
+
+
+def talk_features(speech, vocabulary, topic_words):
+    """Finds the features of a talk: its words per minute, statistics of
+    its vocabulary, and how much it is about each topic.
+
+    Parameters
+    ----------
+    speech : GoogleSpeech or TedSpeech
+
+    vocabulary : dict
+        Maps each word of the topic model to its column in `topic_words`.
+
+    topic_words : np.array of shape (N_topics, N_words)
+        How likely each word is in each topic.
+
+    Returns
+    -------
+    features : np.array of float
+    """
+    tokens = TOKEN_PATTERN.findall(speech.transcript_as_string().lower())
+
+    pace = np.zeros(1)
+    if len(speech.transcript_as_list()) > 1:
+        # a speech whose words all have the same timestamp has no pace.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            words_per_min = speech.words_per_min()
+        if np.isfinite(words_per_min):
+            pace[0] = words_per_min
+
+    vocab_stats = np.zeros(4)
+    if tokens:
+        windows = [tokens[i:i + TTR_WINDOW]
+                   for i in range(0, max(len(tokens) - TTR_WINDOW, 0) + 1, TTR_WINDOW)]
+        counts = Counter(tokens)
+        vocab_stats[:] = [
+            np.mean([len(set(w)) / float(len(w)) for w in windows]),
+            np.mean([len(t) for t in tokens]),
+            sum(c for t, c in counts.items() if t in ENGLISH_STOP_WORDS) / float(len(tokens)),
+            sum(1 for c in counts.values() if c == 1) / float(len(counts))
+        ]
+
+    # how much the talk is about each topic.
+    ixs = [vocabulary[t] for t in tokens if t in vocabulary]
+    word_counts = np.bincount(ixs, minlength=topic_words.shape[1]).astype(np.float64)
+    topics = topic_words.dot(word_counts)
+    if topics.sum() > 0:
+        topics /= topics.sum()
+
+    return np.concatenate([pace, vocab_stats, topics])
+
+
+def fit_topic_words(transcripts, num_topics=10, max_vocabulary=5000):
+    """Fits an LDA to a corpus of transcripts.
+
+    Returns
+    -------
+    vocabulary : np.array of string
+    topic_words : np.array of shape (N_topics, N_words)
+        How likely each word is in each topic (each row sums to 1).
+    """
+    vectorizer = CountVectorizer(
+        lowercase=True, stop_words='english', max_features=max_vocabulary
+    )
+    doc_term = vectorizer.fit_transform(transcripts)
+    lda_model = LatentDirichletAllocation(
+        n_components=num_topics, max_iter=10, learning_method='online',
+        random_state=0
+    )
+    lda_model.fit(doc_term)
+    vocab = vectorizer.vocabulary_
+    vocabulary = np.asarray(sorted(vocab, key=vocab.get))
+    topic_words = lda_model.components_ / lda_model.components_.sum(axis=1)[:, None]
+    return vocabulary, topic_words
+
+
+class TedIndex(object):
+    """Nearest-neighbour index of TED talks, by the features of `talk_features`.
+
+    The features are standardized, and each group of them (pace, vocabulary
+    and topics) is weighted so that it counts as much as the others, no
+    matter how many features it has. The talks are then kept in a BallTree.
+
+    Parameters
+    ----------
+    names : np.array of string
+    durations_min : np.array of float
+    features : np.array of shape (N_talks, N_features)
+    vocabulary : np.array of string
+        The words of the topic model.
+    topic_words : np.array of shape (N_topics, N_words)
+    """
+    def __init__(self, names, durations_min, features, vocabulary, topic_words):
+        self.names = np.asarray(names)
+        self.durations_min = np.asarray(durations_min, dtype=np.float64)
+        self.features = np.asarray(features, dtype=np.float64)
+        self.vocabulary = np.asarray(vocabulary)
+        self.topic_words = np.asarray(topic_words, dtype=np.float64)
+        self.feature_names = feature_names(self.topic_words.shape[0])
+        self._vocabulary_ix = dict(
+            (word, ix) for ix, word in enumerate(self.vocabulary.tolist())
+        )
+
+        self.mean = self.features.mean(axis=0)
+        std = self.features.std(axis=0)
+        # features that are the same for every talk cannot tell them apart.
+        std[std == 0] = 1.
+        group_sizes = [len(names) for _, names in FEATURE_GROUPS]
+        group_sizes.append(self.topic_words.shape[0])
+        weights = np.concatenate([np.full(n, 1. / np.sqrt(n)) for n in group_sizes])
+        self.scale = weights / std
+
+        self.tree = BallTree(self._transform(self.features))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _transform(self, features):
+        return (np.atleast_2d(features) - self.mean) * self.scale
+
+    @classmethod
+    def build(cls, ted_speeches, num_topics=10, max_vocabulary=5000):
+        """Builds the index from a corpus of talks.
+
+        Parameters
+        ----------
+        ted_speeches : list of TedSpeech
+        num_topics : int (optional, default=10)
+        max_vocabulary : int (optional, default=5000)
+
+        Returns
+        -------
+        index : TedIndex
+        """
+        vocabulary, topic_words = fit_topic_words(
+            [ts.transcript_as_string() for ts in ted_speeches],
+            num_topics=num_topics, max_vocabulary=max_vocabulary
+        )
+        vocabulary_ix = dict((word, ix) for ix, word in enumerate(vocabulary.tolist()))
+        features = np.array([
+            talk_features(ts, vocabulary_ix, topic_words) for ts in ted_speeches
+        ])
+        return cls(
+            [ts.name or '' for ts in ted_speeches],
+            [ts.duration_min for ts in ted_speeches],
+            features, vocabulary, topic_words
+        )
+
+    def save(self, filename):
+        np.savez_compressed(
+            filename, version=TED_INDEX_VERSION, names=self.names,
+            durations_min=self.durations_min, features=self.features,
+            vocabulary=self.vocabulary, topic_words=self.topic_words
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """Reads an index written by `save`.
+
+        Raises
+        ------
+        ValueError
+            If the index was built by an incompatible version of this module.
+        """
+        with np.load(filename, allow_pickle=False) as data:
+            version = int(data['version'])
+            if version != TED_INDEX_VERSION:
+                raise ValueError(
+                    '{} has TED index version {}, expected {}. Rebuild it with '
+                    '`python -m streaming.ted`.'.format(
+                        filename, version, TED_INDEX_VERSION)
+                )
+            return cls(
+                data['names'], data['durations_min'], data['features'],
+                data['vocabulary'], data['topic_words']
+            )
+
+    def speech_features(self, speech):
+        """The features of a GoogleSpeech (or TedSpeech) for this index."""
+        return talk_features(speech, self._vocabulary_ix, self.topic_words)
+
+    def query_features(self, features, k=5):
+        """Finds the talks closest to a talk's features.
+
+        Returns
+        -------
+        distances : np.array of float
+        ixs : np.array of int
+            Index of each talk, closest first.
+        """
+        k = min(k, len(self))
+        distances, ixs = self.tree.query(self._transform(features), k=k)
+        return distances[0], ixs[0]
+
+    def most_similar(self, speech, k=5):
+        """Finds the TED talks most similar to a speech.
+
+        Parameters
+        ----------
+        speech : GoogleSpeech
+        k : int (optional, default=5)
+
+        Returns
+        -------
+        list of dict
+            Each item is like {'name': <name>, 'distance': <distance>,
+            'duration-min': <minutes>, 'words-per-min': <wpm>}, closest first.
+        """
+        distances, ixs = self.query_features(self.speech_features(speech), k=k)
+        wpm_column = self.feature_names.index('words-per-min')
+        return [
+            {'name': str(self.names[ix]), 'distance': float(distance),
+             'duration-min': float(self.durations_min[ix]),
+             'words-per-min': float(self.features[ix, wpm_column])}
+            for distance, ix in zip(distances, ixs)
+        ]
+
+
+def read_ted_csv(transcripts_filename, talks_filename=None):
+    """Reads TED talks from CSV files (see the top of this file).
+
+    Returns
+    -------
+    ted_speeches : list of TedSpeech
+    """
+    csv.field_size_limit(sys.maxsize)
+    talks = {}
+    if talks_filename is not None:
+        with open(talks_filename, newline='', encoding='utf-8') as f:
+            talks = dict((row['url'].strip(), row) for row in csv.DictReader(f))
+
+    ted_speeches = []
+    with open(transcripts_filename, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if 'duration' not in row:
+                talk = talks.get(row.get('url', '').strip())
+                if talk is None:
+                    continue
+                row = dict(talk, **row)
+            duration_min = float(row['duration']) / 60
+            if duration_min <= 0 or not row['transcript'].strip():
+                continue
+            ted_speeches.append(TedSpeech(
+                row['transcript'], duration_min,
+                name=row.get('name') or row.get('url')
+            ))
+    return ted_speeches
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m streaming.ted',
+        description='Builds the TED reference index from TED transcripts.'
+    )
+    parser.add_argument('transcripts', help='CSV file of TED transcripts')
+    parser.add_argument('output', help='where to write the index (.npz)')
+    parser.add_argument('--talks', default=None,
+                        help='CSV file with the name and duration of each talk')
+    parser.add_argument('--num-topics', type=int, default=10)
+    args = parser.parse_args(argv[1:])
+
+    ted_speeches = read_ted_csv(args.transcripts, args.talks)
+    if not ted_speeches:
+        print('no talks with a transcript and duration were found.')
+        return 1
+    start = time.time()
+    index = TedIndex.build(ted_speeches, num_topics=args.num_topics)
+    index.save(args.output)
+    print('indexed {} talks in {:.1f} sec, wrote {}'.format(
+        len(index), time.time() - start, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
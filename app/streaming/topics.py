@@ -0,0 +1,180 @@
+# topics.py
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from sklearn.decomposition import LatentDirichletAllocation
+
+
+# the same speech and number of topics always gives the same model, whether
+# it was cached, prefetched or fit on demand.
+LDA_RANDOM_STATE = 0
+
+def fit_topic_model(doc_term, n_topics):
+    """Fits an LDA to a document-term matrix.
+
+    Parameters
+    ----------
+    doc_term : scipy.sparse matrix of shape (N_documents, N_words)
+    n_topics : int
+
+    Returns
+    -------
+    lda_model : LatentDirichletAllocation
+    lda_Z : np.array of shape (N_documents, n_topics)
+    """
+    lda_model = LatentDirichletAllocation(
+        n_components=n_topics, max_iter=10, learning_method='online',
+        random_state=LDA_RANDOM_STATE
+    )
+    lda_Z = lda_model.fit_transform(doc_term)
+    return lda_model, lda_Z
+
+
+def model_nbytes(model):
+    """Approximate number of bytes held by a fitted (lda_model, lda_Z) pair."""
+    lda_model, lda_Z = model
+    num_bytes = lda_model.components_.nbytes + lda_Z.nbytes
+    # the fitted model also keeps the exponentiated components.
+    if hasattr(lda_model, 'exp_dirichlet_component_'):
+        num_bytes += lda_model.exp_dirichlet_component_.nbytes
+    return num_bytes
+
+
+class TopicModelCache(object):
+    """Least recently used cache of fitted LDA models, keyed by
+    (speech key, number of topics).
+
+    Models can also be fit ahead of time on a background thread with
+    `prefetch`, so moving the topics slider usually only needs a lookup.
+
+    Parameters
+    ----------
+    max_size : int (optional, default=64)
+        Maximum number of fitted models to keep.
+
+    max_workers : int (optional, default=1)
+        Number of background threads used by `prefetch`.
+    """
+    def __init__(self, max_size=64, max_workers=1):
+        self.max_size = max_size
+        self.max_workers = max_workers
+        self._models = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        return key in self._models
+
+    def get(self, speech_key, n_topics, doc_term):
+        """Returns the model for this speech and number of topics, fitting it
+        if it is neither cached nor being fit in the background.
+
+        Parameters
+        ----------
+        speech_key : string
+        n_topics : int
+        doc_term : scipy.sparse matrix of shape (N_documents, N_words)
+
+        Returns
+        -------
+        lda_model : LatentDirichletAllocation
+        lda_Z : np.array of shape (N_documents, n_topics)
+        """
+        key = (speech_key, n_topics)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            future = self._pending.get(key)
+
+        if future is not None:
+            return future.result()
+
+        model = fit_topic_model(doc_term, n_topics)
+        self.put(speech_key, n_topics, model)
+        return model
+
+    def get_async(self, speech_key, n_topics, doc_term):
+        """Like `get`, but never waits for a fit: the model is fit in the
+        background if it is neither cached nor being fit already.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Resolves to (lda_model, lda_Z). It is already done if the model
+            was cached.
+        """
+        key = (speech_key, n_topics)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                future = Future()
+                future.set_result(self._models[key])
+                return future
+            if key not in self._pending:
+                self._submit(speech_key, n_topics, doc_term)
+            return self._pending[key]
+
+    def put(self, speech_key, n_topics, model):
+        """Adds a fitted (lda_model, lda_Z) pair to the cache."""
+        key = (speech_key, n_topics)
+        with self._lock:
+            self._models[key] = model
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+
+    def prefetch(self, speech_key, topic_counts, doc_term):
+        """Fits models for each of `topic_counts` in the background, unless
+        they are already cached or being fit.
+
+        Parameters
+        ----------
+        speech_key : string
+        topic_counts : iterable of int
+        doc_term : scipy.sparse matrix of shape (N_documents, N_words)
+        """
+        with self._lock:
+            for n_topics in topic_counts:
+                key = (speech_key, n_topics)
+                if key in self._models or key in self._pending:
+                    continue
+                self._submit(speech_key, n_topics, doc_term)
+
+    def _submit(self, speech_key, n_topics, doc_term):
+        """Starts fitting a model in the background. Must hold `self._lock`."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers)
+        self._pending[(speech_key, n_topics)] = self._executor.submit(
+            self._fit_pending, speech_key, n_topics, doc_term
+        )
+
+    def _fit_pending(self, speech_key, n_topics, doc_term):
+        try:
+            model = fit_topic_model(doc_term, n_topics)
+            self.put(speech_key, n_topics, model)
+            return model
+        finally:
+            with self._lock:
+                self._pending.pop((speech_key, n_topics), None)
+
+    def models(self, speech_key):
+        """The cached (lda_model, lda_Z) pairs of a speech."""
+        with self._lock:
+            return [m for k, m in self._models.items() if k[0] == speech_key]
+
+    def discard(self, speech_key):
+        """Drops every cached model that belongs to a speech."""
+        with self._lock:
+            for key in [k for k in self._models if k[0] == speech_key]:
+                del self._models[key]
+
+
+# shared by every GoogleSpeech in this process.
+topic_models = TopicModelCache()
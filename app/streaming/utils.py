@@ -36,8 +36,75 @@ def format_transcript_data(google_speech):
     list of dict
         Each item is a single word in the transcript, like [{'word': <word>}]
     """
-    transcript = google_speech.transcript_as_list()
-    data = []
-    for word in transcript:
-        data.append({'word': word})
-    return data
\ No newline at end of file
+    return google_speech.analysis.transcript_payload()
+
+
+def float_to_int16(audio):
+    """Converts audio samples between -1 and 1 into 16 bit PCM.
+
+    Parameters
+    ----------
+    audio : array-like of float
+
+    Returns
+    -------
+    np.array of np.int16
+    """
+    scaled = np.clip(np.asarray(audio, dtype=np.float32), -1, 1) * 0x7FFF
+    return scaled.astype(np.int16)
+
+
+def decode_audio_chunk(audio, dtype='int16'):
+    """Turns a chunk of audio received over the socket into 16 bit PCM.
+
+    Binary chunks (raw little-endian Int16 or Float32 buffers) are wrapped
+    without copying where possible. A list of floats is still accepted for
+    clients that send their audio as JSON.
+
+    Parameters
+    ----------
+    audio : bytes or list of float
+        Raw audio signal. Floats must be between -1 and 1.
+
+    dtype : string (optional, default='int16')
+        Sample format of a binary chunk, either 'int16' or 'float32'. Ignored
+        if `audio` is a list.
+
+    Returns
+    -------
+    np.array of np.int16
+
+    Raises
+    ------
+    ValueError
+        If `dtype` is unknown, or a binary chunk is not a whole number of
+        samples.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        formats = {'int16': '<i2', 'float32': '<f4'}
+        if dtype not in formats:
+            raise ValueError('`dtype` must be either \'int16\' or \'float32\'')
+        itemsize = np.dtype(formats[dtype]).itemsize
+        if len(audio) % itemsize:
+            raise ValueError(
+                'a chunk of {} audio must be a multiple of {} bytes, got '
+                '{}'.format(dtype, itemsize, len(audio))
+            )
+        samples = np.frombuffer(audio, dtype=formats[dtype])
+        if dtype == 'float32':
+            return float_to_int16(samples)
+        return samples
+    return float_to_int16(audio)
+
+
+def set_duration_secs(duration, secs):
+    """Sets a protobuf Duration (like a word's `start_time`) to a number of
+    seconds. Negative values are set to zero.
+
+    Parameters
+    ----------
+    duration : google.protobuf.duration_pb2.Duration
+    secs : float
+    """
+    nanos = int(round(max(secs, 0.) * 1e9))
+    duration.seconds, duration.nanos = divmod(nanos, 10 ** 9)
@@ -0,0 +1,225 @@
+# vad.py
+
+import bisect
+
+import numpy as np
+
+
+class VoiceActivityGate(object):
+    """Holds back sustained silence from the recognizer.
+
+    Audio is split into frames, and a frame is speech if its energy is more
+    than `threshold_db` above the running noise floor (and above
+    `min_level_db`). The noise floor starts at `min_level_db`, falls quickly
+    to quieter frames and rises slowly (over `noise_rise_ms`) to louder ones,
+    so it settles on steady background noise without being set by speech.
+    Everything is sent for the first `settle_ms`, while the floor settles.
+    Frames are sent to the recognizer while there is speech,
+    for `hangover_ms` after it, and for `pre_roll_ms` before it (the frames
+    before a word are held back until it is clear whether they are needed),
+    so word onsets and endings are not clipped. Everything else is dropped.
+
+    Since the recognizer only hears the audio that is sent, its timestamps
+    are on a shorter timeline than the recording; `to_recording_secs` maps
+    them back. The speech segments found in the audio are kept in
+    `self.segments`, on the recording's timeline.
+
+    Parameters
+    ----------
+    sample_rate : int
+        Sample rate of the audio (in Hz).
+
+    frame_ms : int (optional, default=20)
+    threshold_db : float (optional, default=12)
+    min_level_db : float (optional, default=-55)
+        Frames quieter than this (in dB relative to full scale) are never
+        speech.
+    hangover_ms : int (optional, default=400)
+    pre_roll_ms : int (optional, default=200)
+    settle_ms : int (optional, default=1000)
+    noise_rise_ms : float (optional, default=4000)
+        Time constant of the noise floor when frames are louder than it.
+    noise_fall_ms : float (optional, default=100)
+        Time constant of the noise floor when frames are quieter than it.
+    """
+    def __init__(self, sample_rate, frame_ms=20, threshold_db=12,
+                 min_level_db=-55, hangover_ms=400, pre_roll_ms=200,
+                 settle_ms=1000, noise_rise_ms=4000, noise_fall_ms=100):
+        self.sample_rate = sample_rate
+        self.frame_len = max(int(sample_rate * frame_ms / 1000), 1)
+        self.threshold_db = threshold_db
+        self.min_level_db = min_level_db
+        self.hangover_frames = int(np.ceil(hangover_ms / float(frame_ms)))
+        self.pre_roll_frames = int(np.ceil(pre_roll_ms / float(frame_ms)))
+        self.settle_frames = int(np.ceil(settle_ms / float(frame_ms)))
+        frame_secs = self.frame_len / float(sample_rate)
+        self._rise = 1 - np.exp(-1000. * frame_secs / noise_rise_ms)
+        self._fall = 1 - np.exp(-1000. * frame_secs / noise_fall_ms)
+
+        self.noise_floor_db = float(min_level_db)
+        self.num_frames = 0
+        self.num_sent_frames = 0
+        # speech segments as [start_secs, end_secs] in the recording.
+        self.segments = []
+
+        self._remainder = np.zeros(0, dtype=np.int16)
+        # frame index of the most recent speech frame.
+        self._last_speech = -np.inf
+        # frames at the end of the last chunk that were held back (up to the
+        # pre-roll), as (frame index, samples).
+        self._held = []
+        self._last_sent = -1
+        # where the sent audio jumps ahead in the recording, as sent and
+        # recording sample indexes.
+        self._sent_marks = []
+        self._recording_marks = []
+
+    @property
+    def held_back_secs(self):
+        """How much audio has been held back so far (in seconds)."""
+        frames = self.num_frames - self.num_sent_frames
+        return frames * self.frame_len / float(self.sample_rate)
+
+    def _frame_levels(self, frames):
+        rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+        return 20 * np.log10(np.maximum(rms, 1.) / 32768.)
+
+    def process(self, chunk):
+        """Finds the speech in the next chunk of audio.
+
+        Parameters
+        ----------
+        chunk : np.array of np.int16
+
+        Returns
+        -------
+        to_send : np.array of np.int16
+            The audio that should be sent to the recognizer (possibly empty).
+        """
+        samples = np.concatenate([self._remainder, np.asarray(chunk, dtype=np.int16)])
+        num_frames = samples.size // self.frame_len
+        self._remainder = samples[num_frames * self.frame_len:]
+        if num_frames == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        frames = samples[:num_frames * self.frame_len].reshape(num_frames, self.frame_len)
+        levels = self._frame_levels(frames)
+        is_speech = levels > self._thresholds(levels)
+
+        first = self.num_frames
+        ixs = np.arange(first, first + num_frames)
+
+        # frames within the hangover of the last speech frame.
+        last_speech = np.maximum.accumulate(np.where(is_speech, ixs, -np.inf))
+        last_speech = np.maximum(last_speech, self._last_speech)
+        send = ixs - last_speech <= self.hangover_frames
+
+        # and the frames within the pre-roll of the next one.
+        next_speech = np.minimum.accumulate(
+            np.where(is_speech, ixs, np.inf)[::-1]
+        )[::-1]
+        send |= next_speech - ixs <= self.pre_roll_frames
+        # nothing is held back until the noise floor has settled.
+        send |= ixs < self.settle_frames
+
+        to_send = []
+        send_ixs = list(ixs[send])
+        if send_ixs and send_ixs[0] - 1 != self._last_sent and np.any(is_speech):
+            # frames held back at the end of the last chunk can be in the
+            # pre-roll of the first word in this one.
+            pre_roll_start = ixs[is_speech][0] - self.pre_roll_frames
+            for frame_ix, frame in self._held:
+                if pre_roll_start <= frame_ix < send_ixs[0] and \
+                   frame_ix > self._last_sent:
+                    self._mark_sent(frame_ix)
+                    to_send.append(frame)
+        if send_ixs:
+            for frame_ix in send_ixs:
+                self._mark_sent(frame_ix)
+                to_send.append(frames[frame_ix - first])
+
+        held = [(ix, frames[ix - first]) for ix in ixs[~send]]
+        if send[-1]:
+            self._held = []
+        else:
+            self._held = (self._held + held)[-self.pre_roll_frames:] \
+                if self.pre_roll_frames else []
+
+        self._update_segments(is_speech, first)
+        if np.any(is_speech):
+            self._last_speech = int(ixs[is_speech][-1])
+
+        self.num_frames += num_frames
+        if not to_send:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(to_send)
+
+    def _thresholds(self, levels):
+        """The speech threshold for each frame, updating the noise floor
+        with every frame's level as it goes.
+
+        This is a loop over frames, not samples: whether the floor rises or
+        falls at a frame depends on the floor the frame before left, so the
+        recurrence is not a linear filter and cannot be written with numpy's
+        cumulative functions. A chunk is only a handful of frames (50 per
+        second of audio at the default `frame_ms`), and the per-sample work
+        in `_frame_levels` is vectorized.
+        """
+        thresholds = np.empty(levels.size)
+        floor = self.noise_floor_db
+        for i, level in enumerate(levels.tolist()):
+            thresholds[i] = max(floor + self.threshold_db, self.min_level_db)
+            rate = self._rise if level > floor else self._fall
+            floor += rate * (level - floor)
+        self.noise_floor_db = floor
+        return thresholds
+
+    def _mark_sent(self, frame_ix):
+        if frame_ix != self._last_sent + 1:
+            self._sent_marks.append(self.num_sent_frames * self.frame_len)
+            self._recording_marks.append(int(frame_ix) * self.frame_len)
+        self._last_sent = frame_ix
+        self.num_sent_frames += 1
+
+    def _update_segments(self, is_speech, first):
+        frame_secs = self.frame_len / float(self.sample_rate)
+        padded = np.concatenate([[False], is_speech, [False]])
+        edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+        for start, end in zip(edges[::2], edges[1::2]):
+            start_secs = float((first + start) * frame_secs)
+            end_secs = float((first + end) * frame_secs)
+            if self.segments and abs(self.segments[-1][1] - start_secs) < 1e-9:
+                self.segments[-1][1] = end_secs
+            else:
+                self.segments.append([start_secs, end_secs])
+
+    def to_recording_secs(self, sent_secs):
+        """Maps a time in the audio that was sent to the recognizer onto the
+        recording.
+
+        Parameters
+        ----------
+        sent_secs : float
+
+        Returns
+        -------
+        recording_secs : float
+        """
+        sent_sample = sent_secs * self.sample_rate
+        ix = bisect.bisect_right(self._sent_marks, sent_sample) - 1
+        if ix < 0:
+            return sent_secs
+        return (self._recording_marks[ix] +
+                sent_sample - self._sent_marks[ix]) / float(self.sample_rate)
+
+    def pauses(self):
+        """The silences between the speech segments.
+
+        Returns
+        -------
+        pauses : list of [start_secs, end_secs]
+        """
+        return [
+            [self.segments[i][1], self.segments[i + 1][0]]
+            for i in range(len(self.segments) - 1)
+        ]
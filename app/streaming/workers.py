@@ -0,0 +1,257 @@
+# workers.py
+
+import uuid
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .speech import GoogleSpeech, WordTimings
+from .analysis import iter_analysis_payloads
+from .metrics import analysis_stage_seconds
+
+
+# set in each worker process by `_init_worker`; stage results are sent back to
+# the server through it.
+_results_queue = None
+
+# the workers are started once the server is already running the gRPC client,
+# the recognizer threads and the topic model threads, and forking a process
+# with live gRPC threads can leave the child hung. So they are started from a
+# clean process instead.
+DEFAULT_START_METHOD = (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+    else 'spawn'
+)
+
+# put on the results queue after the last stage of a job.
+_STAGES_DONE = None
+
+# put on the results queue with how long each stage of a job took, so the
+# timings end up in the server's metrics rather than the worker's.
+_STAGE_TIMINGS = '__stage timings__'
+
+
+def _init_worker(results_queue):
+    global _results_queue
+    _results_queue = results_queue
+
+
+def analyze_responses(job_id, responses, num_topics=5, mode='user',
+                      live_stats=None):
+    """Builds a GoogleSpeech from a recording's responses and runs the full
+    analysis on it. Runs in a worker process.
+
+    The Socket.IO event for each stage is put on the results queue as soon as
+    that stage finishes, and how long the stages took is put on it at the end.
+
+    Parameters
+    ----------
+    job_id : string
+    responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+        The results committed by an AudioStream, which are already on the
+        recording's timeline (so they are not rebased again).
+    num_topics : int (optional, default=5)
+    mode : string (optional, default='user')
+    live_stats : OnlineSpeechStats (optional, default=None)
+        The statistics kept while recording. Only the results it has not seen
+        yet (the tail of the recording) are added to it.
+
+    Returns
+    -------
+    google_speech : GoogleSpeech
+    """
+    stage_secs = {}
+    try:
+        transcript = ''.join(r.alternatives[0].transcript for r in responses)
+        _results_queue.put(
+            (job_id, 'transcript update', {'transcript': transcript})
+        )
+
+        if live_stats is not None:
+            live_stats.extend(responses[live_stats.num_results:])
+
+        google_speech = GoogleSpeech(
+            WordTimings.from_responses(responses, rebased=True),
+            num_topics=num_topics
+        )
+        stage_secs.update(google_speech.stage_secs)
+        payloads = iter_analysis_payloads(
+            google_speech, mode=mode, live_stats=live_stats,
+            stage_secs=stage_secs
+        )
+        for event, data in payloads:
+            _results_queue.put((job_id, event, data))
+    finally:
+        _results_queue.put((job_id, _STAGE_TIMINGS, stage_secs))
+        _results_queue.put((job_id, _STAGES_DONE, None))
+    return google_speech
+
+
+class AnalysisQueueFull(Exception):
+    """Raised when there are already as many analysis jobs queued up as the
+    AnalysisExecutor allows."""
+    pass
+
+
+class AnalysisJob(object):
+    """A speech analysis submitted to an AnalysisExecutor.
+
+    Attributes
+    ----------
+    job_id : string
+    future : concurrent.futures.Future
+        Resolves to the analyzed GoogleSpeech.
+    callback : callable
+        Called as `callback(event, data)` for each stage's result.
+    """
+    def __init__(self, job_id, callback):
+        self.job_id = job_id
+        self.callback = callback
+        self.future = None
+        self.stages_done = False
+
+    def done(self):
+        """True once every stage's result has been dispatched and the
+        GoogleSpeech is available (or the job has failed)."""
+        if self.future is None or not self.future.done():
+            return False
+        return self.stages_done or self.future.exception() is not None
+
+    def result(self):
+        """The analyzed GoogleSpeech. Raises the job's exception if it failed."""
+        return self.future.result()
+
+
+class AnalysisExecutor(object):
+    """Runs speech analysis in a pool of worker processes, so the server's
+    event loop is never blocked by it.
+
+    Results for each stage of a job are passed to that job's callback as they
+    come in, whenever `dispatch` is called (from the server's side of things).
+
+    Parameters
+    ----------
+    max_workers : int (optional, default=2)
+        Number of worker processes.
+
+    max_queue : int (optional, default=8)
+        Maximum number of jobs that can be running or waiting to run at once.
+        Submitting more than this raises AnalysisQueueFull.
+
+    start_method : string (optional, default=None)
+        The multiprocessing start method for the workers ('fork', 'spawn' or
+        'forkserver'). Defaults to DEFAULT_START_METHOD ('forkserver' where
+        it is available); 'fork' is not safe once gRPC threads are running.
+    """
+    def __init__(self, max_workers=2, max_queue=8, start_method=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.start_method = start_method or DEFAULT_START_METHOD
+
+        self._pool = None
+        self._results = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        """Number of jobs that are running or waiting to run."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done())
+
+    def _start_pool(self):
+        context = multiprocessing.get_context(self.start_method)
+        self._results = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._results,)
+        )
+
+    def submit(self, responses, callback, num_topics=5, mode='user',
+               live_stats=None):
+        """Queues up the analysis of a recording.
+
+        Parameters
+        ----------
+        responses : list of google.cloud.speech_v1.types.SpeechRecognitionResult
+            As committed by an AudioStream (on the recording's timeline).
+
+        callback : callable
+            Called as `callback(event, data)` for each stage's result, from
+            whichever thread calls `dispatch`.
+
+        num_topics : int (optional, default=5)
+        mode : string (optional, default='user')
+        live_stats : OnlineSpeechStats (optional, default=None)
+            The statistics kept while recording, so the word counts do not
+            have to be computed again.
+
+        Returns
+        -------
+        job : AnalysisJob
+        """
+        with self._lock:
+            self._forget_finished_jobs()
+            if len(self._jobs) >= self.max_queue:
+                raise AnalysisQueueFull(
+                    '{} analysis jobs are already queued.'.format(self.max_queue)
+                )
+            if self._pool is None:
+                self._start_pool()
+
+            # register the job first, so none of its results can be missed.
+            job = AnalysisJob(uuid.uuid4().hex, callback)
+            self._jobs[job.job_id] = job
+            job.future = self._pool.submit(
+                analyze_responses, job.job_id, list(responses), num_topics,
+                mode, live_stats
+            )
+        return job
+
+    def _forget_finished_jobs(self):
+        for job_id in [j for j, job in self._jobs.items() if job.done()]:
+            del self._jobs[job_id]
+
+    def dispatch(self):
+        """Passes any results that have come back from the workers on to
+        their jobs' callbacks. This never blocks.
+
+        Returns
+        -------
+        num_dispatched : int
+        """
+        if self._results is None:
+            return 0
+
+        num_dispatched = 0
+        with self._dispatch_lock:
+            while True:
+                try:
+                    job_id, event, data = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if event is _STAGES_DONE:
+                    job.stages_done = True
+                elif event == _STAGE_TIMINGS:
+                    for stage, secs in data.items():
+                        analysis_stage_seconds.observe(secs, stage=stage)
+                else:
+                    job.callback(event, data)
+                    num_dispatched += 1
+
+        with self._lock:
+            self._forget_finished_jobs()
+        return num_dispatched
+
+    def shutdown(self, wait=True):
+        """Stops the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
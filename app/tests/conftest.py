@@ -0,0 +1,32 @@
+# conftest.py
+#
+# Shared fixtures for the tests. Run them from `app/` (or the repo root) with:
+#
+#     python -m pytest -q
+
+import os
+import sys
+
+import dill
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+EXAMPLE_NAME = "Aala El-Khani -- What it's like to be a parent in a war zone"
+EXAMPLE_PKD = os.path.join(APP_DIR, 'data', EXAMPLE_NAME + '.pkd')
+EXAMPLE_SPEECH = os.path.join(APP_DIR, 'data', EXAMPLE_NAME + '.speech')
+
+
+@pytest.fixture(scope='session')
+def example_responses():
+    """The recorded `is_final` results of the example speech."""
+    with open(EXAMPLE_PKD, 'rb') as f:
+        return dill.load(f)
+
+
+@pytest.fixture(scope='session')
+def example_speech(example_responses):
+    from streaming.speech import GoogleSpeech
+    return GoogleSpeech(example_responses, num_topics=3)
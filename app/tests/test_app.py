@@ -0,0 +1,78 @@
+# test_app.py
+
+import time
+
+import numpy as np
+import pytest
+
+from conftest import APP_DIR
+from streaming.artifacts import ArtifactStore
+from streaming.recording import WavRecorder, word_byte_ranges
+
+
+@pytest.fixture
+def flask_app(monkeypatch):
+    # the data files in the config are relative to `app/`.
+    monkeypatch.chdir(APP_DIR)
+    import app as app_module
+    return app_module
+
+
+def _wait_for(client, name, timeout_sec=60):
+    deadline = time.time() + timeout_sec
+    while time.time() < deadline:
+        for event in client.get_received():
+            if event['name'] == name:
+                return event['args'][0]
+        time.sleep(0.05)
+    raise AssertionError('{!r} was never emitted'.format(name))
+
+
+def test_example_topics_outside_the_bundle(flask_app):
+    """A number of topics the bundle does not have is fit on demand, even
+    before the example speech has been loaded."""
+    flask_app.app.example_speech = None
+    client = flask_app.socketio.test_client(flask_app.app)
+    client.emit('example update lda topics', 12)
+    topics = _wait_for(client, 'topic modeling')
+    assert len(topics) == 12
+    assert flask_app.app.example_speech is not None
+    client.disconnect()
+
+
+def test_metrics_page(flask_app):
+    response = flask_app.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+    assert '# TYPE talk_audio_chunk_handler_seconds histogram' in lines
+    assert '# TYPE talk_recognizer_streams_total counter' in lines
+    # the gauges are read from the app when the page is rendered.
+    assert 'talk_sessions {!r}'.format(float(len(flask_app.app.sessions))) in lines
+    assert 'talk_analysis_queue_depth 0.0' in lines
+
+
+def test_recording_range_requests(flask_app, monkeypatch, tmp_path):
+    artifacts = ArtifactStore(str(tmp_path))
+    monkeypatch.setattr(flask_app.app, 'artifacts', artifacts)
+    recorder = WavRecorder(artifacts.path('sid', 'recording.wav'), 16000)
+    recorder.append(np.arange(16000, dtype=np.int16))
+    recorder.close()
+    with open(recorder.filename, 'rb') as f:
+        data = f.read()
+
+    # a single word, as the client fetches it with the seek index.
+    first, last = word_byte_ranges(
+        [0.5], [0.6], recorder.sample_rate, recorder.num_samples
+    ).tolist()[0]
+    url = flask_app.recording_url('sid', recorder.filename)
+    client = flask_app.app.test_client()
+    response = client.get(url, headers={'Range': 'bytes={}-{}'.format(first, last)})
+    assert response.status_code == 206
+    assert response.data == data[first:last + 1]
+    assert response.headers['Content-Range'] == \
+        'bytes {}-{}/{}'.format(first, last, len(data))
+
+    assert client.get(url).data == data
+    assert client.get('/recordings/other/recording.wav').status_code == 404
+    assert client.get('/recordings/sid/..%2Fsid%2Frecording.wav').status_code == 404
@@ -0,0 +1,60 @@
+# test_artifacts.py
+
+import os
+
+import pytest
+
+from streaming.artifacts import ArtifactStore
+
+
+def _write(store, sid, name, size, mtime):
+    path = store.path(sid, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    os.utime(os.path.dirname(path), (mtime, mtime))
+    return path
+
+
+def test_paths_stay_inside_the_session_dir(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    path = store.path('a/b', 'recording.wav')
+    assert os.path.dirname(path) == os.path.join(str(tmp_path), 'a_b')
+    for name in ['../recording.wav', '.hidden', 'a/b.wav', '']:
+        with pytest.raises(ValueError):
+            store.path('sid', name)
+        assert store.find('sid', name) is None
+    assert store.find('sid', 'missing.wav') is None
+
+
+def test_sweep_removes_expired_sessions(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_age_sec=100)
+    old = _write(store, 'old', 'recording.wav', 10, mtime=1000)
+    recording = _write(store, 'recording', 'recording.wav', 10, mtime=1000)
+    new = _write(store, 'new', 'recording.wav', 10, mtime=1150)
+
+    assert store.sweep(keep=['recording'], now=1200) == [old]
+    assert not os.path.exists(os.path.dirname(old))
+    assert os.path.exists(recording) and os.path.exists(new)
+    assert store.total_bytes() == 20
+
+
+def test_sweep_removes_the_oldest_files_over_the_budget(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=25, max_age_sec=10 ** 9)
+    first = _write(store, 'a', 'first.wav', 10, mtime=1000)
+    kept = _write(store, 'b', 'kept.wav', 10, mtime=1001)
+    second = _write(store, 'a', 'second.wav', 10, mtime=1002)
+    third = _write(store, 'c', 'third.wav', 10, mtime=1003)
+
+    # the files of a session that is in use are skipped.
+    assert store.sweep(keep=['b'], now=2000) == [first, second]
+    assert os.path.exists(kept) and os.path.exists(third)
+    assert store.total_bytes() == 20
+
+
+def test_remove_session(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    path = _write(store, 'sid', 'recording.wav', 10, mtime=1000)
+    store.remove_session('sid')
+    assert not os.path.exists(path)
+    assert store.find('sid', 'recording.wav') is None
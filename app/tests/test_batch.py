@@ -0,0 +1,53 @@
+# test_batch.py
+
+import io
+import os
+import shutil
+
+from conftest import EXAMPLE_SPEECH
+from streaming.batch import SUMMARY_FILENAME, find_recordings, run_batch
+
+
+def test_prefers_speech_files_and_keeps_subfolders(tmp_path):
+    for filename in ['a.speech', 'a.wav', 'sub/b.pkd']:
+        path = tmp_path / filename
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'')
+    assert find_recordings(str(tmp_path)) == [
+        ('a', str(tmp_path / 'a.speech')),
+        ('sub/b', str(tmp_path / 'sub' / 'b.pkd')),
+    ]
+
+
+def test_resumes_where_it_left_off(tmp_path):
+    recordings = tmp_path / 'in'
+    recordings.mkdir()
+    shutil.copy(EXAMPLE_SPEECH, str(recordings / 'first.speech'))
+    output = str(tmp_path / 'out')
+
+    rows = run_batch(str(recordings), output, workers=1, out=io.StringIO())
+    assert [row['status'] for row in rows] == ['ok']
+    report = os.path.join(output, 'first.json')
+    modified = os.path.getmtime(report)
+
+    # only the new recording is analyzed; the first one's row is read back.
+    shutil.copy(EXAMPLE_SPEECH, str(recordings / 'second.speech'))
+    out = io.StringIO()
+    rows = run_batch(str(recordings), output, workers=1, out=out)
+    assert '2 recordings, 1 already analyzed, 1 to analyze.' in out.getvalue()
+    assert [row['talk'] for row in rows] == ['first', 'second']
+    assert rows[0]['num-words'] == rows[1]['num-words']
+    assert os.path.getmtime(report) == modified
+
+    with open(os.path.join(output, SUMMARY_FILENAME)) as f:
+        assert len(f.read().splitlines()) == 3
+
+
+def test_failed_recordings_are_reported(tmp_path):
+    recordings = tmp_path / 'in'
+    recordings.mkdir()
+    (recordings / 'broken.speech').write_bytes(b'not a speech file')
+    rows = run_batch(str(recordings), str(tmp_path / 'out'), workers=1,
+                     out=io.StringIO())
+    assert rows[0]['status'] == 'failed'
+    assert 'ValueError' in rows[0]['error']
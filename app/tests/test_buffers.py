@@ -0,0 +1,83 @@
+# test_buffers.py
+
+import threading
+
+import pytest
+
+from streaming.buffers import AudioRingBuffer
+
+
+def test_drop_oldest_drops_whole_chunks():
+    buf = AudioRingBuffer(max_bytes=8, overflow='drop-oldest')
+    for chunk in [b'aaaa', b'bbbb', b'cccc']:
+        assert buf.put(chunk)
+    assert buf.get() == b'bbbbcccc'
+    metrics = buf.metrics()
+    assert metrics['overflows'] == 1
+    assert metrics['dropped_bytes'] == 4
+    assert metrics['bytes_in'] - metrics['dropped_bytes'] == metrics['bytes_out']
+
+
+def test_input_position_skips_dropped_audio():
+    buf = AudioRingBuffer(max_bytes=8, overflow='drop-oldest')
+    for chunk in [b'aaaa', b'bbbb', b'cccc']:
+        buf.put(chunk)
+    assert buf.get() == b'bbbbcccc'
+    assert [buf.input_position(i) for i in [0, 3, 4, 8]] == [4, 7, 8, 12]
+
+
+def test_input_position_after_a_rejected_chunk():
+    buf = AudioRingBuffer(max_bytes=8, overflow='block', block_timeout_sec=0.01)
+    buf.put(b'aaaaaaaa')
+    assert not buf.put(b'bb')
+    assert buf.get() == b'aaaaaaaa'
+    buf.put(b'cc')
+    assert buf.get() == b'cc'
+    assert [buf.input_position(i) for i in [7, 8, 9]] == [7, 10, 11]
+
+
+def test_coalesce_keeps_most_recent_bytes():
+    buf = AudioRingBuffer(max_bytes=8, overflow='coalesce')
+    buf.put(b'aaaa')
+    buf.put(b'bbbbbb')
+    assert buf.get() == b'aabbbbbb'
+    assert buf.metrics()['dropped_bytes'] == 2
+
+
+def test_block_drops_the_new_chunk_after_the_timeout():
+    buf = AudioRingBuffer(max_bytes=8, overflow='block', block_timeout_sec=0.01)
+    assert buf.put(b'aaaaaaaa')
+    assert not buf.put(b'bb')
+    assert buf.get() == b'aaaaaaaa'
+    assert buf.metrics()['dropped_bytes'] == 2
+
+
+def test_block_waits_for_room():
+    buf = AudioRingBuffer(max_bytes=8, overflow='block', block_timeout_sec=5)
+    buf.put(b'aaaaaaaa')
+    consumer = threading.Timer(0.05, buf.get)
+    consumer.start()
+    assert buf.put(b'bbbb')
+    consumer.join()
+    assert buf.get() == b'bbbb'
+    assert buf.metrics()['dropped_bytes'] == 0
+
+
+def test_oversized_chunk_keeps_its_end():
+    buf = AudioRingBuffer(max_bytes=4, overflow='drop-oldest')
+    buf.put(b'abcdefgh')
+    assert buf.get() == b'efgh'
+
+
+def test_get_splits_into_requests():
+    buf = AudioRingBuffer(max_bytes=64, max_request_bytes=6)
+    buf.put(b'aaaa')
+    buf.put(b'bbbb')
+    assert buf.get() == b'aaaabb'
+    assert buf.get() == b'bb'
+    assert buf.get(timeout=0.01) is None
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        AudioRingBuffer(overflow='spill')
@@ -0,0 +1,53 @@
+# test_bundle.py
+
+import gzip
+import json
+import os
+
+import pytest
+
+from conftest import APP_DIR
+from streaming.bundle import (
+    BUNDLE_VERSION, build_example_bundle, load_bundle, save_bundle
+)
+
+EXAMPLE_BUNDLE = os.path.join(APP_DIR, 'data', 'example-bundle.json.gz')
+
+
+def _assert_close(a, b, path='bundle'):
+    """Compares JSON values, allowing floats to differ by rounding."""
+    if isinstance(a, float) or isinstance(b, float):
+        assert a == pytest.approx(b, rel=1e-6, abs=1e-9), path
+    elif isinstance(a, dict):
+        assert sorted(a) == sorted(b), path
+        for key in a:
+            _assert_close(a[key], b[key], '{}.{}'.format(path, key))
+    elif isinstance(a, list):
+        assert len(a) == len(b), path
+        for i, (x, y) in enumerate(zip(a, b)):
+            _assert_close(x, y, '{}[{}]'.format(path, i))
+    else:
+        assert a == b, path
+
+
+def test_committed_bundle_is_up_to_date(example_responses, tmp_path):
+    """The bundle shipped in data/ is what `python -m streaming.bundle` builds
+    from the example speech (the topic models are seeded)."""
+    filename = str(tmp_path / 'bundle.json.gz')
+    save_bundle(build_example_bundle(example_responses), filename)
+    _assert_close(load_bundle(filename), load_bundle(EXAMPLE_BUNDLE))
+
+
+def test_bundle_has_every_slider_value():
+    bundle = load_bundle(EXAMPLE_BUNDLE)
+    assert sorted(bundle['topics'], key=int) == [str(n) for n in range(1, 10)]
+    assert 'topic modeling' not in [event for event, _ in bundle['payloads']]
+    assert len(bundle['words']) == len(bundle['word_times'])
+
+
+def test_rejects_other_versions(tmp_path):
+    filename = str(tmp_path / 'old.json.gz')
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        json.dump({'version': BUNDLE_VERSION - 1}, f)
+    with pytest.raises(ValueError):
+        load_bundle(filename)
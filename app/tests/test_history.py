@@ -0,0 +1,76 @@
+# test_history.py
+
+import numpy as np
+import pytest
+
+from streaming.history import SpeechHistory, SpeechStore
+from streaming.speech import GoogleSpeech
+from streaming.topics import topic_models
+
+
+@pytest.fixture
+def speeches(example_speech):
+    speeches = [GoogleSpeech(example_speech.timings, num_topics=2) for _ in range(3)]
+    yield speeches
+    for google_speech in speeches:
+        topic_models.discard(google_speech.key)
+
+
+def test_store_round_trip(example_speech, tmp_path):
+    store = SpeechStore(str(tmp_path / 'speeches.sqlite'))
+    store.put(example_speech)
+    assert example_speech.key in store
+    loaded = store.get(example_speech.key)
+    assert loaded.key == example_speech.key
+    assert loaded.num_topics == example_speech.num_topics
+    assert loaded.transcript_as_list() == example_speech.transcript_as_list()
+    np.testing.assert_array_equal(loaded.mean_timestamps(),
+                                  example_speech.mean_timestamps())
+    with pytest.raises(KeyError):
+        store.get('missing')
+    store.close()
+
+
+def test_spills_the_least_recently_used(speeches):
+    history = SpeechHistory(max_in_memory=2)
+    for google_speech in speeches:
+        history.append(google_speech)
+    assert len(history) == 3
+    assert history.in_memory() == speeches[1:]
+    assert len(history.store) == 1
+
+    # a spilled speech is rebuilt under its key, and the oldest is spilled.
+    reloaded = history[0]
+    assert reloaded is not speeches[0]
+    assert reloaded.key == speeches[0].key
+    assert reloaded.transcript_as_list() == speeches[0].transcript_as_list()
+    assert [gs.key for gs in history.in_memory()] == \
+        [speeches[2].key, speeches[0].key]
+    assert history[2] is speeches[2]
+
+
+def test_memory_bytes_counts_the_analysis(speeches):
+    history = SpeechHistory(max_in_memory=1)
+    history.append(speeches[0])
+    timings_bytes = speeches[0].timings.nbytes
+    assert history.memory_bytes() == speeches[0].nbytes
+    assert history.memory_bytes() > timings_bytes + speeches[0].analysis.nbytes
+
+    # fitting more topics is counted too, while the models are cached.
+    before = history.memory_bytes()
+    speeches[0].fit_lda(5)
+    assert history.memory_bytes() > before
+
+
+def test_clear_forgets_every_speech(speeches):
+    history = SpeechHistory(max_in_memory=1)
+    for google_speech in speeches:
+        history.append(google_speech)
+    assert topic_models.models(speeches[0].key)
+
+    history.clear()
+    assert len(history) == 0
+    assert history.in_memory() == []
+    assert len(history.store) == 0
+    for google_speech in speeches:
+        assert topic_models.models(google_speech.key) == []
@@ -0,0 +1,55 @@
+# test_metrics.py
+
+import pytest
+
+from streaming.metrics import MetricsRegistry, timed_stage, analysis_stage_seconds
+
+
+def test_counter_by_label():
+    registry = MetricsRegistry()
+    counter = registry.counter('requests_total', 'Requests.', labelnames=('kind',))
+    counter.inc(kind='a')
+    counter.inc(2, kind='a')
+    counter.inc(kind='b')
+    assert counter.value(kind='a') == 3
+    assert counter.value(kind='c') == 0
+    with pytest.raises(ValueError):
+        counter.inc(other='a')
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.))
+    for value in [0.05, 0.1, 0.5, 2.]:
+        histogram.observe(value)
+    assert histogram.count() == 4
+    samples = {(name, labels): value for name, labels, value in histogram.samples()}
+    assert samples[('latency_seconds_bucket', (('le', '0.1'),))] == 2
+    assert samples[('latency_seconds_bucket', (('le', '1.0'),))] == 3
+    assert samples[('latency_seconds_bucket', (('le', '+Inf'),))] == 4
+    assert samples[('latency_seconds_sum', ())] == pytest.approx(2.65)
+    assert samples[('latency_seconds_count', ())] == 4
+
+
+def test_render_text_format():
+    registry = MetricsRegistry()
+    registry.counter('errors_total', 'Errors.', labelnames=('error',)).inc(
+        error='say "hi"')
+    registry.gauge('queue_depth', 'Queue depth.', function=lambda: 3)
+    assert registry.render() == (
+        '# HELP errors_total Errors.\n'
+        '# TYPE errors_total counter\n'
+        'errors_total{error="say \\"hi\\""} 1.0\n'
+        '# HELP queue_depth Queue depth.\n'
+        '# TYPE queue_depth gauge\n'
+        'queue_depth 3.0\n'
+    )
+
+
+def test_timed_stage_records_the_time():
+    stage_secs = {}
+    count = analysis_stage_seconds.count(stage='test.stage')
+    with timed_stage('test.stage', stage_secs):
+        pass
+    assert stage_secs['test.stage'] >= 0
+    assert analysis_stage_seconds.count(stage='test.stage') == count + 1
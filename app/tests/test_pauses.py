@@ -0,0 +1,53 @@
+# test_pauses.py
+
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+
+from streaming.pauses import PauseClassifier
+
+
+def _kmeans_long_pauses(pauses):
+    kmeans = KMeans(n_clusters=2, n_init=10, random_state=0)
+    labels = kmeans.fit_predict(np.asarray(pauses).reshape(-1, 1))
+    return labels == np.argmax(kmeans.cluster_centers_.ravel())
+
+
+def test_matches_kmeans_on_the_example(example_speech):
+    pauses = example_speech.pause_durations()
+    classifier = PauseClassifier(pauses)
+    np.testing.assert_array_equal(classifier.predict(pauses),
+                                  _kmeans_long_pauses(pauses))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_kmeans(seed):
+    rng = np.random.RandomState(seed)
+    pauses = np.concatenate([rng.exponential(0.2, 300),
+                             1 + rng.exponential(1., 30)])
+    classifier = PauseClassifier(pauses)
+    np.testing.assert_array_equal(classifier.predict(pauses),
+                                  _kmeans_long_pauses(pauses))
+    centers = np.sort(KMeans(n_clusters=2, n_init=10, random_state=0)
+                      .fit(pauses.reshape(-1, 1)).cluster_centers_.ravel())
+    np.testing.assert_allclose(classifier.cluster_centers_, centers)
+
+
+def test_insert_matches_fit():
+    rng = np.random.RandomState(0)
+    pauses = rng.exponential(0.5, 500).round(2)
+    classifier = PauseClassifier(pauses[:2])
+    for i, pause in enumerate(pauses[2:]):
+        classifier.insert(pause)
+        if i % 50 == 0:
+            # the split is found again between inserts.
+            classifier.threshold
+    fitted = PauseClassifier(pauses)
+    assert len(classifier) == len(fitted)
+    assert classifier.threshold == fitted.threshold
+    assert classifier.split_ix == fitted.split_ix
+
+
+def test_needs_two_different_pauses():
+    with pytest.raises(ValueError):
+        PauseClassifier([0.5, 0.5]).threshold
@@ -0,0 +1,44 @@
+# test_recording.py
+
+import wave
+
+import numpy as np
+import pytest
+
+from streaming.recording import WAV_HEADER_BYTES, WavRecorder
+
+
+def test_spools_every_chunk_to_the_wav_file(tmp_path):
+    filename = str(tmp_path / 'recording.wav')
+    recorder = WavRecorder(filename, 16000, block_size=1000)
+    rng = np.random.RandomState(0)
+    chunks = [rng.randint(-32768, 32767, size, dtype=np.int16)
+              for size in [1, 999, 1000, 2500, 0, 4096]]
+    for chunk in chunks:
+        recorder.append(chunk)
+        # only one block is ever held in memory.
+        assert recorder.nbytes == 2000
+    recorder.close()
+
+    audio = np.concatenate(chunks)
+    assert recorder.num_samples == audio.size
+    assert recorder.duration_secs == audio.size / 16000.
+    with wave.open(filename, 'rb') as wav:
+        assert wav.getframerate() == 16000
+        assert wav.getnchannels() == 1
+        assert wav.getsampwidth() == 2
+        frames = wav.readframes(wav.getnframes())
+    np.testing.assert_array_equal(np.frombuffer(frames, dtype='<i2'), audio)
+
+    # the audio starts right after the header.
+    with open(filename, 'rb') as f:
+        f.seek(WAV_HEADER_BYTES)
+        assert f.read() == audio.astype('<i2').tobytes()
+
+
+def test_closed_recordings_take_no_more_audio(tmp_path):
+    recorder = WavRecorder(str(tmp_path / 'recording.wav'), 16000)
+    recorder.close()
+    recorder.close()
+    with pytest.raises(ValueError):
+        recorder.append(np.zeros(10, dtype=np.int16))
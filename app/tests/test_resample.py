@@ -0,0 +1,43 @@
+# test_resample.py
+
+import numpy as np
+import pytest
+
+from streaming.resample import StreamingResampler, output_sample_rate
+
+
+def _tone(sample_rate, secs=1., hz=440):
+    t = np.arange(int(sample_rate * secs)) / float(sample_rate)
+    return (8000 * np.sin(2 * np.pi * hz * t)).astype(np.int16)
+
+
+@pytest.mark.parametrize('input_rate', [48000, 44100, 22050])
+def test_chunked_output_matches_one_shot(input_rate):
+    audio = _tone(input_rate)
+    one_shot = StreamingResampler(input_rate, 16000).process(audio)
+
+    rng = np.random.RandomState(0)
+    resampler = StreamingResampler(input_rate, 16000)
+    chunks = []
+    start = 0
+    while start < audio.size:
+        size = rng.randint(1, 5000)
+        chunks.append(resampler.process(audio[start:start + size]))
+        start += size
+    chunked = np.concatenate(chunks)
+
+    np.testing.assert_array_equal(chunked, one_shot)
+    assert abs(chunked.size - audio.size * 16000 // input_rate) <= 1
+
+
+def test_keeps_the_tone():
+    resampled = StreamingResampler(48000, 16000).process(_tone(48000))
+    spectrum = np.abs(np.fft.rfft(resampled))
+    peak_hz = np.argmax(spectrum) * 16000. / resampled.size
+    assert abs(peak_hz - 440) < 2
+
+
+def test_output_sample_rate_only_downsamples():
+    assert output_sample_rate(48000, 16000) == 16000
+    assert output_sample_rate(8000, 16000) == 8000
+    assert output_sample_rate(44100, None) == 44100
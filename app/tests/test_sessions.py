@@ -0,0 +1,61 @@
+# test_sessions.py
+
+import time
+
+from streaming.sessions import SessionRegistry
+
+
+class _OpenStream(object):
+    """Stands in for an AudioStream that is still recording."""
+    closed = False
+
+    def is_finished(self):
+        return False
+
+    def buffer_metrics(self):
+        return {'queued_bytes': 0}
+
+
+def test_one_session_per_sid():
+    registry = SessionRegistry()
+    session = registry.get('a')
+    assert registry.get('a') is session
+    assert registry.get('b') is not session
+    assert len(registry) == 2
+    registry.disconnect('a')
+    assert not session.connected
+    assert registry.remove('a') is session
+    assert 'a' not in registry
+
+
+def test_idle_sessions_are_evicted():
+    registry = SessionRegistry(idle_timeout_sec=60)
+    registry.get('idle')
+    registry.get('recording').audio_stream = _OpenStream()
+    registry.get('active')
+    registry.get('idle').last_active -= 120
+    registry.get('recording').last_active -= 120
+    registry.get('active')
+
+    now = time.time()
+    assert registry.evict(now) == ['idle']
+    assert sorted(registry._sessions) == ['active', 'recording']
+
+
+def test_memory_budget_evicts_disconnected_sessions_first(example_responses):
+    registry = SessionRegistry(memory_budget_bytes=0)
+    for sid in ['old', 'disconnected', 'new', 'recording']:
+        registry.get(sid).responses = list(example_responses)
+    registry.get('recording').audio_stream = _OpenStream()
+    registry.disconnect('disconnected')
+    size = registry.get('new').memory_bytes()
+    assert size > 0
+
+    registry.memory_budget_bytes = 3 * size
+    assert registry.evict() == ['disconnected']
+    registry.memory_budget_bytes = 2 * size
+    assert registry.evict() == ['old']
+    # sessions that are still recording are never evicted.
+    registry.memory_budget_bytes = 0
+    assert registry.evict() == ['new']
+    assert list(registry._sessions) == ['recording']
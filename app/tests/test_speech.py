@@ -0,0 +1,51 @@
+# test_speech.py
+
+import numpy as np
+
+from streaming.speech import TranscriptAccumulator, WordTimings
+
+
+def test_accumulator_counts_final_and_interim_words(example_responses,
+                                                  example_speech):
+    accumulator = TranscriptAccumulator()
+    for response in example_responses:
+        words = response.alternatives[0].transcript.split()
+        # interim results grow until the final result replaces them.
+        for i in range(1, len(words), 7):
+            accumulator.set_interim(' '.join(words[:i]))
+            assert accumulator.num_words == \
+                len(accumulator.transcript_as_string().split())
+        accumulator.add_final(response.alternatives[0].transcript)
+        assert accumulator.interim_transcript == ''
+
+    assert accumulator.transcript_as_string() == \
+        example_speech.transcript_as_string()
+    assert accumulator.num_words == len(example_speech.transcript_as_list())
+
+
+def test_transcript_words_map_to_their_timed_words(example_speech):
+    timings = example_speech.timings
+    words = timings.words()
+    transcript = example_speech.transcript_as_list()
+    word_ixs = timings.transcript_word_ixs()
+    assert len(word_ixs) == len(transcript)
+    assert [words[ix] for ix in word_ixs] == transcript
+
+
+def test_transcript_words_of_mismatched_responses():
+    # "5:30" was timed as two words, and the second response has no words.
+    timings = WordTimings(
+        [0., 1., 2., 3.], [1., 2., 3., 4.], [0, 0, 0, 2], [0, 1, 2, 3],
+        ['at', '5', '30', 'ok'], ['at 5:30', ' yes no', ' ok']
+    )
+    np.testing.assert_array_equal(timings.transcript_word_ixs(),
+                                  [0, 1, -1, -1, 3])
+
+
+def test_invalidate_rebuilds_the_cached_indexes(example_speech):
+    analysis = example_speech.analysis
+    word_rate = example_speech.word_rate
+    example_speech.invalidate()
+    assert example_speech.analysis is not analysis
+    assert example_speech.word_rate is not word_rate
+    assert np.array_equal(example_speech.analysis.counts, analysis.counts)
@@ -0,0 +1,61 @@
+# test_speechfile.py
+
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_SPEECH
+from streaming.speech import GoogleSpeech, WordTimings
+from streaming.speechfile import (
+    FLAG_REBASED, HEADER, dump_speech, load_speech, parse_speech, save_speech
+)
+
+
+def _assert_same_timings(a, b):
+    np.testing.assert_array_equal(a.start_secs, b.start_secs)
+    np.testing.assert_array_equal(a.end_secs, b.end_secs)
+    np.testing.assert_array_equal(a.response_ixs, b.response_ixs)
+    assert a.words() == b.words()
+    assert a.transcripts == b.transcripts
+    assert a.rebased == b.rebased
+
+
+def test_round_trip(example_responses, tmp_path):
+    timings = WordTimings.from_responses(example_responses)
+    filename = str(tmp_path / 'example.speech')
+    save_speech(timings, filename)
+    loaded = load_speech(filename)
+    _assert_same_timings(loaded, timings)
+    assert not loaded.rebased
+
+
+def test_rebased_flag_round_trip(example_speech):
+    # GoogleSpeech rebases its timings onto the speech's timeline.
+    timings = example_speech.timings
+    assert timings.rebased
+    data = dump_speech(timings)
+    assert HEADER.unpack_from(data)[2] & FLAG_REBASED
+
+    loaded = parse_speech(data)
+    _assert_same_timings(loaded, timings)
+    # a rebased file is not rebased a second time.
+    np.testing.assert_array_equal(
+        GoogleSpeech(loaded).mean_timestamps(), example_speech.mean_timestamps()
+    )
+
+
+def test_file_without_flags_is_rebased_on_load(example_speech):
+    # written before the flags were used, so the timestamps are as the
+    # recognizer returned them.
+    timings = load_speech(EXAMPLE_SPEECH)
+    assert not timings.rebased
+    np.testing.assert_array_equal(
+        GoogleSpeech(timings).mean_timestamps(), example_speech.mean_timestamps()
+    )
+
+
+def test_rejects_other_and_truncated_files(example_responses):
+    with pytest.raises(ValueError):
+        parse_speech(b'not a speech file' * 10)
+    data = dump_speech(WordTimings.from_responses(example_responses))
+    with pytest.raises(ValueError):
+        parse_speech(data[:len(data) // 2])
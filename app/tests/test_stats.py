@@ -0,0 +1,95 @@
+# test_stats.py
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from streaming.pauses import PauseClassifier
+from streaming.stats import OnlineSpeechStats, WordRateIndex, count_words
+
+
+def _histogram_words_per_window(timestamps, window_sec):
+    """Words spoken in a window centered on each second, as the running
+    words per minute used to be found (from a histogram of whole seconds)."""
+    seconds = np.asarray(timestamps).astype(int)
+    counts, _ = np.histogram(seconds, bins=np.arange(np.max(seconds) + 2))
+    return np.convolve(counts, np.ones(window_sec), 'same')
+
+
+@pytest.mark.parametrize('window_sec', [1, 5, 10, 30, 60])
+def test_word_rate_matches_the_histogram(example_speech, window_sec):
+    timestamps = example_speech.mean_timestamps()
+    expected = _histogram_words_per_window(timestamps, window_sec)
+
+    index = WordRateIndex(timestamps, resolution_sec=1.)
+    wpm = index.words_per_min(np.arange(expected.size), window_sec=window_sec)
+    np.testing.assert_allclose(wpm * window_sec / 60., expected)
+
+
+def test_mean_words_per_min_averages_every_point():
+    rng = np.random.RandomState(0)
+    index = WordRateIndex(np.sort(rng.uniform(0, 120, 300)))
+    edges = np.linspace(0, index.duration_sec, 7)
+    means = index.mean_words_per_min(edges, window_sec=10)
+    for i in range(edges.size - 1):
+        grid = np.arange(int(round(edges[i] / index.resolution_sec)),
+                         int(round(edges[i + 1] / index.resolution_sec)))
+        wpm = index.words_per_min(grid * index.resolution_sec, window_sec=10)
+        assert means[i] == pytest.approx(wpm.mean())
+
+
+def test_count_between():
+    timestamps = np.array([0.05, 0.55, 1.25, 1.27, 3.05, 9.95])
+    index = WordRateIndex(timestamps)
+    for start, end in [(0, 10), (0, 1), (1.2, 3.0), (3.1, 9.8), (5, 100)]:
+        assert index.count_between(start, end) == \
+            np.sum((timestamps >= start) & (timestamps < end))
+
+
+def test_timeline_covers_the_transcript(example_speech):
+    timeline = example_speech.word_rate.timeline(window_sec=10, num_points=60)
+    assert len(timeline) == 60
+    transcript = ' '.join(d['transcript'] for d in timeline).split()
+    assert transcript == example_speech.transcript_as_list()
+
+
+@pytest.mark.parametrize('include_stop_words', [False, True])
+def test_top_words_keep_the_original_order(example_speech, include_stop_words):
+    # most frequent first; ties in reverse alphabetical order.
+    vectorizer = CountVectorizer(
+        stop_words=None if include_stop_words else 'english'
+    )
+    counts = vectorizer.fit_transform(
+        [example_speech.transcript_as_string()]
+    ).toarray().ravel()
+    words = vectorizer.get_feature_names_out()
+    expected = [
+        {'word': words[ix], 'count': counts[ix]}
+        for ix in np.argsort(counts, kind='stable')[-40:][::-1]
+    ]
+    assert count_words(example_speech, include_stop_words, 40) == expected
+
+
+@pytest.mark.parametrize('include_stop_words', [False, True])
+def test_live_top_words_match_the_final_ones(example_responses, example_speech,
+                                             include_stop_words):
+    stats = OnlineSpeechStats()
+    stats.extend(example_responses)
+    assert stats.top_words(40, include_stop_words) == \
+        count_words(example_speech, include_stop_words, 40)
+
+
+def test_live_pauses_give_the_final_kmeans_split(example_responses,
+                                                 example_speech):
+    stats = OnlineSpeechStats()
+    assert stats.kmeans_threshold() is None
+    for i, result in enumerate(example_responses):
+        stats.add_result(result)
+        if i == 10:
+            # the split so far is the split of the pauses so far.
+            first_pauses = example_speech.pause_durations()[:stats.num_pauses]
+            assert stats.kmeans_threshold() == pytest.approx(
+                PauseClassifier(first_pauses).threshold)
+    assert len(stats.pause_classifier) == example_speech.pause_durations().size
+    assert stats.pause_summary()['kmeans-pause-threshold'] == pytest.approx(
+        example_speech.kmeans_pause_threshold())
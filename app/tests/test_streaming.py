@@ -0,0 +1,127 @@
+# test_streaming.py
+
+import time
+
+import numpy as np
+import pytest
+from google.api_core import exceptions
+
+from streaming import metrics
+from streaming.recognizers import ReplayRecognizer
+from streaming.speech import GoogleSpeech
+from streaming.streaming import AudioStream, RecognizerStream
+
+SAMPLE_RATE = 16000
+
+
+def _stream_silence(audio_stream, secs, chunk_size=4096):
+    chunk = np.zeros(chunk_size, dtype=np.int16)
+    for i in range(int(secs * SAMPLE_RATE / chunk_size) + 1):
+        audio_stream.add_chunk(chunk)
+        if i % 20 == 0:
+            # let the recognizer threads keep up.
+            time.sleep(0.005)
+
+
+def _wait_for_responses(audio_stream, timeout_sec=30):
+    deadline = time.time() + timeout_sec
+    while audio_stream.waiting_for_responses:
+        assert time.time() < deadline, 'the recognizer streams never finished'
+        time.sleep(0.05)
+
+
+class TimingOutRecognizer(ReplayRecognizer):
+    """Ends the first stream like Google does when it times out: what it has
+    heard is finalized, and then the stream raises."""
+    timeout_secs = 30
+
+    def streaming_recognize(self, audio_chunks, start_secs=0.):
+        first = self.num_streams == 0
+
+        def until_timeout():
+            num_bytes = 0
+            for chunk in audio_chunks:
+                yield chunk
+                num_bytes += len(chunk)
+                if first and num_bytes / 2. / self.sample_rate >= self.timeout_secs:
+                    return
+
+        responses = ReplayRecognizer.streaming_recognize(
+            self, until_timeout(), start_secs
+        )
+        for response in responses:
+            yield response
+        if first:
+            raise exceptions.OutOfRange('Audio Timeout Error')
+
+
+@pytest.mark.parametrize('stream_limit_ms', [20000, 50000])
+def test_rotated_streams_give_the_recorded_transcript(example_responses,
+                                                      example_speech,
+                                                      stream_limit_ms):
+    """The words heard by both streams around each rotation are committed
+    exactly once, with the timestamps they were recorded with."""
+    recognizer = ReplayRecognizer(example_responses, SAMPLE_RATE, latency_sec=0.02)
+    audio_stream = AudioStream(
+        SAMPLE_RATE, recognizer=recognizer, stream_limit_ms=stream_limit_ms,
+        overlap_ms=3000
+    )
+    audio_stream.closed = False
+    audio_stream.start()
+    _stream_silence(audio_stream, example_speech.mean_timestamps()[-1] + 3)
+    audio_stream.closed = True
+    _wait_for_responses(audio_stream)
+
+    assert recognizer.num_streams > example_speech.mean_timestamps()[-1] * 1000 / stream_limit_ms
+    assert recognizer.finished
+    speech = GoogleSpeech(audio_stream.responses)
+    assert speech.transcript_as_list() == example_speech.transcript_as_list()
+    np.testing.assert_allclose(speech.mean_timestamps(),
+                               example_speech.mean_timestamps(), atol=1e-6)
+
+
+def test_timestamps_after_dropped_audio_are_not_early():
+    audio_stream = AudioStream(SAMPLE_RATE, recognizer=object())
+    stream = RecognizerStream(audio_stream, 0, SAMPLE_RATE,
+                              max_bytes=4 * SAMPLE_RATE,
+                              max_request_bytes=4 * SAMPLE_RATE,
+                              overflow='drop-oldest')
+    second = np.zeros(SAMPLE_RATE, dtype=np.int16).tobytes()
+    for _ in range(3):
+        stream.add_chunk(second)
+    # the first second of audio was dropped before it was sent.
+    assert len(stream.buffer.get()) == 2 * len(second)
+    assert stream.to_recording_secs(0.5) == pytest.approx(2.5)
+
+
+def test_stream_is_reopened_after_a_timeout(example_responses, example_speech):
+    recognizer = TimingOutRecognizer(example_responses, SAMPLE_RATE,
+                                     latency_sec=0.02)
+    audio_stream = AudioStream(
+        SAMPLE_RATE, recognizer=recognizer, stream_limit_ms=10 ** 9
+    )
+    errors = metrics.recognizer_stream_errors_total.value(error='OutOfRange')
+    restarts = metrics.recognizer_streams_total.value(reason='restart')
+    audio_stream.closed = False
+    audio_stream.start()
+
+    chunk = np.zeros(4096, dtype=np.int16)
+    secs = example_speech.mean_timestamps()[-1] + 3
+    for _ in range(int(secs * SAMPLE_RATE / chunk.size) + 1):
+        audio_stream.add_chunk(chunk)
+        # keep pace with the recognizer, so the stream that timed out is
+        # noticed within the overlap that is sent again.
+        deadline = time.time() + 2
+        while audio_stream.buffer_metrics()['queued_bytes'] > 2 * chunk.nbytes:
+            assert time.time() < deadline, 'the recognizer stopped taking audio'
+            time.sleep(0.001)
+    audio_stream.closed = True
+    _wait_for_responses(audio_stream)
+
+    assert len(audio_stream.streams) == 2
+    assert metrics.recognizer_stream_errors_total.value(error='OutOfRange') == errors + 1
+    assert metrics.recognizer_streams_total.value(reason='restart') == restarts + 1
+    speech = GoogleSpeech(audio_stream.responses)
+    assert speech.transcript_as_list() == example_speech.transcript_as_list()
+    np.testing.assert_allclose(speech.mean_timestamps(),
+                               example_speech.mean_timestamps(), atol=1e-6)
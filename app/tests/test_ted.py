@@ -0,0 +1,95 @@
+# test_ted.py
+
+import numpy as np
+import pytest
+
+from streaming.speech import TedSpeech
+from streaming.ted import TED_INDEX_VERSION, TedIndex, feature_names, read_ted_csv
+
+THEMES = [
+    'ocean whale coral reef fish tide current diver',
+    'rocket orbit planet galaxy telescope launch comet star',
+    'garden soil seed harvest compost tomato orchard bloom',
+]
+
+
+def _talk(theme, num_words, duration_min, seed, name):
+    rng = np.random.RandomState(seed)
+    words = rng.choice(THEMES[theme].split() + ['the', 'and', 'we'], num_words)
+    return TedSpeech(' '.join(words) + ' (Applause)', duration_min, name=name)
+
+
+@pytest.fixture(scope='module')
+def talks():
+    return [
+        _talk(i % 3, 300 + 40 * i, 2. + 0.5 * (i % 4), seed=i, name='talk {}'.format(i))
+        for i in range(12)
+    ]
+
+
+@pytest.fixture(scope='module')
+def index(talks):
+    return TedIndex.build(talks, num_topics=3, max_vocabulary=100)
+
+
+def test_ted_speech_has_no_timings():
+    talk = TedSpeech('Thank you. (Laughter) So, hello!', 0.5, name='talk')
+    assert talk.transcript_as_list() == ['Thank', 'you.', 'So,', 'hello!']
+    assert talk.words_per_min() == 8
+    assert not hasattr(talk, 'mean_timestamps')
+
+
+def test_features(index, talks):
+    assert index.features.shape == (len(talks), len(feature_names(3)))
+    wpm = index.features[:, index.feature_names.index('words-per-min')]
+    np.testing.assert_allclose(wpm, [t.words_per_min() for t in talks])
+
+
+def test_most_similar_finds_the_talk_itself(index, talks):
+    for talk in talks:
+        similar = index.most_similar(talk, k=3)
+        assert similar[0]['name'] == talk.name
+        assert similar[0]['distance'] == pytest.approx(0, abs=1e-9)
+        assert [s['distance'] for s in similar] == \
+            sorted(s['distance'] for s in similar)
+
+
+def test_most_similar_speech(index, example_speech):
+    similar = index.most_similar(example_speech, k=20)
+    assert len(similar) == len(index)
+    assert similar[0]['words-per-min'] > 0
+
+
+def test_save_and_load(index, talks, tmp_path):
+    filename = str(tmp_path / 'ted-index.npz')
+    index.save(filename)
+    loaded = TedIndex.load(filename)
+    np.testing.assert_array_equal(loaded.features, index.features)
+    assert loaded.names.tolist() == index.names.tolist()
+    assert loaded.most_similar(talks[4]) == index.most_similar(talks[4])
+
+
+def test_rejects_other_versions(index, tmp_path):
+    filename = str(tmp_path / 'ted-index.npz')
+    np.savez_compressed(
+        filename, version=TED_INDEX_VERSION - 1, names=index.names,
+        durations_min=index.durations_min, features=index.features,
+        vocabulary=index.vocabulary, topic_words=index.topic_words
+    )
+    with pytest.raises(ValueError):
+        TedIndex.load(filename)
+
+
+def test_read_ted_csv(tmp_path):
+    transcripts = tmp_path / 'transcripts.csv'
+    transcripts.write_text(
+        'transcript,url\n'
+        '"Hello there. (Laughter) Bye.",https://ted.com/a\n'
+        '"Not in the talks file.",https://ted.com/b\n'
+    )
+    talks = tmp_path / 'ted_main.csv'
+    talks.write_text('name,duration,url\nFirst talk,90,https://ted.com/a\n')
+    ted_speeches = read_ted_csv(str(transcripts), str(talks))
+    assert [ts.name for ts in ted_speeches] == ['First talk']
+    assert ted_speeches[0].duration_min == 1.5
+    assert ted_speeches[0].transcript_as_string() == 'Hello there. Bye.'
@@ -0,0 +1,25 @@
+# test_topics.py
+
+import numpy as np
+
+from streaming.topics import TopicModelCache, fit_topic_model
+
+
+def test_fits_are_deterministic(example_speech):
+    doc_term, _ = example_speech.analysis.lda_input()
+    _, lda_Z = fit_topic_model(doc_term, 3)
+    _, lda_Z_again = fit_topic_model(doc_term, 3)
+    np.testing.assert_array_equal(lda_Z, lda_Z_again)
+
+
+def test_async_fits_are_cached(example_speech):
+    doc_term, _ = example_speech.analysis.lda_input()
+    cache = TopicModelCache()
+    future = cache.get_async('speech', 4, doc_term)
+    model = future.result(timeout=60)
+    assert ('speech', 4) in cache
+    # once fit, the model comes back without waiting.
+    cached = cache.get_async('speech', 4, doc_term)
+    assert cached.done()
+    assert cached.result() is model
+    assert cache.get('speech', 4, doc_term) is model
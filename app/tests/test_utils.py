@@ -0,0 +1,26 @@
+# test_utils.py
+
+import numpy as np
+import pytest
+
+from streaming.utils import decode_audio_chunk
+
+
+def test_decodes_int16_and_float32():
+    samples = np.array([0, 1000, -32768, 32767], dtype='<i2')
+    np.testing.assert_array_equal(decode_audio_chunk(samples.tobytes()), samples)
+
+    floats = np.array([0., 0.5, -1., 1.], dtype='<f4')
+    decoded = decode_audio_chunk(floats.tobytes(), dtype='float32')
+    assert decoded.dtype == np.int16
+    np.testing.assert_array_equal(decoded, decode_audio_chunk(floats.tolist()))
+
+
+@pytest.mark.parametrize('audio, dtype', [
+    (b'\x00\x01\x02', 'int16'),
+    (b'\x00\x01\x02\x03\x04\x05', 'float32'),
+    (b'\x00\x01', 'int8'),
+])
+def test_rejects_malformed_chunks(audio, dtype):
+    with pytest.raises(ValueError):
+        decode_audio_chunk(audio, dtype=dtype)
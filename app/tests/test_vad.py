@@ -0,0 +1,70 @@
+# test_vad.py
+
+import numpy as np
+
+from streaming.vad import VoiceActivityGate
+
+SAMPLE_RATE = 16000
+
+
+def _tone(secs, db=-20):
+    t = np.arange(int(secs * SAMPLE_RATE)) / float(SAMPLE_RATE)
+    amplitude = 10 ** (db / 20.) * 32768 * np.sqrt(2)
+    return amplitude * np.cos(2 * np.pi * 220 * t)
+
+
+def _noise(secs, db, seed=0):
+    rng = np.random.RandomState(seed)
+    return rng.randn(int(secs * SAMPLE_RATE)) * 10 ** (db / 20.) * 32768
+
+
+def _run(signal, chunk_size=4096):
+    gate = VoiceActivityGate(SAMPLE_RATE)
+    audio = np.clip(signal, -32768, 32767).astype(np.int16)
+    sent = [gate.process(audio[i:i + chunk_size])
+            for i in range(0, audio.size, chunk_size)]
+    return gate, np.concatenate(sent)
+
+
+def test_silence_is_held_back_and_timestamps_map_back():
+    signal = np.concatenate([_tone(2), np.zeros(6 * SAMPLE_RATE), _tone(2)])
+    gate, sent = _run(signal)
+
+    assert sent.size < signal.size - 5 * SAMPLE_RATE
+    assert [[round(s, 2), round(e, 2)] for s, e in gate.segments] == \
+        [[0., 2.], [8., 10.]]
+    assert gate.pauses() == [[2., 8.]]
+
+    # the first sample of the second tone, in the audio that was sent, maps
+    # back to where it is in the recording.
+    nonzero = np.flatnonzero(sent)
+    onset = nonzero[np.argmax(np.diff(nonzero)) + 1]
+    assert gate.to_recording_secs(onset / float(SAMPLE_RATE)) == 8.
+    assert gate.to_recording_secs(1.) == 1.
+
+
+def test_speech_at_the_start_is_not_taken_for_noise():
+    signal = np.concatenate([_tone(1.86), _noise(1.84, -70), _tone(1.88),
+                             _noise(3, -70)])
+    gate, _ = _run(signal)
+    assert [[round(s, 2), round(e, 2)] for s, e in gate.segments] == \
+        [[0., 1.86], [3.7, 5.58]]
+
+
+def test_noise_floor_settles_on_background_noise():
+    signal = _noise(20, -40)
+    signal[8 * SAMPLE_RATE:10 * SAMPLE_RATE] += _tone(2, db=-15)
+    gate, sent = _run(signal)
+
+    assert abs(gate.noise_floor_db - -40) < 2
+    # after the floor has settled only the tone (and its padding) is sent.
+    assert [8., 10.] in [[round(s, 2), round(e, 2)] for s, e in gate.segments]
+    assert all(e <= 1.1 for s, e in gate.segments if s < 8)
+    assert sent.size / float(SAMPLE_RATE) < 5
+
+
+def test_everything_is_sent_while_settling():
+    gate, sent = _run(np.zeros(10 * SAMPLE_RATE))
+    assert gate.segments == []
+    assert sent.size == SAMPLE_RATE
+    assert gate.held_back_secs == 9.
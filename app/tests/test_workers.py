@@ -0,0 +1,110 @@
+# test_workers.py
+
+import time
+
+import numpy as np
+import pytest
+
+from streaming.analysis import iter_analysis_payloads
+from streaming.speech import GoogleSpeech, WordTimings
+from streaming.speechfile import save_speech
+from streaming.utils import set_duration_secs
+from streaming.workers import AnalysisExecutor, AnalysisQueueFull
+
+
+@pytest.fixture(scope='module')
+def live_responses(example_responses, example_speech):
+    """The example's responses as an AudioStream commits them, i.e. on the
+    recording's timeline."""
+    start_secs = iter(example_speech.timings.start_secs.tolist())
+    end_secs = iter(example_speech.timings.end_secs.tolist())
+    responses = []
+    for response in example_responses:
+        rebased = type(response)()
+        rebased.CopyFrom(response)
+        for word in rebased.alternatives[0].words:
+            set_duration_secs(word.start_time, next(start_secs))
+            set_duration_secs(word.end_time, next(end_secs))
+        responses.append(rebased)
+    return responses
+
+
+def _wait(executor, job, timeout_sec=120):
+    deadline = time.time() + timeout_sec
+    while not job.done():
+        assert time.time() < deadline, 'the analysis never finished'
+        executor.dispatch()
+        time.sleep(0.05)
+    executor.dispatch()
+
+
+def test_stages_are_dispatched_to_the_job(live_responses, example_speech):
+    executor = AnalysisExecutor(max_workers=1)
+    assert executor.start_method != 'fork'
+    events = []
+    try:
+        job = executor.submit(
+            live_responses, lambda event, data: events.append((event, data)),
+            num_topics=3
+        )
+        _wait(executor, job)
+        google_speech = job.result()
+    finally:
+        executor.shutdown()
+
+    assert [event for event, _ in events] == [
+        'transcript update', 'speech processing done',
+        'word counts including stop', 'word counts excluding stop',
+        'update speech dt slider', 'make speech dt plot', 'topic modeling'
+    ]
+    assert events[0][1]['transcript'] == example_speech.transcript_as_string()
+    assert google_speech.transcript_as_list() == example_speech.transcript_as_list()
+    assert executor.queue_depth == 0
+
+
+def test_rejects_jobs_past_the_queue_limit(live_responses):
+    executor = AnalysisExecutor(max_workers=1, max_queue=1)
+    try:
+        job = executor.submit(live_responses, lambda event, data: None,
+                              num_topics=3)
+        with pytest.raises(AnalysisQueueFull):
+            executor.submit(live_responses, lambda event, data: None)
+        _wait(executor, job)
+        # there is room again once the first job is done.
+        _wait(executor, executor.submit(live_responses[:5],
+                                        lambda event, data: None))
+    finally:
+        executor.shutdown()
+
+
+def test_live_analysis_matches_the_saved_speech(live_responses, tmp_path):
+    responses = [type(r)() for r in live_responses]
+    for response, live in zip(responses, live_responses):
+        response.CopyFrom(live)
+    # the first word of a result can be timed inside the last word of the one
+    # before (like at a stream seam); it must not be taken for a new stream.
+    first = responses[10].alternatives[0].words[0]
+    last = responses[9].alternatives[0].words[-1]
+    first.start_time.CopyFrom(last.start_time)
+    first.end_time.CopyFrom(last.start_time)
+
+    executor = AnalysisExecutor(max_workers=1)
+    events = []
+    try:
+        job = executor.submit(
+            responses, lambda event, data: events.append((event, data)),
+            num_topics=3
+        )
+        _wait(executor, job)
+        live_speech = job.result()
+    finally:
+        executor.shutdown()
+
+    # what app.py saves once the recording is stopped.
+    filename = str(tmp_path / 'recording.speech')
+    save_speech(WordTimings.from_responses(responses, rebased=True), filename)
+    saved_speech = GoogleSpeech.from_file(filename, num_topics=3)
+
+    np.testing.assert_array_equal(live_speech.mean_timestamps(),
+                                  saved_speech.mean_timestamps())
+    assert events[1:] == list(iter_analysis_payloads(saved_speech, mode='user'))